@@ -14,7 +14,7 @@ from core.settings import settings
 from common.encrypt import Jwt
 from core.exceptions import NotFoundException, CommonFailedException
 from db.mysql.models import User
-from apps.dependencies import jwt_required
+from apps.dependencies import RateLimiter, jwt_required
 
 router = APIRouter()
 
@@ -57,7 +57,13 @@ class AuthData(BaseModel):
 """
 
 
-@router.post("/login", summary="登录", description="登录接口", response_model=Resp[AuthData])
+@router.post(
+    "/login",
+    summary="登录",
+    description="登录接口",
+    response_model=Resp[AuthData],
+    dependencies=[Depends(RateLimiter(10, 60))],
+)
 async def login(login_data: LoginSchema):
     user = await User.filter(Q(username=login_data.username) | Q(phone=login_data.phone)).first()  # type: User
     if not user:
@@ -103,7 +109,13 @@ class RegisterIn(BaseModel):
     password: str = Body(..., description="密码")
 
 
-@router.post("/register", summary="用户注册", description="新用户注册接口", response_model=Resp[User.response_model])
+@router.post(
+    "/register",
+    summary="用户注册",
+    description="新用户注册接口",
+    response_model=Resp[User.response_model],
+    dependencies=[Depends(RateLimiter(5, 60, algorithm=RateLimiter.TOKEN_BUCKET))],
+)
 async def register(register_in: RegisterIn):
     try:
         user = await User.create(**register_in.dict())
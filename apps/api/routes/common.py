@@ -1,6 +1,11 @@
-from fastapi import File, Form, Query, APIRouter, UploadFile
+from fastapi import File, Form, Query, Depends, APIRouter, UploadFile
 
+from db.redis import AsyncRedisUtil
 from db.mysql import enums
+from db.hbase.pool import hbase_pool_stats
+from db.hbase.cache import RowCache
+from db.redis.cache import TwoTierCache
+from apps.dependencies import host_checker
 from core.response import Resp, PageResp
 from db.mysql.models import Config
 
@@ -19,3 +24,30 @@ async def config_info(key: str = Query(None, description="在线参数key", exam
 @router.post("/upload", summary="上传", description="文件上传", response_model=Resp)
 async def upload(filename: str = Form(...), file: UploadFile = File(...)):
     return Resp(data={"filename": filename, "file": file.filename})
+
+
+@router.get(
+    "/metrics/redis",
+    summary="Redis监控",
+    description="连接池占用、获取连接等待、命令耗时及本地缓存命中",
+    response_model=Resp,
+    dependencies=[Depends(host_checker)],
+)
+async def redis_metrics():
+    return Resp(
+        data={
+            "pool": AsyncRedisUtil.metrics(),
+            "l1_cache": TwoTierCache.all_stats(),
+        }
+    )
+
+
+@router.get(
+    "/metrics/hbase",
+    summary="HBase监控",
+    description="连接池占用、获取连接等待及行缓存命中",
+    response_model=Resp,
+    dependencies=[Depends(host_checker)],
+)
+async def hbase_metrics():
+    return Resp(data={"pool": hbase_pool_stats(), "row_cache": RowCache.all_stats()})
@@ -0,0 +1,10 @@
+"""
+Kafka 消费处理函数, 由 python manage.py kafka consume 加载
+
+@kafka_handler("topic")
+async def handle(record: ConsumerRecord):
+    ...
+"""
+from aiokafka.structs import ConsumerRecord  # noqa
+
+from common.kafka_consumer import kafka_handler  # noqa
@@ -1,5 +1,6 @@
 import time
-from typing import Optional
+import logging
+from typing import Callable, Optional
 from urllib.parse import unquote
 
 from jose import jwt
@@ -11,20 +12,28 @@ from starlette.requests import Request
 from starlette.exceptions import HTTPException
 from fastapi.security.utils import get_authorization_scheme_param
 
+from db.redis import AsyncRedisUtil
 from core.schema import Pager
 from common.utils import get_client_ip
 from core.globals import g
 from core.settings import settings
+from db.redis.keys import RedisCacheKey
 from common.encrypt import Jwt, SignAuth
+from db.redis.cache import LRUCache
+from db.redis.cluster import same_shard_key
 from core.exceptions import (
     TokenExpiredException,
     TokenInvalidException,
     NotAuthorizedException,
     SignCheckFailedException,
+    TooManyRequestsException,
     TimeStampExpiredException,
 )
+from db.redis.scripts import TOKEN_BUCKET_SCRIPT, SLIDING_WINDOW_SCRIPT
 from db.mysql.models import User
 
+logger = logging.getLogger(__name__)
+
 
 class TheBearer(HTTPBearer):
     async def __call__(self, request: Request) -> Optional[HTTPAuthorizationCredentials]:
@@ -114,3 +123,81 @@ async def host_checker(request: Request,):
                 if ".".join(blur_segments) in settings.ALLOWED_HOST_LIST:
                     return
     raise HTTPException(HTTP_403_FORBIDDEN, f"IP {caller_host} 不在访问白名单")
+
+
+def limit_by_ip(request: Request) -> str:
+    return f"ip:{get_client_ip(request)}"
+
+
+def limit_by_user(request: Request) -> str:
+    """
+    需在 jwt_required 之后使用, 未登录时按ip
+    """
+    if g.user:
+        return f"user:{g.user.id}"
+    return limit_by_ip(request)
+
+
+class RateLimiter:
+    """
+    基于Redis的分布式限流, 单次往返原子判定
+
+    @router.post("/login", dependencies=[Depends(RateLimiter(10, 60))])
+    """
+
+    SLIDING_WINDOW = "sliding_window"
+    TOKEN_BUCKET = "token_bucket"
+
+    def __init__(
+        self,
+        limit: int,
+        window: int,
+        algorithm: str = SLIDING_WINDOW,
+        key_func: Callable[[Request], str] = limit_by_ip,
+        scope: str = None,
+        local_maxsize: int = 10000,
+    ):
+        """
+        :param limit: 窗口内允许次数 / 令牌桶容量
+        :param window: 窗口秒数 / 令牌桶补满所需秒数
+        :param algorithm: sliding_window / token_bucket
+        :param key_func: 限流对象, 默认按客户端ip
+        :param scope: 限流范围, 默认按请求路径
+        :param local_maxsize: 本地最多记录的被拒绝对象数
+        """
+        assert algorithm in (self.SLIDING_WINDOW, self.TOKEN_BUCKET), f"Unsupported algorithm {algorithm}"
+        self.limit = limit
+        self.window = window
+        self.algorithm = algorithm
+        self.key_func = key_func
+        self.scope = scope
+        # 本地记录被拒绝对象的解封时间, 超限客户端在此期间不再访问Redis
+        self._blocked = LRUCache(maxsize=local_maxsize, ttl=window)
+
+    async def __call__(self, request: Request):
+        key = RedisCacheKey.rate_limit.format(self.algorithm, self.scope or request.url.path, self.key_func(request))
+        now = time.time()
+        if now < (self._blocked.get(key) or 0):
+            raise TooManyRequestsException()
+        try:
+            allowed, _, retry_after = await self._evaluate(key, now, 1)
+        except Exception as e:
+            # Redis 不可用时放行, 避免限流拖垮业务
+            logger.warning(f"Rate limit evaluate failed, pass through: {e}")
+            return
+        if not allowed:
+            self._blocked.set(key, now + retry_after / 1000)
+            raise TooManyRequestsException()
+
+    async def _evaluate(self, key: str, now: float, cost: int):
+        pool = await AsyncRedisUtil.get_pool()
+        now_ms = int(now * 1000)
+        window_ms = self.window * 1000
+        if self.algorithm == self.TOKEN_BUCKET:
+            return await TOKEN_BUCKET_SCRIPT.execute(pool, [key], [self.limit, self.limit / window_ms, now_ms, cost])
+        index, elapsed = divmod(now_ms, window_ms)
+        return await SLIDING_WINDOW_SCRIPT.execute(
+            pool,
+            [same_shard_key(key, f":{index}"), same_shard_key(key, f":{index - 1}")],
+            [self.limit, window_ms, elapsed, cost],
+        )
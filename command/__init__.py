@@ -1,5 +1,6 @@
 import typer
 
+from command.kafka import kafka_typer
 from command.mysql import db_typer
 from command.tools import tool_typer
 
@@ -13,5 +14,6 @@ cli = typer.Typer()
 
 cli.add_typer(db_typer, name="db")
 cli.add_typer(tool_typer, name="tools")
+cli.add_typer(kafka_typer, name="kafka")
 
 from command.shell import *  # noqa
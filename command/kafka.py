@@ -0,0 +1,52 @@
+import asyncio
+import multiprocessing
+from typing import List
+
+import typer
+
+from common.outbox import run_relay
+from common.kafka_consumer import run_worker, replay_dead_letters
+
+kafka_typer = typer.Typer(short_help="Kafka相关")
+
+
+@kafka_typer.command("consume", short_help="启动消费者, 多进程共用同一消费组")
+def consume(
+    group_id: str = typer.Option(..., "--group", help="消费组"),
+    topics: List[str] = typer.Option(None, "--topic", help="只消费指定 topic, 默认所有已注册的 topic"),
+    processes: int = typer.Option(1, help="进程数, 不超过分区总数才有意义"),
+    concurrency: int = typer.Option(None, help="单进程同时处理的分区数"),
+    batch_size: int = typer.Option(None, help="每次拉取条数"),
+):
+    kwargs = dict(topics=list(topics or []), concurrency=concurrency, batch_size=batch_size)
+    if processes <= 1:
+        run_worker(group_id, **kwargs)
+        return
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(group_id,), kwargs=kwargs, name=f"kafka-consumer-{i}")
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # 子进程同样收到 SIGINT, 等待其提交后退出
+        for worker in workers:
+            worker.join()
+
+
+@kafka_typer.command("replay-dlq", short_help="将死信消息重新投递到原 topic")
+def replay_dlq(
+    topic: str = typer.Option(..., help="原 topic"),
+    group_id: str = typer.Option(None, "--group", help="记录回放进度的消费组, 默认 {topic}.dlq.replay"),
+    limit: int = typer.Option(None, help="最多回放条数"),
+):
+    count = asyncio.run(replay_dead_letters(topic, group_id, limit))
+    print(f"Replayed {count} messages from {topic}.dlq")
+
+
+@kafka_typer.command("relay-outbox", short_help="投递发件箱事件, 多个进程同时运行时只有一个在投递")
+def relay_outbox():
+    run_relay()
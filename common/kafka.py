@@ -1,38 +1,151 @@
-import json
 import asyncio
 import logging
+from typing import Any, List, Union, Callable, Iterable, Optional
 
+import orjson
 from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+from aiokafka.structs import RecordMetadata
 
 from core.settings import settings
 
-loop = asyncio.get_event_loop()
-
 logger = logging.getLogger(__name__)
 
+KeyType = Union[str, bytes, None]
+
+
+def serialize(data: Any) -> bytes:
+    """
+    bytes 原样发送, str 按 UTF-8 编码, 其他使用 orjson 序列化
+    """
+    if isinstance(data, bytes):
+        return data
+    if isinstance(data, str):
+        return data.encode("utf-8")
+    return orjson.dumps(data)
+
+
+def serialize_key(key: KeyType) -> Optional[bytes]:
+    return key.encode("utf-8") if isinstance(key, str) else key
+
+
+def _log_send_error(fut: asyncio.Future):
+    if not fut.cancelled() and fut.exception() is not None:
+        logger.error(f"Kafka send failed: {fut.exception()!r}")
+
+
+def create_producer(**kwargs) -> AIOKafkaProducer:
+    """
+    按 settings.KAFKA_* 创建生产者(未启动), 消息在客户端按分区累积,
+    达到 KAFKA_MAX_BATCH_SIZE 或等待 KAFKA_LINGER_MS 后整批发送
+    """
+    return AIOKafkaProducer(
+        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+        linger_ms=settings.KAFKA_LINGER_MS,
+        max_batch_size=settings.KAFKA_MAX_BATCH_SIZE,
+        compression_type=settings.KAFKA_COMPRESSION,
+        acks=settings.KAFKA_ACKS,
+        key_serializer=serialize_key,
+        value_serializer=serialize,
+        **kwargs,
+    )
+
 
 class MyKafka:
-    def __init__(self):
+    def __init__(
+        self,
+        producer_factory: Callable[..., AIOKafkaProducer] = None,
+        consumer_factory: Callable[..., AIOKafkaConsumer] = None,
+    ):
+        """
+        :param producer_factory: 默认 create_producer, 测试与基准可替换为 common.kafka_memory.MemoryBroker
+        :param consumer_factory: 默认 AIOKafkaConsumer
+        """
+        self.producer_factory = producer_factory or create_producer
+        self.consumer_factory = consumer_factory or AIOKafkaConsumer
         self._producer = None
-        self._consumer = None
+        self._producer_lock: Optional[asyncio.Lock] = None
+        self._consumers = {}
 
-    async def get_producer(self):
-        if not self._producer:
-            self._producer = AIOKafkaProducer(loop=loop, bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS)
-            await self._producer.start()
+    async def get_producer(self) -> AIOKafkaProducer:
+        if self._producer:
+            return self._producer
+        if self._producer_lock is None:
+            self._producer_lock = asyncio.Lock()
+        async with self._producer_lock:
+            if not self._producer:
+                producer = self.producer_factory()
+                await producer.start()
+                self._producer = producer
         return self._producer
 
-    async def get_consumer(self, topic: str, group_id: str):
-        if not self._consumer:
-            self._consumer = AIOKafkaConsumer(
-                topic, loop=loop, group_id=group_id, bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+    async def get_consumer(self, topic: str, group_id: str) -> AIOKafkaConsumer:
+        """
+        按 (topic, group_id) 缓存, 批量消费与提交见 common.kafka_consumer
+        """
+        consumer = self._consumers.get((topic, group_id))
+        if not consumer:
+            consumer = self.consumer_factory(
+                topic, group_id=group_id, bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
             )
-            await self._consumer.start()
-        return self._consumer
+            await consumer.start()
+            self._consumers[(topic, group_id)] = consumer
+        return consumer
 
-    async def send(self, data, topic: str):
+    async def send(
+        self, data, topic: str, key: KeyType = None, partition: int = None, headers: list = None, wait: bool = False
+    ) -> Union[asyncio.Future, RecordMetadata]:
+        """
+        :param data: bytes / str / 可被 orjson 序列化的对象
+        :param topic:
+        :param key: 相同 key 进入同一分区, 保证顺序
+        :param partition: 指定分区, 优先于 key
+        :param headers: [(str, bytes)]
+        :param wait: True 等待 broker 确认并返回 RecordMetadata;
+            False 写入发送缓冲后立即返回 future, 失败时记录日志
+        """
         producer = await self.get_producer()
-        await producer.send(topic, json.dumps(data))
+        fut = await producer.send(topic, data, key=key, partition=partition, headers=headers)
+        if wait:
+            return await fut
+        fut.add_done_callback(_log_send_error)
+        return fut
+
+    async def send_many(
+        self,
+        messages: Iterable[Any],
+        topic: str,
+        key: Callable[[Any], KeyType] = None,
+        headers: list = None,
+    ) -> List[RecordMetadata]:
+        """
+        全部写入发送缓冲后等待整批确认, 由生产者按分区合并成批次发送
+        :param messages:
+        :param topic:
+        :param key: 从消息中取 key 的函数, 为空时按轮询/随机分区
+        :param headers:
+        :return: 与 messages 顺序一致的 RecordMetadata, 任一失败时抛出异常
+        """
+        producer = await self.get_producer()
+        futures = []
+        for message in messages:
+            message_key = key(message) if key else None
+            futures.append(await producer.send(topic, message, key=message_key, headers=headers))
+        return list(await asyncio.gather(*futures))
+
+    async def flush(self):
+        """
+        立即发送缓冲中的消息并等待完成
+        """
+        if self._producer:
+            await self._producer.flush()
+
+    async def close(self):
+        if self._producer:
+            await self._producer.stop()
+            self._producer = None
+        for consumer in self._consumers.values():
+            await consumer.stop()
+        self._consumers = {}
 
 
 kafka = MyKafka()
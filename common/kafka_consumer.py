@@ -0,0 +1,465 @@
+"""
+Kafka 消费框架
+
+注册处理函数(模块需在 settings.KAFKA_HANDLER_MODULES 中):
+
+@kafka_handler("fault_record")
+async def on_fault_record(record: ConsumerRecord):
+    record.value  # 已按 deserializer 反序列化, 默认 orjson
+
+启动: python manage.py kafka consume --group fastpost --processes 4
+
+- getmany 批量拉取, 同一分区内按 offset 顺序处理, 不同分区并发, 总并发不超过 concurrency
+- 分区积压超过 max_buffer 条时暂停拉取该分区
+- 处理成功后按 commit_interval 批量提交 offset, 至少一次语义
+- 多进程使用同一 group, 由 Kafka 分配分区
+
+失败重试与死信:
+- 处理失败的消息转发到 {topic}.retry.1 ... {topic}.retry.N(延迟见 KAFKA_RETRY_DELAYS), 原分区继续处理后续消息
+- 重试 topic 由同一 worker 消费, 到达 x-retry-at 后再交给原处理函数
+- 重试耗尽后转发到 {topic}.dlq, 头部带原始位置与异常信息, 可用 python manage.py kafka replay-dlq 重新投递
+- 重试 topic 与死信 topic 需预先创建或开启 broker 自动创建
+"""
+import time
+import signal
+import asyncio
+import logging
+import importlib
+import dataclasses
+from typing import Any, Set, Dict, List, Tuple, Deque, Callable, Optional, Awaitable
+from collections import deque
+
+import orjson
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer, TopicPartition
+from aiokafka.abc import ConsumerRebalanceListener
+from aiokafka.structs import ConsumerRecord
+
+from common.kafka import create_producer
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+HandlerType = Callable[[ConsumerRecord], Awaitable[Any]]
+HeadersType = List[Tuple[str, bytes]]
+
+# 重试/死信消息的头部, 重新投递时去除
+HEADER_PREFIX = "x-"
+HEADER_TOPIC = "x-original-topic"
+HEADER_PARTITION = "x-original-partition"
+HEADER_OFFSET = "x-original-offset"
+HEADER_ATTEMPT = "x-attempt"
+HEADER_RETRY_AT = "x-retry-at"
+HEADER_ERROR_TYPE = "x-error-type"
+HEADER_ERROR = "x-error"
+HEADER_FAILED_AT = "x-failed-at"
+ORIGIN_HEADERS = (HEADER_TOPIC, HEADER_PARTITION, HEADER_OFFSET)
+
+
+def retry_topic(topic: str, attempt: int) -> str:
+    return f"{topic}.retry.{attempt}"
+
+
+def dlq_topic(topic: str) -> str:
+    return f"{topic}.dlq"
+
+
+def get_header(record: ConsumerRecord, name: str) -> Optional[bytes]:
+    for key, value in record.headers or ():
+        if key == name:
+            return value
+    return None
+
+
+def strip_headers(headers: HeadersType) -> HeadersType:
+    return [(k, v) for k, v in headers or () if not k.startswith(HEADER_PREFIX)]
+
+
+def failure_headers(
+    record: ConsumerRecord, topic: str, attempt: int, error: Exception, retry_at: int = None
+) -> HeadersType:
+    """
+    :param record: 失败的消息, 来自原 topic 或重试 topic
+    :param topic: 原 topic
+    :param attempt: 第几次重试, 进入死信时为总失败次数
+    :param error:
+    :param retry_at: 最早重试时间(毫秒时间戳), 死信为空
+    """
+    origin = {k: v for k, v in record.headers or () if k in ORIGIN_HEADERS}
+    headers = strip_headers(record.headers)
+    headers += [
+        (HEADER_TOPIC, origin.get(HEADER_TOPIC, topic.encode())),
+        (HEADER_PARTITION, origin.get(HEADER_PARTITION, str(record.partition).encode())),
+        (HEADER_OFFSET, origin.get(HEADER_OFFSET, str(record.offset).encode())),
+        (HEADER_ATTEMPT, str(attempt).encode()),
+        (HEADER_ERROR_TYPE, type(error).__name__.encode()),
+        (HEADER_ERROR, str(error)[:1024].encode("utf-8", "replace")),
+        (HEADER_FAILED_AT, str(int(time.time() * 1000)).encode()),
+    ]
+    if retry_at is not None:
+        headers.append((HEADER_RETRY_AT, str(retry_at).encode()))
+    return headers
+
+
+@dataclasses.dataclass
+class KafkaHandler:
+    topic: str
+    func: HandlerType
+    deserializer: Optional[Callable[[bytes], Any]] = orjson.loads
+    retry_delays: Optional[List[float]] = None
+
+    def __post_init__(self):
+        if self.retry_delays is None:
+            self.retry_delays = list(settings.KAFKA_RETRY_DELAYS)
+
+
+@dataclasses.dataclass
+class _Route:
+    handler: KafkaHandler
+    # 0 为原 topic, n 为第 n 级重试 topic
+    attempt: int = 0
+
+
+handlers: Dict[str, KafkaHandler] = {}
+
+
+def kafka_handler(
+    topic: str, deserializer: Optional[Callable[[bytes], Any]] = orjson.loads, retry_delays: List[float] = None
+):
+    """
+    :param topic: 每个 topic 只能注册一个处理函数
+    :param deserializer: 为空时 record.value 为原始 bytes
+    :param retry_delays: 各级重试的延迟(秒), 默认 settings.KAFKA_RETRY_DELAYS, 空列表表示失败直接进入死信
+    """
+
+    def decorator(func: HandlerType):
+        assert topic not in handlers, f"Kafka handler of topic {topic} already registered: {handlers[topic].func}"
+        handlers[topic] = KafkaHandler(topic, func, deserializer, retry_delays)
+        return func
+
+    return decorator
+
+
+def load_handlers(modules: List[str] = None) -> Dict[str, KafkaHandler]:
+    for module in modules or settings.KAFKA_HANDLER_MODULES:
+        importlib.import_module(module)
+    return handlers
+
+
+class _PartitionState:
+    __slots__ = ("records", "task", "processed", "committed", "paused", "released")
+
+    def __init__(self):
+        self.records: Deque[ConsumerRecord] = deque()
+        self.task: Optional[asyncio.Task] = None
+        # 已处理的最大 offset
+        self.processed: Optional[int] = None
+        self.committed: Optional[int] = None
+        self.paused = False
+        self.released = asyncio.Event()
+
+
+class _RebalanceListener(ConsumerRebalanceListener):
+    def __init__(self, worker: "ConsumerWorker"):
+        self.worker = worker
+
+    async def on_partitions_revoked(self, revoked):
+        await self.worker.release(revoked)
+
+    async def on_partitions_assigned(self, assigned):
+        pass
+
+
+class ConsumerWorker:
+    # 转发到重试/死信 topic 失败时的退避(秒)
+    retry_backoff = 1
+    retry_backoff_max = 30
+
+    def __init__(
+        self,
+        group_id: str,
+        topics: List[str] = None,
+        concurrency: int = None,
+        batch_size: int = None,
+        max_buffer: int = None,
+        commit_interval: float = None,
+        producer_factory: Callable[..., AIOKafkaProducer] = None,
+        consumer_factory: Callable[..., AIOKafkaConsumer] = None,
+    ):
+        """
+        :param group_id:
+        :param topics: 为空时消费所有已注册的 topic
+        :param concurrency: 同时处理的分区数上限
+        :param batch_size: 每次 getmany 最多拉取条数
+        :param max_buffer: 单个分区积压上限
+        :param commit_interval: 提交 offset 间隔(秒)
+        :param producer_factory: 转发重试/死信消息的生产者, 默认 create_producer
+        :param consumer_factory: 默认 AIOKafkaConsumer
+        """
+        self.group_id = group_id
+        self.handlers = {t: h for t, h in handlers.items() if not topics or t in topics}
+        if not self.handlers:
+            raise ValueError(f"No kafka handler registered for topics: {topics or 'all'}")
+        self.routes: Dict[str, _Route] = {}
+        for topic, handler in self.handlers.items():
+            self.routes[topic] = _Route(handler)
+            for attempt in range(1, len(handler.retry_delays) + 1):
+                self.routes[retry_topic(topic, attempt)] = _Route(handler, attempt)
+        self.concurrency = concurrency or settings.KAFKA_CONSUMER_CONCURRENCY
+        self.batch_size = batch_size or settings.KAFKA_CONSUMER_BATCH_SIZE
+        self.max_buffer = max_buffer or self.batch_size * 2
+        self.commit_interval = commit_interval or settings.KAFKA_COMMIT_INTERVAL
+        self.producer_factory = producer_factory or create_producer
+        self.consumer_factory = consumer_factory or AIOKafkaConsumer
+        self.consumer: Optional[AIOKafkaConsumer] = None
+        self.producer: Optional[AIOKafkaProducer] = None
+        self._partitions: Dict[TopicPartition, _PartitionState] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.dead_lettered = 0
+
+    def stop(self):
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def run(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._stopped = asyncio.Event()
+        self.consumer = self.consumer_factory(
+            bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+            group_id=self.group_id,
+            enable_auto_commit=False,
+            auto_offset_reset=settings.KAFKA_AUTO_OFFSET_RESET,
+            max_poll_records=self.batch_size,
+        )
+        self.producer = self.producer_factory()
+        await self.producer.start()
+        self.consumer.subscribe(list(self.routes), listener=_RebalanceListener(self))
+        await self.consumer.start()
+        logger.info(f"Kafka consumer {self.group_id} started, topics: {list(self.routes)}")
+        commit_task = asyncio.ensure_future(self._commit_loop())
+        try:
+            while not self._stopped.is_set():
+                # 有暂停的分区时缩短等待, 以便分区恢复后尽快拉取
+                paused = any(state.paused for state in self._partitions.values())
+                batches = await self.consumer.getmany(timeout_ms=50 if paused else 1000, max_records=self.batch_size)
+                for tp, records in batches.items():
+                    self._dispatch(tp, records)
+        finally:
+            commit_task.cancel()
+            await self.release(list(self._partitions))
+            await self.consumer.stop()
+            await self.producer.stop()
+            logger.info(
+                f"Kafka consumer {self.group_id} stopped, processed: {self.processed}, failed: {self.failed}, "
+                f"retried: {self.retried}, dead lettered: {self.dead_lettered}"
+            )
+
+    def _dispatch(self, tp: TopicPartition, records: List[ConsumerRecord]):
+        state = self._partitions.get(tp)
+        if state is None:
+            state = self._partitions[tp] = _PartitionState()
+        state.records.extend(records)
+        if len(state.records) >= self.max_buffer and not state.paused:
+            self.consumer.pause(tp)
+            state.paused = True
+        if state.task is None or state.task.done():
+            state.task = asyncio.ensure_future(self._drain(tp, state))
+
+    async def _drain(self, tp: TopicPartition, state: _PartitionState):
+        route = self.routes[tp.topic]
+        while state.records:
+            record = state.records[0]
+            if route.attempt and not await self._wait_until_due(record, state):
+                return
+            async with self._semaphore:
+                if not await self._process(route, record, state):
+                    return
+            # 分区被回收时已清空队列
+            if state.records and state.records[0] is record:
+                state.records.popleft()
+            state.processed = record.offset
+            if state.paused and len(state.records) <= self.max_buffer // 2:
+                self.consumer.resume(tp)
+                state.paused = False
+
+    @staticmethod
+    async def _wait_until_due(record: ConsumerRecord, state: _PartitionState) -> bool:
+        """
+        同一重试 topic 的延迟相同, 分区头部的消息总是最早到期
+        :return: False 表示等待期间分区被回收
+        """
+        retry_at = get_header(record, HEADER_RETRY_AT)
+        delay = int(retry_at) / 1000 - time.time() if retry_at else 0
+        if delay > 0:
+            try:
+                await asyncio.wait_for(state.released.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+        return not state.released.is_set()
+
+    async def _process(self, route: _Route, record: ConsumerRecord, state: _PartitionState) -> bool:
+        """
+        失败时转发到下一级重试 topic 或死信 topic, 不阻塞同一分区的后续消息
+        :return: False 表示转发未成功且分区已被回收, 该消息不能提交
+        """
+        handler = route.handler
+        try:
+            value = record.value
+            if handler.deserializer is not None and value is not None:
+                value = handler.deserializer(value)
+            await handler.func(dataclasses.replace(record, value=value))
+            self.processed += 1
+            return True
+        except Exception as e:
+            self.failed += 1
+            logger.exception(
+                f"Kafka handler {handler.func.__name__} failed: {record.topic}[{record.partition}]@{record.offset}"
+            )
+            return await self._forward_failed(route, record, e, state)
+
+    async def _forward_failed(
+        self, route: _Route, record: ConsumerRecord, error: Exception, state: _PartitionState
+    ) -> bool:
+        topic, attempt = route.handler.topic, route.attempt + 1
+        delays = route.handler.retry_delays
+        dead_letter = attempt > len(delays)
+        if not dead_letter:
+            target = retry_topic(topic, attempt)
+            headers = failure_headers(record, topic, attempt, error, int((time.time() + delays[attempt - 1]) * 1000))
+        else:
+            target = dlq_topic(topic)
+            headers = failure_headers(record, topic, attempt, error)
+        backoff = self.retry_backoff
+        while True:
+            try:
+                await self.producer.send_and_wait(target, record.value, key=record.key, headers=headers)
+                break
+            except Exception as e:
+                logger.warning(f"Kafka forward to {target} failed: {e!r}")
+                if state.released.is_set():
+                    return False
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.retry_backoff_max)
+        if dead_letter:
+            self.dead_lettered += 1
+        else:
+            self.retried += 1
+        return True
+
+    async def _commit_loop(self):
+        while True:
+            await asyncio.sleep(self.commit_interval)
+            try:
+                await self.commit()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Kafka commit failed: {e}")
+
+    async def commit(self, partitions: List[TopicPartition] = None):
+        offsets = {}
+        for tp in partitions or list(self._partitions):
+            state = self._partitions.get(tp)
+            if state is not None and state.processed is not None and state.processed != state.committed:
+                offsets[tp] = state.processed + 1
+        if not offsets:
+            return
+        await self.consumer.commit(offsets)
+        for tp, offset in offsets.items():
+            self._partitions[tp].committed = offset - 1
+
+    async def release(self, partitions):
+        """
+        分区回收或停止时: 丢弃未处理的积压(由新的消费者重新拉取), 等待处理中的消息完成并提交
+        """
+        partitions = [tp for tp in partitions if tp in self._partitions]
+        tasks: Set[asyncio.Task] = set()
+        for tp in partitions:
+            state = self._partitions[tp]
+            state.records.clear()
+            state.released.set()
+            if state.task is not None and not state.task.done():
+                tasks.add(state.task)
+        if tasks:
+            await asyncio.wait(tasks)
+        try:
+            await self.commit(partitions)
+        except Exception as e:
+            logger.warning(f"Kafka commit on release failed: {e}")
+        for tp in partitions:
+            self._partitions.pop(tp, None)
+
+
+async def replay_dead_letters(
+    topic: str,
+    group_id: str = None,
+    limit: int = None,
+    producer_factory: Callable[..., AIOKafkaProducer] = None,
+    consumer_factory: Callable[..., AIOKafkaConsumer] = None,
+) -> int:
+    """
+    将 {topic}.dlq 中的消息去除重试头部后重新投递到原 topic, 读到启动时的末尾或达到 limit 后返回
+    :param topic: 原 topic
+    :param group_id: 记录回放进度的消费组, 默认 {topic}.dlq.replay, 重复执行不会重复投递
+    :param limit: 最多回放条数
+    :return: 回放条数
+    """
+    source = dlq_topic(topic)
+    consumer = (consumer_factory or AIOKafkaConsumer)(
+        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+        group_id=group_id or f"{source}.replay",
+        enable_auto_commit=False,
+        auto_offset_reset="earliest",
+    )
+    producer = (producer_factory or create_producer)()
+    await consumer.start()
+    await producer.start()
+    replayed = 0
+    try:
+        await consumer.topics()
+        partitions = [TopicPartition(source, p) for p in consumer.partitions_for_topic(source) or ()]
+        if not partitions:
+            return 0
+        consumer.assign(partitions)
+        end_offsets = await consumer.end_offsets(partitions)
+        remaining = [tp for tp in partitions if await consumer.position(tp) < end_offsets[tp]]
+        while remaining and (limit is None or replayed < limit):
+            max_records = None if limit is None else limit - replayed
+            batches = await consumer.getmany(*remaining, timeout_ms=1000, max_records=max_records)
+            futures, offsets = [], {}
+            for tp, records in batches.items():
+                for record in records:
+                    target = get_header(record, HEADER_TOPIC)
+                    target = target.decode() if target else topic
+                    futures.append(
+                        await producer.send(target, record.value, key=record.key, headers=strip_headers(record.headers))
+                    )
+                    offsets[tp] = record.offset + 1
+            await asyncio.gather(*futures)
+            if offsets:
+                await consumer.commit(offsets)
+            replayed += len(futures)
+            remaining = [tp for tp in remaining if await consumer.position(tp) < end_offsets[tp]]
+    finally:
+        await consumer.stop()
+        await producer.stop()
+    return replayed
+
+
+def run_worker(group_id: str, topics: List[str] = None, **kwargs):
+    """
+    单进程入口, SIGTERM / SIGINT 时处理完当前消息并提交后退出
+    """
+    load_handlers()
+    worker = ConsumerWorker(group_id, topics, **kwargs)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+
+    asyncio.run(main())
@@ -0,0 +1,319 @@
+"""
+进程内 Kafka 替身, 用于测试与基准, 实现本项目用到的 AIOKafkaProducer / AIOKafkaConsumer 接口
+
+broker = MemoryBroker(partitions=3)
+client = MyKafka(producer_factory=broker.create_producer, consumer_factory=broker.create_consumer)
+worker = ConsumerWorker("group", producer_factory=broker.create_producer, consumer_factory=broker.create_consumer)
+
+- topic 首次使用时按 partitions 自动创建, 有 key 按 crc32 选分区, 无 key 轮询
+- 同一 group 的消费者按分区轮流分配, 成员变化时在下一次 getmany 前触发 rebalance 回调
+- offset 按 (group, 分区) 保存, 未提交时按 auto_offset_reset 从头或末尾开始
+"""
+import time
+import zlib
+import asyncio
+import itertools
+from typing import Any, Set, Dict, List, Tuple, Callable, Optional
+from collections import defaultdict
+
+from aiokafka import TopicPartition
+from aiokafka.abc import ConsumerRebalanceListener
+from aiokafka.structs import RecordMetadata, ConsumerRecord
+
+from common.kafka import serialize, serialize_key
+
+
+class MemoryBroker:
+    def __init__(self, partitions: int = 3):
+        """
+        :param partitions: 自动创建 topic 的分区数
+        """
+        self.default_partitions = partitions
+        self.logs: Dict[str, List[List[ConsumerRecord]]] = {}
+        self.committed: Dict[Tuple[str, TopicPartition], int] = {}
+        self.groups: Dict[str, List["MemoryConsumer"]] = defaultdict(list)
+        self.generations: Dict[str, int] = defaultdict(int)
+        self._round_robin = itertools.count()
+        self._data: Optional[asyncio.Condition] = None
+
+    def create_topic(self, topic: str, partitions: int = None):
+        if topic not in self.logs:
+            self.logs[topic] = [[] for _ in range(partitions or self.default_partitions)]
+
+    def partitions_for(self, topic: str) -> List[TopicPartition]:
+        self.create_topic(topic)
+        return [TopicPartition(topic, p) for p in range(len(self.logs[topic]))]
+
+    def end_offset(self, tp: TopicPartition) -> int:
+        return len(self.logs[tp.topic][tp.partition])
+
+    @property
+    def data(self) -> asyncio.Condition:
+        if self._data is None:
+            self._data = asyncio.Condition()
+        return self._data
+
+    async def append(
+        self, topic: str, value: Optional[bytes], key: Optional[bytes], partition: int = None, headers: list = None
+    ) -> RecordMetadata:
+        self.create_topic(topic)
+        log = self.logs[topic]
+        if partition is None:
+            partition = zlib.crc32(key) % len(log) if key is not None else next(self._round_robin) % len(log)
+        timestamp = int(time.time() * 1000)
+        records = log[partition]
+        record = ConsumerRecord(
+            topic,
+            partition,
+            len(records),
+            timestamp,
+            0,
+            key,
+            value,
+            None,
+            len(key) if key is not None else -1,
+            len(value) if value is not None else -1,
+            list(headers or ()),
+        )
+        records.append(record)
+        async with self.data:
+            self.data.notify_all()
+        return RecordMetadata(topic, partition, TopicPartition(topic, partition), record.offset, timestamp, 0)
+
+    def join(self, consumer: "MemoryConsumer"):
+        self.groups[consumer.group_id].append(consumer)
+        self.generations[consumer.group_id] += 1
+
+    def leave(self, consumer: "MemoryConsumer"):
+        members = self.groups[consumer.group_id]
+        if consumer in members:
+            members.remove(consumer)
+            self.generations[consumer.group_id] += 1
+
+    def assignment(self, consumer: "MemoryConsumer") -> Set[TopicPartition]:
+        """
+        订阅相同 topic 的成员按加入顺序轮流分配分区
+        """
+        members = self.groups[consumer.group_id]
+        partitions = sorted(tp for topic in sorted(consumer.subscription) for tp in self.partitions_for(topic))
+        index = members.index(consumer)
+        return {tp for i, tp in enumerate(partitions) if i % len(members) == index}
+
+    def create_producer(self, **kwargs) -> "MemoryProducer":
+        return MemoryProducer(self, **kwargs)
+
+    def create_consumer(self, *topics: str, **kwargs) -> "MemoryConsumer":
+        return MemoryConsumer(self, *topics, **kwargs)
+
+
+class MemoryProducer:
+    def __init__(
+        self,
+        broker: MemoryBroker,
+        key_serializer: Callable[[Any], bytes] = serialize_key,
+        value_serializer: Callable[[Any], bytes] = serialize,
+        **kwargs,
+    ):
+        """
+        序列化默认与 common.kafka.create_producer 一致
+        """
+        self.broker = broker
+        self.key_serializer = key_serializer
+        self.value_serializer = value_serializer
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def send(self, topic: str, value=None, key=None, partition: int = None, headers: list = None, **kwargs):
+        if self.key_serializer is not None:
+            key = self.key_serializer(key)
+        if self.value_serializer is not None:
+            value = self.value_serializer(value)
+        return asyncio.ensure_future(self.broker.append(topic, value, key, partition, headers))
+
+    async def send_and_wait(self, *args, **kwargs) -> RecordMetadata:
+        return await (await self.send(*args, **kwargs))
+
+
+class MemoryConsumer:
+    def __init__(
+        self,
+        broker: MemoryBroker,
+        *topics: str,
+        group_id: str = None,
+        auto_offset_reset: str = "latest",
+        enable_auto_commit: bool = True,
+        max_poll_records: int = 500,
+        key_deserializer: Callable[[bytes], Any] = None,
+        value_deserializer: Callable[[bytes], Any] = None,
+        **kwargs,
+    ):
+        self.broker = broker
+        self.group_id = group_id
+        self.auto_offset_reset = auto_offset_reset
+        self.enable_auto_commit = enable_auto_commit
+        self.max_poll_records = max_poll_records
+        self.key_deserializer = key_deserializer
+        self.value_deserializer = value_deserializer
+        self.subscription: Set[str] = set(topics)
+        self.listener: Optional[ConsumerRebalanceListener] = None
+        self.positions: Dict[TopicPartition, int] = {}
+        self.paused: Set[TopicPartition] = set()
+        self._generation = -1
+        self._manual = False
+        self._rotation = itertools.count()
+        self._started = False
+
+    def subscribe(self, topics: List[str] = (), pattern: str = None, listener: ConsumerRebalanceListener = None):
+        self.subscription = set(topics)
+        self.listener = listener
+        self._generation = -1
+
+    def assign(self, partitions: List[TopicPartition]):
+        self._manual = True
+        self.positions = {tp: self._reset_position(tp) for tp in partitions}
+
+    def assignment(self) -> Set[TopicPartition]:
+        return set(self.positions)
+
+    async def start(self):
+        self._started = True
+        if self.group_id is not None and self.subscription and not self._manual:
+            self.broker.join(self)
+
+    async def stop(self):
+        if self._started and self.group_id is not None and not self._manual:
+            if self.enable_auto_commit:
+                await self.commit()
+            if self.listener is not None and self.positions:
+                await self.listener.on_partitions_revoked(set(self.positions))
+            self.broker.leave(self)
+        self._started = False
+
+    def _reset_position(self, tp: TopicPartition) -> int:
+        committed = self.broker.committed.get((self.group_id, tp))
+        if committed is not None:
+            return committed
+        return 0 if self.auto_offset_reset == "earliest" else self.broker.end_offset(tp)
+
+    async def _rebalance(self):
+        if self._manual or self.group_id is None:
+            if not self.positions:
+                self.positions = {
+                    tp: self._reset_position(tp) for t in self.subscription for tp in self.broker.partitions_for(t)
+                }
+            return
+        generation = self.broker.generations[self.group_id]
+        if generation == self._generation:
+            return
+        self._generation = generation
+        assigned = self.broker.assignment(self)
+        revoked = set(self.positions) - assigned
+        if revoked and self.listener is not None:
+            await self.listener.on_partitions_revoked(revoked)
+        self.positions = {tp: self._reset_position(tp) for tp in assigned}
+        self.paused &= assigned
+        if self.listener is not None:
+            await self.listener.on_partitions_assigned(assigned)
+
+    def _fetch(self, partitions: List[TopicPartition], max_records: int) -> Dict[TopicPartition, List[ConsumerRecord]]:
+        # 轮换起始分区, 避免 max_records 较小时靠前的分区独占
+        start = next(self._rotation) % len(partitions) if partitions else 0
+        result = {}
+        for tp in partitions[start:] + partitions[:start]:
+            if max_records <= 0:
+                break
+            if tp in self.paused or tp not in self.positions:
+                continue
+            position = self.positions[tp]
+            records = self.broker.logs[tp.topic][tp.partition][position: position + max_records]
+            if not records:
+                continue
+            self.positions[tp] = position + len(records)
+            max_records -= len(records)
+            result[tp] = [self._deserialize(r) for r in records]
+        return result
+
+    def _deserialize(self, record: ConsumerRecord) -> ConsumerRecord:
+        if self.key_deserializer is None and self.value_deserializer is None:
+            return record
+        key, value = record.key, record.value
+        if self.key_deserializer is not None and key is not None:
+            key = self.key_deserializer(key)
+        if self.value_deserializer is not None and value is not None:
+            value = self.value_deserializer(value)
+        return ConsumerRecord(
+            record.topic,
+            record.partition,
+            record.offset,
+            record.timestamp,
+            record.timestamp_type,
+            key,
+            value,
+            record.checksum,
+            record.serialized_key_size,
+            record.serialized_value_size,
+            record.headers,
+        )
+
+    async def getmany(
+        self, *partitions: TopicPartition, timeout_ms: int = 0, max_records: int = None
+    ) -> Dict[TopicPartition, List[ConsumerRecord]]:
+        await self._rebalance()
+        partitions = list(partitions) or sorted(self.positions)
+        max_records = max_records or self.max_poll_records
+        result = self._fetch(partitions, max_records)
+        if not result and timeout_ms:
+            try:
+                async with self.broker.data:
+                    # 持锁后再取一次, 避免错过等待前写入的消息
+                    result = self._fetch(partitions, max_records)
+                    if not result:
+                        await asyncio.wait_for(self.broker.data.wait(), timeout_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            if not result:
+                await self._rebalance()
+                result = self._fetch(partitions, max_records)
+        if result and self.enable_auto_commit and self.group_id is not None:
+            await self.commit()
+        return result
+
+    async def getone(self) -> ConsumerRecord:
+        while True:
+            result = await self.getmany(timeout_ms=1000, max_records=1)
+            for records in result.values():
+                return records[0]
+
+    def pause(self, *partitions: TopicPartition):
+        self.paused.update(partitions)
+
+    def resume(self, *partitions: TopicPartition):
+        self.paused.difference_update(partitions)
+
+    async def commit(self, offsets: Dict[TopicPartition, int] = None):
+        for tp, offset in (self.positions if offsets is None else offsets).items():
+            self.broker.committed[(self.group_id, tp)] = offset
+
+    async def committed(self, tp: TopicPartition) -> Optional[int]:
+        return self.broker.committed.get((self.group_id, tp))
+
+    async def position(self, tp: TopicPartition) -> int:
+        return self.positions[tp]
+
+    async def end_offsets(self, partitions: List[TopicPartition]) -> Dict[TopicPartition, int]:
+        return {tp: self.broker.end_offset(tp) for tp in partitions}
+
+    async def topics(self) -> Set[str]:
+        return set(self.broker.logs)
+
+    def partitions_for_topic(self, topic: str) -> Optional[Set[int]]:
+        if topic not in self.broker.logs:
+            return None
+        return set(range(len(self.broker.logs[topic])))
@@ -0,0 +1,182 @@
+"""
+事务发件箱: 业务数据与事件在同一事务中写入 MySQL, 由后台 relay 批量投递到 Kafka
+
+user.add_event("user_changed", {"id": user.id}, key=str(user.id))
+await user.save()
+
+或在模型中覆盖 outbox_events, 每次 save 自动产生事件
+
+至少一次投递, 下游需按业务主键幂等. 同一时刻只有持有 Redis 锁的一个 relay 投递, 其余等待接替;
+同一 key 的事件按 id 顺序投递, 某条失败时它与同 key 的后续事件都保持待投递, 下一批按顺序重发,
+因此后续事件可能重复, 但每个事件最后一次投递的顺序与 id 一致. 超过 OUTBOX_MAX_ATTEMPTS 的事件
+标记为投递失败, 不再阻塞同 key 的后续事件
+
+默认不随应用启动(OUTBOX_RELAY_ENABLED), 单独运行: python manage.py kafka relay-outbox
+"""
+import signal
+import asyncio
+import logging
+import datetime
+from typing import List, Optional
+
+from tortoise import Tortoise
+
+from common.kafka import kafka
+from common.utils import redis_lock, datetime_now
+from core.settings import settings
+from db.redis import AsyncRedisUtil
+from db.redis.keys import RedisCacheKey
+from db.mysql.enums import OutboxStatus
+from db.mysql.models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    # 清理已投递记录的间隔(秒)
+    purge_interval = 3600
+    # 主 relay 锁的租期(秒), 持有期间后台自动续期, 持有者崩溃后由其他 relay 接替;
+    # 大于生产者请求超时(aiokafka 默认 40 秒), 一次续期失败不至于在等待确认时被接替
+    lock_timeout = 60
+
+    def __init__(self, batch_size: int = None, interval: float = None, max_attempts: int = None):
+        """
+        :param batch_size: 每批投递条数
+        :param interval: 没有积压时的轮询间隔(秒)
+        :param max_attempts: 超过后标记为投递失败, 不再重试
+        """
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.interval = interval or settings.OUTBOX_INTERVAL
+        self.max_attempts = max_attempts or settings.OUTBOX_MAX_ATTEMPTS
+        self.relayed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    async def _send(events: List[OutboxEvent]) -> list:
+        """
+        整批写入生产者缓冲后等待确认, 同一 key 的事件按 id 顺序进入同一分区
+        :return: 与 events 对应的 RecordMetadata 或异常
+        """
+        producer = await kafka.get_producer()
+        futures = []
+        for event in events:
+            headers = [(k, str(v).encode()) for k, v in (event.headers or {}).items()]
+            try:
+                futures.append(await producer.send(event.topic, event.payload, key=event.key, headers=headers))
+            except Exception as e:
+                fut = asyncio.get_running_loop().create_future()
+                fut.set_exception(e)
+                futures.append(fut)
+        return list(await asyncio.gather(*futures, return_exceptions=True))
+
+    async def relay_once(self, handle=None) -> int:
+        """
+        投递一批待投递事件, 等待确认后再标记结果, 投递期间不持有事务和行锁; 需保证只有一个 relay 调用
+        :param handle: 主 relay 锁, 标记结果前确认仍持有, 已被接替时交给新的主 relay 处理
+        :return: 本批条数
+        """
+        events = await OutboxEvent.filter(status=OutboxStatus.pending).order_by("id").limit(self.batch_size)
+        if not events:
+            return 0
+        results = await self._send(events)
+        if handle is not None and not await handle.extend():
+            logger.warning(f"Outbox relay lock lost while sending {len(events)} events, leaving them pending")
+            return 0
+        sent, failed, blocked = [], [], set()
+        for event, result in zip(events, results):
+            if event.key is not None and event.key in blocked:
+                # 排在同 key 失败事件之后, 保持待投递, 下一批按顺序重发
+                continue
+            if not isinstance(result, BaseException):
+                sent.append(event.id)
+                continue
+            failed.append((event, result))
+            event.attempts += 1
+            if event.attempts < self.max_attempts and event.key is not None:
+                blocked.add(event.key)
+        if sent:
+            await OutboxEvent.filter(id__in=sent).update(status=OutboxStatus.sent, sent_at=datetime_now())
+        for event, result in failed:
+            event.last_error = repr(result)[:1024]
+            if event.attempts >= self.max_attempts:
+                event.status = OutboxStatus.failed
+                logger.error(f"Outbox event {event.id} to {event.topic} failed permanently: {result!r}")
+            await event.save(update_fields=["attempts", "last_error", "status"])
+        self.relayed += len(sent)
+        return len(events)
+
+    async def purge(self, days: int = None) -> int:
+        """
+        删除 days 天前已投递的事件
+        """
+        before = datetime_now() - datetime.timedelta(days=days or settings.OUTBOX_RETENTION_DAYS)
+        return await OutboxEvent.filter(status=OutboxStatus.sent, sent_at__lt=before).delete()
+
+    async def _run(self):
+        lock_key = RedisCacheKey.redis_lock.format("outbox_relay")
+        while True:
+            try:
+                async with redis_lock.lock(lock_key, timeout=self.lock_timeout, auto_extend=True) as handle:
+                    await self._lead(handle)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Outbox relay failed: {e}")
+                await asyncio.sleep(self.interval)
+
+    async def _lead(self, handle):
+        """
+        持有锁期间循环投递, 续期失败说明锁已被接替, 退出后重新竞争
+        """
+        last_purge = 0.0
+        loop = asyncio.get_running_loop()
+        while await handle.extend():
+            count = await self.relay_once(handle)
+            if loop.time() - last_purge > self.purge_interval:
+                last_purge = loop.time()
+                await self.purge()
+            # 满批说明仍有积压, 立即继续
+            if count < self.batch_size:
+                await asyncio.sleep(self.interval)
+        logger.warning("Outbox relay lock lost, waiting to take over again")
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+outbox_relay = OutboxRelay()
+
+
+def run_relay():
+    """
+    独立进程入口, SIGTERM / SIGINT 时投递完当前批次后退出
+    """
+
+    async def main():
+        await Tortoise.init(config=settings.TORTOISE_ORM_CONFIG)
+        await AsyncRedisUtil.init()
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stopped.set)
+        await outbox_relay.start()
+        try:
+            await stopped.wait()
+        finally:
+            await outbox_relay.stop()
+            await kafka.close()
+            await AsyncRedisUtil.close()
+            await Tortoise.close_connections()
+
+    asyncio.run(main())
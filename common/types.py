@@ -3,7 +3,7 @@ from enum import Enum
 
 class IntEnumMore(int, Enum):
     def __new__(cls, value, label):
-        obj = int.__new__(cls)
+        obj = int.__new__(cls, value)
         obj._value_ = value
         obj.label = label
         return obj
@@ -15,7 +15,7 @@ class IntEnumMore(int, Enum):
 
 class StrEnumMore(str, Enum):
     def __new__(cls, value, label):
-        obj = str.__new__(cls)
+        obj = str.__new__(cls, value)
         obj._value_ = value
         obj.label = label
         return obj
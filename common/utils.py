@@ -1,10 +1,12 @@
 import os
 import sys
+import time
 import random
 import string
+import logging
 import threading
 from typing import List, Union, Sequence
-from asyncio import sleep
+from asyncio import Semaphore, sleep, ensure_future
 from datetime import datetime
 from functools import wraps
 from contextlib import asynccontextmanager
@@ -19,6 +21,10 @@ from starlette.requests import Request
 
 from db.redis import get_async_redis
 from core.settings import settings
+from db.redis.cluster import ShardedRedis, same_shard_key
+from db.redis.scripts import ACQUIRE_LOCK_SCRIPT, EXTEND_LOCK_SCRIPT, RELEASE_NOTIFY_LOCK_SCRIPT
+
+logger = logging.getLogger(__name__)
 
 COMMON_TIME_STRING = "%Y-%m-%d %H:%M:%S"
 COMMON_DATE_STRING = "%Y-%m-%d"
@@ -231,9 +237,56 @@ def commify(n: Union[int, float]):
 
 RedisLock = namedtuple("RedisLock", ["lock"])
 
+# 通知队列保留时长, 无等待者时推送的通知自动过期
+_LOCK_NOTIFY_TTL = 10 * 1000
+# 轮询退避的基础与上限(秒)
+_LOCK_BACKOFF_BASE = 0.01
+_LOCK_BACKOFF_MAX = 0.5
+# BLPOP 会占用连接池中的连接, 限制单进程同时阻塞等待的数量, 其余退避轮询
+_LOCK_MAX_BLOCKING_WAITERS = 4
+
+
+class LockAcquireTimeout(Exception):
+    """
+    等待锁超时
+    """
+
+
+class RedisLockHandle:
+    """
+    已获取的锁, fence 为单调递增的栅栏令牌, 写下游时携带以拒绝过期持有者
+    """
+
+    def __init__(self, redis, key: str, token: bytes, fence: int, timeout: int):
+        self.redis = redis
+        self.key = key
+        self.token = token
+        self.fence = fence
+        self.timeout = timeout
+
+    async def extend(self, timeout: int = None) -> bool:
+        """
+        续期, 锁已丢失时返回 False
+        :param timeout: 新的租期(秒), 默认与获取时一致
+        """
+        timeout = timeout or self.timeout
+        return bool(await EXTEND_LOCK_SCRIPT.execute(self.redis, [self.key], [self.token, int(timeout * 1000)]))
+
+    async def _keep_alive(self):
+        while True:
+            await sleep(self.timeout / 3)
+            if not await self.extend():
+                logger.warning(f"redis lock {self.key} lost before release")
+                return
+
+
+def _lock_backoff(attempt: int) -> float:
+    return random.uniform(0, min(_LOCK_BACKOFF_MAX, _LOCK_BACKOFF_BASE * 2 ** attempt))
+
 
 def make_redis_lock(get_redis):
     redis = None
+    blocking_waiters = None
 
     async def get_redis_():
         nonlocal redis
@@ -244,33 +297,58 @@ def make_redis_lock(get_redis):
         return redis
 
     @asynccontextmanager
-    async def lock(key, timeout=60):
+    async def lock(key, timeout=60, blocking_timeout: float = None, auto_extend: bool = False):
+        """
+        :param key:
+        :param timeout: 租期(秒), 持有者崩溃后锁自动释放
+        :param blocking_timeout: 最长等待秒数, 为空一直等待, 超时抛出 LockAcquireTimeout
+        :param auto_extend: 持有期间后台自动续期, 用于耗时不确定的临界区
+        """
+        nonlocal blocking_waiters
+
         r = await get_redis_()
+        if blocking_waiters is None:
+            blocking_waiters = Semaphore(_LOCK_MAX_BLOCKING_WAITERS)
         v = os.urandom(20)
-
-        accuired = False
-
-        while not accuired:
-            accuired = await r.set(key, v, expire=timeout, exist="SET_IF_NOT_EXIST")
-
-            if not accuired:
-                await sleep(1)
-
+        fence_key, notify_key = same_shard_key(key, ":fence"), same_shard_key(key, ":notify")
+        deadline = None if blocking_timeout is None else time.monotonic() + blocking_timeout
+        attempt = 0
+
+        while True:
+            acquired, value = await ACQUIRE_LOCK_SCRIPT.execute(r, [key, fence_key], [v, int(timeout * 1000)])
+            if acquired:
+                break
+            # 最多等到锁过期, 持有者未释放就崩溃时也能及时重试
+            wait = value / 1000 if value > 0 else _LOCK_BACKOFF_MAX
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LockAcquireTimeout(f"acquire redis lock {key} timeout")
+                wait = min(wait, remaining)
+            if wait < 1 or blocking_waiters.locked():
+                # BLPOP 超时精度为秒, 短等待或阻塞名额已满时退避轮询
+                await sleep(min(wait, _lock_backoff(attempt)))
+                attempt += 1
+                continue
+            try:
+                # 持有者释放时推送通知, 唤醒一个等待者
+                # 连接池中的空闲连接是多路复用的, 阻塞命令需独占一个连接
+                async with blocking_waiters:
+                    with await (r.node_for(notify_key) if isinstance(r, ShardedRedis) else r) as conn:
+                        await conn.blpop(notify_key, timeout=int(wait))
+            except Exception as e:
+                logger.warning(f"wait redis lock {key} notification failed: {e}")
+                await sleep(_lock_backoff(attempt))
+                attempt += 1
+
+        handle = RedisLockHandle(r, key, v, value, timeout)
+        keep_alive = ensure_future(handle._keep_alive()) if auto_extend else None
         try:
-            yield
+            yield handle
         finally:
-            await r.eval(
-                """
-                if redis.call("get", KEYS[1]) == ARGV[1]
-                then
-                    return redis.call("del", KEYS[1])
-                else
-                    return 0
-                end
-            """,
-                [key],
-                [v],
-            )
+            if keep_alive is not None:
+                keep_alive.cancel()
+            await RELEASE_NOTIFY_LOCK_SCRIPT.execute(r, [key, notify_key], [v, _LOCK_NOTIFY_TTL])
 
     _redis_lock = RedisLock(lock=lock,)
 
@@ -279,6 +357,6 @@ def make_redis_lock(get_redis):
 
 redis_lock = make_redis_lock(get_async_redis)  # redis lock in async context
 """
-async with redis_lock.lock(keys.RedisCacheKey.redis_lock.format("name")):
-    pass
+async with redis_lock.lock(keys.RedisCacheKey.redis_lock.format("name"), blocking_timeout=5) as handle:
+    handle.fence  # 栅栏令牌
 """
@@ -69,6 +69,11 @@ class SignCheckFailedException(ApiException):
     message = ResponseCodeEnum.SignCheckFailed.label
 
 
+class TooManyRequestsException(ApiException):
+    code = ResponseCodeEnum.TooManyRequests.value
+    message = ResponseCodeEnum.TooManyRequests.label
+
+
 class NotFoundException(ApiException):
     code = 100404
     message = "不存在"
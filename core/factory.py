@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 from fastapi import FastAPI, APIRouter
@@ -8,6 +9,10 @@ from tortoise.contrib.starlette import register_tortoise
 from sentry_sdk.integrations.redis import RedisIntegration
 
 from db.redis import AsyncRedisUtil
+from db.redis.cache import invalidation_listener
+from db.hbase.pool import hbase_pool, close_hbase_pool
+from common.kafka import kafka
+from common.outbox import outbox_relay
 from core.globals import GlobalsMiddleware
 from core.response import AesResponse
 from core.settings import Settings, settings
@@ -93,16 +98,36 @@ def setup_sentry(current_settings: Settings):
     )
 
 
+async def warm_up_hbase_pool():
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, lambda: hbase_pool().warm_up())
+    except Exception as e:
+        logger.warning(f"HBase connection pool warm up failed: {e}")
+
+
 def init_apps(main_app: FastAPI):
     @main_app.on_event("startup")
     async def init() -> None:
         # 初始化redis
         await AsyncRedisUtil.init()
+        # 订阅L1缓存失效广播
+        await invalidation_listener.start()
+        # 后台预热HBase连接池, HBase 不可达时不阻塞启动
+        if settings.HBASE_POOL_WARM_UP:
+            main_app.state.hbase_warm_up = asyncio.ensure_future(warm_up_hbase_pool())
+        # 后台投递发件箱事件
+        if settings.OUTBOX_RELAY_ENABLED:
+            await outbox_relay.start()
 
     @main_app.on_event("shutdown")
     async def close() -> None:
+        await outbox_relay.stop()
+        await invalidation_listener.stop()
         # 关闭redis
         await AsyncRedisUtil.close()
+        close_hbase_pool()
+        # 发送缓冲中的消息并关闭生产者
+        await kafka.close()
 
 
 def create_app(current_settings: Settings):
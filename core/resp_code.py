@@ -23,3 +23,4 @@ class ResponseCodeEnum(IntEnumMore):
     PermissionDeny = (100995, "权限不足")
     TimeStampExpired = (100994, "时间戳过期")
     SignCheckFailed = (100993, "Sign校验失败")
+    TooManyRequests = (100992, "请求过于频繁")
@@ -1,7 +1,7 @@
 import os
 import pathlib
 import multiprocessing
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Union, Optional
 from functools import lru_cache
 
 from pydantic import EmailStr, BaseSettings, validator
@@ -45,16 +45,63 @@ class Settings(BaseSettings):
     REDIS_HOST: str = "127.0.0.1"
     REDIS_PORT: int = 6379
     REDIS_PASSWORD: str = None
+    # 分片节点 host:port 列表, 不为空时按一致性哈希分片, 忽略 REDIS_HOST/REDIS_PORT
+    REDIS_NODES: List[str] = []
+    REDIS_POOL_MINSIZE: int = 1
+    REDIS_POOL_MAXSIZE: int = 10
+    # 空闲连接健康检查间隔(秒), 0 关闭
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    # 进程内L1缓存容量与最长过期时间(秒)
+    REDIS_L1_CACHE_SIZE: int = 1024
+    REDIS_L1_CACHE_TTL: int = 60
+    # 默认值编解码: orjson / msgpack, 为空时原样读写; 超过阈值(字节)时按 REDIS_COMPRESSION 压缩
+    REDIS_CODEC: Optional[str] = None
+    REDIS_COMPRESSION: Optional[str] = None
+    REDIS_COMPRESS_MIN_SIZE: int = 1024
 
     # =========HBase
     THRIFT_HOST: str = "192.168.3.75"
     THRIFT_PORT: int = 9090
+    # 共享连接池大小, 异步接口的线程池与之相同
+    HBASE_POOL_SIZE: int = 10
+    # 获取连接最长等待(秒)
+    HBASE_POOL_TIMEOUT: float = 10
+    # 连接空闲超过该秒数后, 复用前先校验, 为空不校验
+    HBASE_POOL_VALIDATE_IDLE: Optional[float] = 60
+    # 启动后在后台预先建立全部连接, 不阻塞启动
+    HBASE_POOL_WARM_UP: bool = False
+    # 只读请求连接异常重试次数
+    HBASE_READ_RETRIES: int = 2
+    # 异步接口默认超时(秒)
+    HBASE_TIMEOUT: float = 30
 
     # SocketIO Redis Manager
     SIO_REDIS_URL: str = f"redis://:{REDIS_PASSWORD}@{REDIS_PORT}:{REDIS_PORT}/4"
 
     # Kafka
     KAFKA_BOOTSTRAP_SERVERS: str = "http://localhost:9091"
+    # 生产者按分区攒批: 最长等待(毫秒)与单批最大字节数
+    KAFKA_LINGER_MS: int = 5
+    KAFKA_MAX_BATCH_SIZE: int = 65536
+    # gzip / snappy / lz4 / zstd, 为空不压缩(lz4 需安装 lz4, zstd 需安装 zstandard)
+    KAFKA_COMPRESSION: Optional[str] = None
+    # 0 / 1 / all
+    KAFKA_ACKS: Union[int, str] = 1
+    # 消费者: 注册处理函数的模块、总并发、每次拉取条数、提交 offset 间隔(秒)
+    KAFKA_HANDLER_MODULES: List[str] = ["apps.consumers"]
+    KAFKA_CONSUMER_CONCURRENCY: int = 32
+    KAFKA_CONSUMER_BATCH_SIZE: int = 500
+    KAFKA_COMMIT_INTERVAL: float = 5
+    KAFKA_AUTO_OFFSET_RESET: str = "latest"
+    # 处理失败后各级重试 topic 的延迟(秒), 耗尽后进入死信 topic
+    KAFKA_RETRY_DELAYS: List[float] = [5, 60, 600]
+
+    # Outbox: 后台投递开关、每批条数、无积压时轮询间隔(秒)、最大投递次数、已投递记录保留天数
+    OUTBOX_RELAY_ENABLED: bool = False
+    OUTBOX_BATCH_SIZE: int = 500
+    OUTBOX_INTERVAL: float = 1
+    OUTBOX_MAX_ATTEMPTS: int = 10
+    OUTBOX_RETENTION_DAYS: int = 7
 
     # Template
     TEMPLATE_PATH: str = f"{ROOT}/templates"
@@ -1,19 +1,70 @@
-from typing import Dict, List, Type, Tuple
-from contextlib import contextmanager
+import time
+import heapq
+import asyncio
+import threading
+from typing import Any, Dict, List, Type, Tuple, Union, Callable, Iterable, Iterator, Optional, AsyncIterator
+from functools import partial
+from itertools import chain
+from contextlib import closing, contextmanager
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
 from pydantic import BaseModel as PydanticBaseModel
 from pydantic import create_model
-from happybase import Table, Connection, ConnectionPool
+from happybase import Batch, Table, Connection
+from happybase.util import bytes_increment
 
 from common.types import Map
+from db.hbase.columns import (  # noqa: F401
+    Column,
+    IntColumn,
+    EnumColumn,
+    JSONColumn,
+    FloatColumn,
+    DateTimeColumn,
+)
+from db.hbase import columnar
+from db.hbase.cache import RowCache, columns_key
+from db.hbase.pool import TRANSPORT_ERRORS, HBaseConnectionPool, hbase_pool
+from db.hbase.rowkey import RowKey, FixedInt, KeyPart, ReversedTimestamp  # noqa: F401
+from db.hbase.rows import CompactRow, make_row_class, make_row_decoder
 from core.settings import settings
 
 
-def hbase_connection_pool(size: int = 10, **kwargs) -> ConnectionPool:
-    pool = ConnectionPool(size=size, host=settings.THRIFT_HOST, port=settings.THRIFT_PORT, **kwargs)
+RowKeyType = Union[str, bytes]
+
+# 并发扫描的输出方式
+_ORDERED = "ordered"
+_UNORDERED = "unordered"
+_MERGE = "merge"
+
+
+def _to_bytes(value: RowKeyType) -> bytes:
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+def hbase_connection_pool(size: int = None, **kwargs) -> HBaseConnectionPool:
+    """
+    独立的连接池, 模型默认使用共享的 hbase_pool()
+    """
+    pool = HBaseConnectionPool(
+        size=size or settings.HBASE_POOL_SIZE, host=settings.THRIFT_HOST, port=settings.THRIFT_PORT, **kwargs
+    )
     return pool
 
 
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def hbase_executor() -> ThreadPoolExecutor:
+    """
+    异步接口专用线程池, 线程数与连接池大小一致, 避免线程阻塞在等待连接上
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.HBASE_POOL_SIZE, thread_name_prefix="hbase")
+    return _executor
+
+
 @contextmanager
 def hbase_connection(**kwargs):
     conn = Connection(host=settings.THRIFT_HOST, port=settings.THRIFT_PORT, **kwargs)
@@ -23,6 +74,67 @@ def hbase_connection(**kwargs):
         conn.close()
 
 
+class BatchWriter:
+    """
+    批量写入, 累计 batch_size 行或距上次发送超过 flush_interval 秒时发送一次 mutateRows
+    时间条件在每次写入时检查, 不会在空闲时后台发送
+    """
+
+    def __init__(
+        self,
+        model: Type["BaseModel"],
+        table: Table,
+        batch_size: int = 1000,
+        flush_interval: float = None,
+        timestamp: int = None,
+        wal: bool = True,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._batch: Batch = table.batch(timestamp=timestamp, wal=wal)
+        self._pending = 0
+        self._pending_rows = set()
+        self._last_flush = time.monotonic()
+        self.written = 0
+        self.flushes = 0
+
+    def put(self, row: str, data: dict, wal: bool = None):
+        """
+        :param row:
+        :param data: 字段名 -> 值, 值为 None 的字段不写入
+        :param wal: 覆盖整批的 wal 设置
+        """
+        self._batch.put(row, self.model.parse_data(data), wal=wal)
+        self._written(row)
+
+    def delete(self, row: str, fields: List[str] = None, wal: bool = None):
+        columns = None if fields is None else [getattr(self.model, f) for f in fields]
+        self._batch.delete(row, columns=columns, wal=wal)
+        self._written(row)
+
+    def _written(self, row: str):
+        self._pending += 1
+        if self.model._row_cache is not None:
+            self._pending_rows.add(_to_bytes(row))
+        if self._pending >= self.batch_size or (
+            self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._batch.send()
+            if self._pending_rows:
+                self.model._row_cache.invalidate(*self._pending_rows)
+                self._pending_rows = set()
+            self.written += self._pending
+            self.flushes += 1
+            self._pending = 0
+        self._pending_rows = set()
+        self._last_flush = time.monotonic()
+
+
 _RESPONSE_MODEL_INDEX: Dict[str, Type[PydanticBaseModel]] = {}
 
 
@@ -43,13 +155,28 @@ class BaseModelMeta(type):
             if not table_name:
                 raise Exception(f"Must specify table_name of HBase Model - {name} in Meta class")
             attrs["_table_name"] = table_name
+            row_cache: Optional[RowCache] = getattr(meta_class, "row_cache", None)
+            if row_cache is not None:
+                row_cache.bind(table_name)
+            attrs["_row_cache"] = row_cache
+            row_key = getattr(meta_class, "row_key", None)
+            if row_key is not None and not isinstance(row_key, RowKey):
+                raise Exception(f"Meta.row_key of HBase Model - {name} must be a RowKey")
+            attrs["_row_key"] = row_key
             bytes_to_str_map = {}
-            for k, v in attrs.items():
+            columns = {}
+            for k, v in list(attrs.items()):
                 if isinstance(v, bytes):
-                    bytes_to_str_map[v] = k
+                    v = Column(v)
+                if isinstance(v, Column):
+                    # 类属性保持为列名, 便于直接用于 happybase 参数
+                    attrs[k] = v.name
+                    bytes_to_str_map[v.name] = k
+                    columns[k] = v
             if not bytes_to_str_map:
                 raise Exception(f"Must define one column at least of HBase Model - {name}")
             attrs["_bytes_to_str_map"] = bytes_to_str_map
+            attrs["_columns"] = columns
         return super().__new__(mcs, name, bases, attrs)
 
     @property
@@ -59,13 +186,29 @@ class BaseModelMeta(type):
             return _RESPONSE_MODEL_INDEX[model_name]
 
         attrs = {}
-        for _, field_name in cls._bytes_to_str_map.items():
-            attrs[field_name] = (str, None)
+        for field_name, column in cls._columns.items():
+            attrs[field_name] = (column.python_type, None)
 
         _RESPONSE_MODEL_INDEX[model_name] = create_model(model_name, **attrs)
 
         return _RESPONSE_MODEL_INDEX[model_name]
 
+    @property
+    def row_class(cls) -> Type[CompactRow]:
+        if "_row_class" not in cls.__dict__:
+            cls._row_class = make_row_class(f"{cls.__name__}Row", ("row_key", *cls._bytes_to_str_map.values()))
+        return cls._row_class
+
+    @property
+    def row_decoder(cls) -> Callable[[bytes, dict], CompactRow]:
+        """
+        预编译的 decode(row_key, data) -> row_class
+        """
+        if "_row_decoder" not in cls.__dict__:
+            columns = cls._columns.values()
+            cls._row_decoder = make_row_decoder(cls.row_class, [c.name for c in columns], [c.decode for c in columns])
+        return cls._row_decoder
+
 
 class BaseModel(metaclass=BaseModelMeta):
     """
@@ -80,27 +223,111 @@ class BaseModel(metaclass=BaseModelMeta):
             - {ColumnFamilyB:Column = Value4}
     """
 
-    _pool = None
+    # 为空时使用共享的 hbase_pool()
+    _pool: Optional[HBaseConnectionPool] = None
     _table_name = None
     _bytes_to_str_map = None
+    _columns: Dict[str, Column] = None
+    _row_cache: Optional[RowCache] = None
+    _row_key: Optional[RowKey] = None
 
     class Meta:
         abstract = True
         table_name = None
 
     @classmethod
-    def serialize(cls, retrieved_data):
+    def get_pool(cls) -> HBaseConnectionPool:
+        return cls._pool if cls._pool is not None else hbase_pool()
+
+    @classmethod
+    def make_row_key(cls, data: dict) -> bytes:
+        """
+        按 Meta.row_key 由字段值生成 row key(含盐)
+        FaultRecordData.put_many((FaultRecordData.make_row_key(r), r) for r in records)
+        """
+        if cls._row_key is None:
+            raise TypeError(f"HBase Model {cls.__name__} has no Meta.row_key")
+        return cls._row_key.build(data)
+
+    @classmethod
+    def row_key_prefix(cls, values: dict, salted: bool = True) -> bytes:
+        """
+        见 RowKey.prefix, salted=False 的结果用于 bucket_scan
+        """
+        if cls._row_key is None:
+            raise TypeError(f"HBase Model {cls.__name__} has no Meta.row_key")
+        return cls._row_key.prefix(values, salted)
+
+    @classmethod
+    def resolve_columns(cls, columns: List[Union[str, bytes]] = None) -> List[bytes]:
+        """
+        字段名转为列名, 为空时返回模型声明的全部列, 避免拉取未声明的列
+        :param columns: 字段名("vin"), 列名(b"A:a01" / "A:a01") 或列族("A")
+        """
+        if columns is None:
+            return list(cls._bytes_to_str_map)
         result = []
-        for row_key, hbase_data in retrieved_data:
-            item = {"row_key": row_key}
-            for k, v in cls._bytes_to_str_map.items():
-                value = hbase_data.get(k)
-                if isinstance(value, bytes):
-                    value = value.decode()
-                item[v] = value
-            result.append(Map(item))
+        for column in columns:
+            if column in cls._columns:
+                result.append(cls._columns[column].name)
+            else:
+                result.append(_to_bytes(column))
         return result
 
+    @classmethod
+    def _table_call(cls, method: str, *args, **kwargs):
+        with cls.get_pool().connection() as conn:
+            table = conn.table(cls._table_name)  # type: Table
+            return getattr(table, method)(*args, **kwargs)
+
+    @classmethod
+    def retry_read(cls, func: Callable, *args, **kwargs):
+        """
+        只读请求遇到连接层异常时重试 settings.HBASE_READ_RETRIES 次, 连接池已替换失效连接
+        """
+        pool = cls.get_pool()
+        for attempt in range(settings.HBASE_READ_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except TRANSPORT_ERRORS:
+                if attempt >= settings.HBASE_READ_RETRIES:
+                    raise
+                cls._before_retry(pool, attempt)
+
+    @staticmethod
+    def _before_retry(pool: HBaseConnectionPool, attempt: int):
+        metrics = getattr(pool, "metrics", None)
+        if metrics is not None:
+            metrics.retries += 1
+        time.sleep(min(0.1 * 2 ** attempt, 1))
+
+    @classmethod
+    def serialize_row(cls, row_key: bytes, hbase_data: dict) -> Map:
+        item = {"row_key": row_key}
+        for k, column in cls._columns.items():
+            value = hbase_data.get(column.name)
+            if isinstance(value, bytes):
+                value = column.decode(value)
+            item[k] = value
+        return Map(item)
+
+    @classmethod
+    def get_decoder(cls, compact: bool = False, include_timestamp: bool = False) -> Callable:
+        """
+        :param compact: 使用 row_class 代替 Map, 不支持 include_timestamp
+        :param include_timestamp:
+        """
+        if not compact:
+            return cls.serialize_row
+        if include_timestamp:
+            raise ValueError("compact rows do not support 'include_timestamp'")
+        return cls.row_decoder
+
+    @classmethod
+    def serialize(cls, retrieved_data, compact: bool = False, include_timestamp: bool = False):
+        decode = cls.get_decoder(compact, include_timestamp)
+        return [decode(row_key, hbase_data) for row_key, hbase_data in retrieved_data]
+
     @classmethod
     def scan(
         cls,
@@ -116,12 +343,10 @@ class BaseModel(metaclass=BaseModelMeta):
         limit: int = None,
         sorted_columns: bool = False,
         reverse: bool = False,
+        compact: bool = False,
     ):
-        if cls._pool is None:
-            cls._pool = hbase_connection_pool()
-        with cls._pool.connection() as conn:
-            table = conn.table(cls._table_name)  # type: Table
-            data = table.scan(
+        return list(
+            cls.iter_scan(
                 row_start=row_start,
                 row_stop=row_stop,
                 row_prefix=row_prefix,
@@ -134,35 +359,576 @@ class BaseModel(metaclass=BaseModelMeta):
                 limit=limit,
                 sorted_columns=sorted_columns,
                 reverse=reverse,
+                compact=compact,
             )
-            return cls.serialize(data)
+        )
 
     @classmethod
-    def row(cls, row: str, columns: List[str] = None, timestamp: int = None, include_timestamp: bool = False):
-        if cls._pool is None:
-            cls._pool = hbase_connection_pool()
-        with cls._pool.connection() as conn:
-            table = conn.table(cls._table_name)  # type: Table
-            data = table.row(row, columns=columns, timestamp=timestamp, include_timestamp=include_timestamp)
-            result = cls.serialize(data)
-            return result[0] if result else None
+    def iter_scan(
+        cls,
+        row_start: RowKeyType = None,
+        row_stop: RowKeyType = None,
+        row_prefix: RowKeyType = None,
+        columns: List[str] = None,
+        filter: str = None,
+        timestamp: int = None,
+        include_timestamp: bool = False,
+        batch_size: int = 1000,
+        scan_batching: bool = None,
+        limit: int = None,
+        sorted_columns: bool = False,
+        reverse: bool = False,
+        after: RowKeyType = None,
+        chunk_size: int = None,
+        compact: bool = False,
+        decoder: Callable[[bytes, dict], Any] = None,
+    ) -> Iterator:
+        """
+        惰性扫描, 每次从 Thrift 拉取 batch_size 行, 迭代结束或生成器被关闭时释放连接
+        :param after: 游标, 从该 row key 之后(不含)继续扫描, 一般取上一页最后一行的 row_key
+        :param chunk_size: 不为空时按批 yield 列表
+        :param columns: 字段名或列名, 默认模型声明的列; filter 引用的列也需包含在内
+        :param compact: 返回 row_class 实例代替 Map
+        :param decoder: 自定义行解码 decoder(row_key, data), 优先于 compact
+        """
+        decode = decoder or cls.get_decoder(compact, include_timestamp)
+        columns = cls.resolve_columns(columns)
+        if row_prefix is not None:
+            if row_start is not None or row_stop is not None:
+                raise TypeError("'row_prefix' cannot be combined with 'row_start' or 'row_stop'")
+            row_prefix = _to_bytes(row_prefix)
+            if reverse:
+                # 倒序时 row_stop 不包含, 改为从前缀上界开始, 越过前缀后停止
+                row_start = bytes_increment(row_prefix)
+            else:
+                row_start, row_stop = row_prefix, bytes_increment(row_prefix)
+        row_start = None if row_start is None else _to_bytes(row_start)
+        row_stop = None if row_stop is None else _to_bytes(row_stop)
+        skip = None
+        if after is not None:
+            after = _to_bytes(after)
+            if reverse:
+                # 倒序扫描从 row_start 开始向前, 起始行包含在结果内, 需跳过
+                row_start, skip = after, after
+            else:
+                row_start = after + b"\x00"
+
+        pool = cls.get_pool()
+        count = 0
+        chunk = []
+        last_key = None
+        for attempt in range(settings.HBASE_READ_RETRIES + 1):
+            if last_key is not None:
+                # 连接中断后从最后一行之后继续
+                if reverse:
+                    row_start, skip = last_key, last_key
+                else:
+                    row_start = last_key + b"\x00"
+            # 需要在客户端过滤的行不计入 limit
+            if limit is None or skip is not None or (reverse and row_prefix is not None):
+                scan_limit = None
+            else:
+                scan_limit = limit - count
+            try:
+                with pool.checkout() as conn:
+                    table = conn.table(cls._table_name)  # type: Table
+                    data = table.scan(
+                        row_start=row_start,
+                        row_stop=row_stop,
+                        columns=columns,
+                        filter=filter,
+                        timestamp=timestamp,
+                        include_timestamp=include_timestamp,
+                        batch_size=batch_size,
+                        scan_batching=scan_batching,
+                        limit=scan_limit,
+                        sorted_columns=sorted_columns,
+                        reverse=reverse,
+                    )
+                    with closing(data):
+                        for row_key, hbase_data in data:
+                            if skip is not None:
+                                if row_key == skip:
+                                    skip = None
+                                    continue
+                                skip = None
+                            if reverse and row_prefix is not None and not row_key.startswith(row_prefix):
+                                if row_key < row_prefix:
+                                    break
+                                continue
+                            if limit is not None and count >= limit:
+                                break
+                            count += 1
+                            last_key = row_key
+                            item = decode(row_key, hbase_data)
+                            if chunk_size is None:
+                                yield item
+                                continue
+                            chunk.append(item)
+                            if len(chunk) >= chunk_size:
+                                yield chunk
+                                chunk = []
+                break
+            except TRANSPORT_ERRORS:
+                if attempt >= settings.HBASE_READ_RETRIES:
+                    raise
+                cls._before_retry(pool, attempt)
+        if chunk:
+            yield chunk
 
     @classmethod
-    def rows(cls, rows: List[str], columns: List[str] = None, timestamp: int = None, include_timestamp=False):
-        if cls._pool is None:
-            cls._pool = hbase_connection_pool()
-        with cls._pool.connection() as conn:
-            table = conn.table(cls._table_name)  # type: Table
-            data = table.rows(rows, columns=columns, timestamp=timestamp, include_timestamp=include_timestamp)
-            return cls.serialize(data)
+    def scan_page(
+        cls, page_size: int = 100, cursor: RowKeyType = None, **kwargs
+    ) -> Tuple[List, Optional[bytes]]:
+        """
+        分页扫描
+        :param page_size:
+        :param cursor: 上一页返回的游标, 首页为空
+        :param kwargs: 透传 iter_scan
+        :return: (当前页数据, 下一页游标), 没有下一页时游标为 None
+        """
+        rows = list(cls.iter_scan(after=cursor, limit=page_size + 1, batch_size=page_size + 1, **kwargs))
+        if len(rows) <= page_size:
+            return rows, None
+        rows = rows[:page_size]
+        return rows, rows[-1].row_key
+
+    @classmethod
+    def iter_columnar(
+        cls,
+        fields: List[str] = None,
+        output: str = columnar.NUMPY,
+        chunk_size: int = 10000,
+        parallel: bool = False,
+        **kwargs,
+    ) -> Iterator:
+        """
+        列式扫描, 每批 yield {字段: numpy 数组} 或 pyarrow.RecordBatch, 只拉取投影的列
+        :param fields: 字段名, 默认模型全部字段
+        :param output: numpy / arrow
+        :param chunk_size: 每批行数
+        :param parallel: 使用 parallel_scan(kwargs 可传 split_points 等)
+        :param kwargs: 透传 iter_scan / parallel_scan
+        """
+        columnar.check_output(output)
+        columns = {field: cls._columns[field] for field in fields or cls._columns}
+        build = columnar.to_arrow if output == columnar.ARROW else columnar.to_numpy
+        kwargs.update(columns=list(columns), chunk_size=chunk_size)
+        if parallel:
+            rows = cls.parallel_scan(decoder=columnar.raw_row, **kwargs)
+            with closing(rows):
+                chunk = []
+                for row in rows:
+                    chunk.append(row)
+                    if len(chunk) >= chunk_size:
+                        yield build(columns, chunk)
+                        chunk = []
+                if chunk:
+                    yield build(columns, chunk)
+            return
+        chunks = cls.iter_scan(decoder=columnar.raw_row, **kwargs)
+        with closing(chunks):
+            for chunk in chunks:
+                yield build(columns, chunk)
+
+    @classmethod
+    def scan_columnar(cls, fields: List[str] = None, output: str = columnar.NUMPY, **kwargs):
+        """
+        :return: {字段: numpy 数组} 或 pyarrow.Table
+        """
+        columnar.check_output(output)
+        columns = {field: cls._columns[field] for field in fields or cls._columns}
+        return columnar.concat(columns, list(cls.iter_columnar(fields, output, **kwargs)), output)
+
+    @classmethod
+    def split_ranges(
+        cls,
+        row_start: RowKeyType = None,
+        row_stop: RowKeyType = None,
+        row_prefix: RowKeyType = None,
+        split_points: List[RowKeyType] = None,
+    ) -> List[Tuple[Optional[bytes], Optional[bytes]]]:
+        """
+        将 [row_start, row_stop) 按切分点拆成连续子区间
+        :param split_points: 为空时使用表的 Region 边界
+        """
+        if row_prefix is not None:
+            row_start = _to_bytes(row_prefix)
+            row_stop = bytes_increment(row_start)
+        row_start = None if row_start is None else _to_bytes(row_start)
+        row_stop = None if row_stop is None else _to_bytes(row_stop)
+        if split_points is None:
+            regions = cls.retry_read(cls._table_call, "regions")
+            split_points = [region["start_key"] for region in regions]
+        points = sorted(
+            {
+                point
+                for point in map(_to_bytes, split_points)
+                if point and (row_start is None or point > row_start) and (row_stop is None or point < row_stop)
+            }
+        )
+        bounds = [row_start, *points, row_stop]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    @classmethod
+    def parallel_scan(
+        cls,
+        row_start: RowKeyType = None,
+        row_stop: RowKeyType = None,
+        row_prefix: RowKeyType = None,
+        split_points: List[RowKeyType] = None,
+        ordered: bool = True,
+        max_workers: int = None,
+        chunk_size: int = 1000,
+        limit: int = None,
+        **kwargs,
+    ) -> Iterator:
+        """
+        按子区间分页并发扫描, 只在拉取每页时占用连接
+        :param split_points: 切分点, 为空时按 Region 边界切分
+        :param ordered: True 按 row key 顺序输出(后面的子区间只预取一页), False 先到先出
+        :param max_workers: 并发数即同时占用的连接数上限, 默认 settings.HBASE_POOL_SIZE
+        :param chunk_size: 子区间每页行数
+        :param limit: 总行数上限
+        :param kwargs: 透传 iter_scan, 不支持 reverse / after
+        """
+        ranges = cls.split_ranges(row_start, row_stop, row_prefix, split_points)
+        return cls._scan_ranges(
+            ranges, _ORDERED if ordered else _UNORDERED, max_workers, chunk_size=chunk_size, limit=limit, **kwargs
+        )
+
+    @classmethod
+    def bucket_scan(
+        cls,
+        row_start: RowKeyType = None,
+        row_stop: RowKeyType = None,
+        row_prefix: RowKeyType = None,
+        ordered: bool = True,
+        max_workers: int = None,
+        chunk_size: int = 1000,
+        limit: int = None,
+        **kwargs,
+    ) -> Iterator:
+        """
+        加盐表的范围扫描: 每个桶一个子区间并发扫描, 按去盐后的 row key 归并
+        start = FaultRecordData.row_key_prefix({"vin": "LSV"}, salted=False)
+        :param row_start: 去盐的 key
+        :param row_stop: 去盐的 key
+        :param row_prefix: 去盐的前缀
+        :param ordered: True 按去盐 key 归并(各桶按页扫描, 每页 chunk_size 行), False 先到先出
+        :param max_workers: 同时占用的连接数, 默认 settings.HBASE_POOL_SIZE
+        :param kwargs: 透传 iter_scan, 不支持 reverse / after
+        """
+        row_key: Optional[RowKey] = cls._row_key
+        if row_key is None:
+            raise TypeError(f"HBase Model {cls.__name__} has no Meta.row_key")
+        if row_prefix is not None:
+            row_start = _to_bytes(row_prefix)
+            row_stop = bytes_increment(row_start)
+        ranges = []
+        for salt in row_key.bucket_prefixes():
+            start = salt + (b"" if row_start is None else _to_bytes(row_start))
+            stop = salt + _to_bytes(row_stop) if row_stop is not None else (bytes_increment(salt) if salt else None)
+            ranges.append((start, stop))
+        salt_size = row_key.salt_size
+        return cls._scan_ranges(
+            ranges,
+            _MERGE if ordered else _UNORDERED,
+            max_workers,
+            chunk_size=chunk_size,
+            limit=limit,
+            merge_key=lambda key: key[salt_size:],
+            **kwargs,
+        )
+
+    @classmethod
+    def _scan_ranges(
+        cls,
+        ranges: List[Tuple[Optional[bytes], Optional[bytes]]],
+        mode: str,
+        max_workers: int = None,
+        chunk_size: int = 1000,
+        limit: int = None,
+        merge_key: Callable[[bytes], Any] = None,
+        **kwargs,
+    ) -> Iterator:
+        """
+        每个子区间按页扫描, 每页单独取还连接并预取该子区间的下一页,
+        同时占用的连接数不超过 max_workers, 与子区间数量和调用方消费速度无关
+        :param mode: _ORDERED 按子区间顺序依次输出, _UNORDERED 先到先出, _MERGE 按 merge_key(row_key) 归并
+        """
+        if kwargs.get("reverse") or kwargs.get("after") is not None:
+            raise TypeError("Concurrent scans do not support 'reverse' or 'after'")
+        decode = kwargs.pop("decoder", None) or cls.get_decoder(
+            kwargs.pop("compact", False), kwargs.get("include_timestamp", False)
+        )
+        page_size = chunk_size if limit is None else min(chunk_size, limit)
+        kwargs.setdefault("batch_size", page_size)
+
+        def fetch(start, stop, cursor):
+            rows = list(
+                cls.iter_scan(
+                    row_start=start,
+                    row_stop=stop,
+                    after=cursor,
+                    limit=page_size,
+                    decoder=lambda row_key, data: (row_key, decode(row_key, data)),
+                    **kwargs,
+                )
+            )
+            return rows, rows[-1][0] if len(rows) >= page_size else None
+
+        # 未完成的页, 提前结束时取消尚未开始的
+        pending = set()
+
+        def submit(start, stop, cursor) -> Future:
+            future = executor.submit(fetch, start, stop, cursor)
+            pending.add(future)
+            future.add_done_callback(pending.discard)
+            return future
+
+        def pages(start, stop, future: Future) -> Iterator:
+            while future is not None:
+                rows, cursor = future.result()
+                future = None if cursor is None else submit(start, stop, cursor)
+                yield from rows
+
+        def completed(first_pages: List[Future]) -> Iterator:
+            ranges_of = dict(zip(first_pages, ranges))
+            while ranges_of:
+                done, _ = wait(ranges_of, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, stop = ranges_of.pop(future)
+                    rows, cursor = future.result()
+                    if cursor is not None:
+                        ranges_of[submit(start, stop, cursor)] = (start, stop)
+                    yield from rows
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(len(ranges), max_workers or settings.HBASE_POOL_SIZE), thread_name_prefix="hbase-scan"
+        )
+        try:
+            # 先提交所有子区间的首页, 取首行时各子区间已在并发扫描
+            first_pages = [submit(start, stop, None) for start, stop in ranges]
+            if mode == _UNORDERED:
+                rows = completed(first_pages)
+            else:
+                rows = [pages(start, stop, future) for (start, stop), future in zip(ranges, first_pages)]
+                if mode == _MERGE:
+                    rows = heapq.merge(*rows, key=lambda pair: merge_key(pair[0]))
+                else:
+                    rows = chain.from_iterable(rows)
+            for count, (_, row) in enumerate(rows, 1):
+                yield row
+                if limit is not None and count >= limit:
+                    return
+        finally:
+            for future in list(pending):
+                future.cancel()
+            # 等待已开始的页结束并归还连接, 每个线程最多一页
+            executor.shutdown(wait=True)
+
+    @classmethod
+    def row(
+        cls,
+        row: str,
+        columns: List[str] = None,
+        timestamp: int = None,
+        include_timestamp: bool = False,
+        compact: bool = False,
+    ):
+        result = cls.rows([row], columns, timestamp, include_timestamp, compact)
+        return result[0] if result else None
+
+    @classmethod
+    def rows(
+        cls,
+        rows: List[str],
+        columns: List[str] = None,
+        timestamp: int = None,
+        include_timestamp=False,
+        compact: bool = False,
+    ):
+        """
+        配置了 Meta.row_cache 且未指定 timestamp / include_timestamp 时先查缓存, 只回源未命中的行
+        :param columns: 字段名或列名, 默认模型声明的列
+        """
+        cache_columns = columns_key(columns and cls.resolve_columns(columns))
+        columns = cls.resolve_columns(columns)
+        if cls._row_cache is None or timestamp is not None or include_timestamp:
+            data = cls._fetch_rows(rows, columns, timestamp, include_timestamp)
+            return cls.serialize(data, compact, include_timestamp)
+        keys = [_to_bytes(row) for row in rows]
+        found = cls._row_cache.get_many(keys, cache_columns)
+        missing = list(dict.fromkeys(row for row in keys if row not in found))
+        if missing:
+            fetched = dict(cls._fetch_rows(missing, columns))
+            fetched = {row: fetched.get(row, {}) for row in missing}
+            cls._row_cache.set_many(fetched, cache_columns)
+            found.update(fetched)
+        decode = cls.get_decoder(compact)
+        return [decode(row, found[row]) for row in keys if found[row]]
+
+    @classmethod
+    def _fetch_rows(
+        cls, rows: List[RowKeyType], columns: List[str] = None, timestamp: int = None, include_timestamp: bool = False
+    ):
+        return cls.retry_read(
+            cls._table_call, "rows", rows, columns=columns, timestamp=timestamp, include_timestamp=include_timestamp
+        )
+
+    @classmethod
+    def parse_data(cls, data: dict) -> Dict[bytes, bytes]:
+        """
+        字段名 -> 值 转为 列 -> 按列类型编码后的值
+        """
+        return {cls._columns[k].name: cls._columns[k].encode(v) for k, v in data.items() if v is not None}
 
     @classmethod
     def put(cls, row: str, data: dict, timestamp: int = None, wal: bool = True):
-        parsed_data = {}
-        for k, v in data.items():
-            parsed_data[getattr(cls, k)] = v.encode("utf-8")
-        if cls._pool is None:
-            cls._pool = hbase_connection_pool()
-        with cls._pool.connection() as conn:
+        parsed_data = cls.parse_data(data)
+        cls._table_call("put", row, parsed_data, timestamp=timestamp, wal=wal)
+        if cls._row_cache is not None:
+            cls._row_cache.invalidate(_to_bytes(row))
+
+    @classmethod
+    @contextmanager
+    def batch_writer(
+        cls, batch_size: int = 1000, flush_interval: float = None, timestamp: int = None, wal: bool = True
+    ) -> Iterator[BatchWriter]:
+        """
+        with FaultRecordData.batch_writer(batch_size=500, flush_interval=1) as writer:
+            for row, data in records:
+                writer.put(row, data)
+
+        退出时发送剩余数据, 期间占用一个连接
+        :param batch_size: 每批行数
+        :param flush_interval: 秒
+        :param timestamp: 整批的写入时间戳
+        :param wal: 关闭 WAL 写入更快, 但 RegionServer 宕机会丢数据
+        """
+        with cls.get_pool().checkout() as conn:
             table = conn.table(cls._table_name)  # type: Table
-            table.put(row, parsed_data, timestamp=timestamp, wal=wal)
+            writer = BatchWriter(
+                cls, table, batch_size=batch_size, flush_interval=flush_interval, timestamp=timestamp, wal=wal
+            )
+            try:
+                yield writer
+            finally:
+                writer.flush()
+
+    @classmethod
+    def put_many(cls, rows: Union[Dict[str, dict], Iterable[Tuple[str, dict]]], batch_size: int = 1000, **kwargs):
+        """
+        :param rows: {row: data} 或 (row, data) 序列
+        :param batch_size:
+        :param kwargs: 透传 batch_writer
+        :return: 写入行数
+        """
+        if isinstance(rows, dict):
+            rows = rows.items()
+        with cls.batch_writer(batch_size=batch_size, **kwargs) as writer:
+            for row, data in rows:
+                writer.put(row, data)
+        return writer.written
+
+    @classmethod
+    async def run_in_executor(cls, func: Callable, *args, timeout: float = None, **kwargs):
+        """
+        在 HBase 线程池中执行同步调用
+        超时或取消时调用方立即返回, 已开始的 Thrift 请求仍会在线程中执行完
+        :param timeout: 秒, 为空时使用 settings.HBASE_TIMEOUT
+        """
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(hbase_executor(), partial(func, *args, **kwargs))
+        return await asyncio.wait_for(fut, settings.HBASE_TIMEOUT if timeout is None else timeout)
+
+    @classmethod
+    async def _collect_in_executor(cls, rows_fun: Callable[[], Iterator], timeout: float = None) -> List:
+        """
+        在线程池中消费生成器; 超时或取消后扫描线程在下一行处停止并释放连接
+        """
+        stopped = threading.Event()
+
+        def collect():
+            result = []
+            rows = rows_fun()
+            with closing(rows):
+                for item in rows:
+                    if stopped.is_set():
+                        break
+                    result.append(item)
+            return result
+
+        try:
+            return await cls.run_in_executor(collect, timeout=timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            stopped.set()
+            raise
+
+    @classmethod
+    async def async_scan(cls, timeout: float = None, **kwargs) -> List:
+        """
+        kwargs 同 iter_scan
+        """
+        return await cls._collect_in_executor(partial(cls.iter_scan, **kwargs), timeout=timeout)
+
+    @classmethod
+    async def async_iter_scan(cls, chunk_size: int = 1000, timeout: float = None, **kwargs) -> AsyncIterator[List]:
+        """
+        按批异步迭代, 每批在线程池中拉取; 迭代期间占用一个连接, 不要长时间挂起
+        :param chunk_size:
+        :param timeout: 单批超时(秒)
+        :param kwargs: 同 iter_scan
+        """
+        # 各批可能在不同线程中拉取, iter_scan 通过 checkout() 取不与线程绑定的连接
+        chunks = cls.iter_scan(chunk_size=chunk_size, **kwargs)
+        # 取消时线程可能仍在执行 next, close 需等其结束
+        lock = threading.Lock()
+
+        def fetch():
+            with lock:
+                return next(chunks, None)
+
+        def close():
+            with lock:
+                chunks.close()
+
+        try:
+            while True:
+                chunk = await cls.run_in_executor(fetch, timeout=timeout)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            hbase_executor().submit(close)
+
+    @classmethod
+    async def async_scan_page(cls, page_size: int = 100, cursor: RowKeyType = None, timeout: float = None, **kwargs):
+        return await cls.run_in_executor(cls.scan_page, page_size, cursor, timeout=timeout, **kwargs)
+
+    @classmethod
+    async def async_row(cls, row: str, timeout: float = None, **kwargs):
+        return await cls.run_in_executor(cls.row, row, timeout=timeout, **kwargs)
+
+    @classmethod
+    async def async_rows(cls, rows: List[str], timeout: float = None, **kwargs):
+        return await cls.run_in_executor(cls.rows, rows, timeout=timeout, **kwargs)
+
+    @classmethod
+    async def async_put(cls, row: str, data: dict, timeout: float = None, **kwargs):
+        """
+        超时不代表写入失败
+        """
+        return await cls.run_in_executor(cls.put, row, data, timeout=timeout, **kwargs)
+
+    @classmethod
+    async def async_put_many(cls, rows, timeout: float = None, **kwargs):
+        return await cls.run_in_executor(cls.put_many, rows, timeout=timeout, **kwargs)
+
+    @classmethod
+    async def async_parallel_scan(cls, timeout: float = None, **kwargs) -> List:
+        """
+        kwargs 同 parallel_scan
+        """
+        return await cls._collect_in_executor(partial(cls.parallel_scan, **kwargs), timeout=timeout)
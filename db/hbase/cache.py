@@ -0,0 +1,175 @@
+"""
+HBase 点查读穿透缓存, 按 row key + 列集合缓存 happybase 原始结果(未解码)
+
+class FaultRecordData(BaseModel):
+    ...
+    class Meta:
+        table_name = "fault_record"
+        row_cache = RowCache(maxsize=10000, ttl=60, redis=True)
+
+row/rows 先查进程内 LRU, 再查 Redis(开启时), 只回源未命中的行; 通过同一模型 put/batch_writer
+写入后失效. 其他进程的 LRU 不会收到失效, 最长在 ttl 内读到旧值
+
+Redis 二级缓存使用同步的 RedisUtil(在执行器线程中调用), 首次使用时按 settings 初始化;
+Redis 不可达时退化为只用进程内缓存, 其他错误直接抛出
+"""
+import logging
+import threading
+from typing import Dict, List, Iterable, Optional
+
+import orjson
+import redis as o_redis
+
+from db.redis import RedisUtil
+from db.redis.keys import RedisCacheKey
+from db.redis.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+ALL_COLUMNS = "*"
+
+_init_lock = threading.Lock()
+
+
+def _redis():
+    """
+    应用启动只初始化 AsyncRedisUtil, 同步客户端在首次使用时初始化
+    """
+    if RedisUtil.r is None:
+        with _init_lock:
+            if RedisUtil.r is None:
+                RedisUtil.init()
+    return RedisUtil.r
+
+
+def columns_key(columns: Optional[Iterable[bytes]]) -> str:
+    if not columns:
+        return ALL_COLUMNS
+    return ",".join(sorted(c.decode() if isinstance(c, bytes) else c for c in columns))
+
+
+def _dumps(data: Dict[bytes, bytes]) -> bytes:
+    # latin-1 与 bytes 一一对应, 可无损转为 JSON
+    return orjson.dumps({k.decode("latin-1"): v.decode("latin-1") for k, v in data.items()})
+
+
+def _loads(raw: bytes) -> Dict[bytes, bytes]:
+    return {k.encode("latin-1"): v.encode("latin-1") for k, v in orjson.loads(raw).items()}
+
+
+class RowCache:
+    """
+    不存在的行同样缓存(空字典), 避免重复回源
+    """
+
+    _instances: Dict[str, "RowCache"] = {}
+
+    def __init__(self, maxsize: int = 10000, ttl: int = 60, redis: bool = False):
+        """
+        :param maxsize: 进程内缓存条数(行 x 列集合)
+        :param ttl: 秒
+        :param redis: 是否使用 RedisUtil 作为二级缓存
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.redis = redis
+        self.table_name = None
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl)
+        # LRUCache 非线程安全, 同步接口可能在多个线程中调用
+        self._lock = threading.Lock()
+        # 本进程出现过的列集合, 失效时逐个删除
+        self._column_keys = set()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def bind(self, table_name: str):
+        assert self.table_name is None, f"RowCache already bound to {self.table_name}"
+        self.table_name = table_name
+        self._instances[table_name] = self
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.redis_hits + self.misses
+        return {
+            "size": len(self.local),
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.redis_hits) / total if total else 0.0,
+            "evictions": self.local.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    @classmethod
+    def all_stats(cls) -> Dict[str, Dict[str, float]]:
+        return {name: cache.stats for name, cache in cls._instances.items()}
+
+    def _redis_key(self, row: bytes) -> str:
+        return RedisCacheKey.hbase_row.format(self.table_name, row.hex())
+
+    def get_many(self, rows: List[bytes], columns: str) -> Dict[bytes, Dict[bytes, bytes]]:
+        """
+        :return: 命中的 row -> 原始数据
+        """
+        found = {}
+        with self._lock:
+            for row in rows:
+                data = self.local.get((row, columns))
+                if data is not None:
+                    found[row] = data
+        self.hits += len(found)
+        missing = [row for row in rows if row not in found]
+        if self.redis and missing:
+            try:
+                pipe = _redis().pipeline(transaction=False)
+                for row in missing:
+                    pipe.hget(self._redis_key(row), columns)
+                replies = pipe.execute()
+            except o_redis.RedisError as e:
+                logger.warning(f"HBase row cache redis get failed: {e}")
+                replies = [None] * len(missing)
+            loaded = {row: _loads(raw) for row, raw in zip(missing, replies) if raw is not None}
+            self._set_local(loaded, columns)
+            self.redis_hits += len(loaded)
+            found.update(loaded)
+        self.misses += len(rows) - len(found)
+        return found
+
+    def set_many(self, items: Dict[bytes, Dict[bytes, bytes]], columns: str):
+        if not items:
+            return
+        self._set_local(items, columns)
+        if not self.redis:
+            return
+        try:
+            pipe = _redis().pipeline(transaction=False)
+            for row, data in items.items():
+                key = self._redis_key(row)
+                pipe.hset(key, columns, _dumps(data))
+                pipe.expire(key, self.ttl)
+            pipe.execute()
+        except o_redis.RedisError as e:
+            logger.warning(f"HBase row cache redis set failed: {e}")
+
+    def _set_local(self, items: Dict[bytes, Dict[bytes, bytes]], columns: str):
+        with self._lock:
+            self._column_keys.add(columns)
+            for row, data in items.items():
+                self.local.set((row, columns), data)
+
+    def invalidate(self, *rows: bytes):
+        if not rows:
+            return
+        with self._lock:
+            for row in rows:
+                for columns in self._column_keys:
+                    self.local.delete((row, columns))
+        self.invalidations += len(rows)
+        if not self.redis:
+            return
+        try:
+            _redis().delete(*[self._redis_key(row) for row in rows])
+        except o_redis.RedisError as e:
+            logger.warning(f"HBase row cache redis invalidate failed: {e}")
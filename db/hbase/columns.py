@@ -0,0 +1,128 @@
+"""
+HBase 列类型声明, 负责写入编码与读取解码
+
+class Vehicle(BaseModel):
+    vin = b"A:a01"                      # 等价于 Column(b"A:a01"), UTF-8 字符串
+    mileage = IntColumn(b"A:a02")      # 8 字节大端整数, 与 Java Bytes.toBytes(long) 一致
+    speed = FloatColumn(b"A:a03")
+    alert_time = DateTimeColumn(b"A:a04")
+    extra = JSONColumn(b"A:a05")
+    status = EnumColumn(b"A:a06", VehicleStatus)
+
+模型类属性仍为列名 bytes(Vehicle.mileage == b"A:a02"), 列定义保存在 Vehicle._columns
+"""
+import struct
+import datetime
+from enum import Enum
+from typing import Any, Type
+
+import orjson
+
+
+class Column:
+    python_type: Type = str
+
+    def __init__(self, name: bytes):
+        """
+        :param name: 列族:列, 如 b"A:a01"
+        """
+        if not isinstance(name, bytes) or b":" not in name:
+            raise ValueError(f"HBase column must be bytes like b'family:qualifier', got {name!r}")
+        self.name = name
+
+    def encode(self, value: Any) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat().encode("utf-8")
+        if isinstance(value, (dict, list)):
+            return orjson.dumps(value)
+        return str(value).encode("utf-8")
+
+    def decode(self, data: bytes) -> Any:
+        return data.decode()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r})"
+
+
+class IntColumn(Column):
+    """
+    定长大端整数; 非负数的字节序与数值序一致, 可用于范围扫描
+    """
+
+    python_type = int
+
+    def __init__(self, name: bytes, size: int = 8, signed: bool = True):
+        super().__init__(name)
+        self.size = size
+        self.signed = signed
+
+    def encode(self, value: int) -> bytes:
+        return int(value).to_bytes(self.size, "big", signed=self.signed)
+
+    def decode(self, data: bytes) -> int:
+        return int.from_bytes(data, "big", signed=self.signed)
+
+
+class FloatColumn(Column):
+    """
+    IEEE 754 大端 double, 与 Java Bytes.toBytes(double) 一致
+    """
+
+    python_type = float
+    _struct = struct.Struct(">d")
+
+    def encode(self, value: float) -> bytes:
+        return self._struct.pack(value)
+
+    def decode(self, data: bytes) -> float:
+        return self._struct.unpack(data)[0]
+
+
+class DateTimeColumn(IntColumn):
+    """
+    毫秒时间戳, 8 字节大端整数; 无时区的 datetime 按本地时间处理
+    """
+
+    python_type = datetime.datetime
+
+    def __init__(self, name: bytes, tz: datetime.tzinfo = None):
+        super().__init__(name)
+        self.tz = tz
+
+    def encode(self, value: datetime.datetime) -> bytes:
+        if isinstance(value, datetime.datetime):
+            value = int(value.timestamp() * 1000)
+        return super().encode(value)
+
+    def decode(self, data: bytes) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(super().decode(data) / 1000, tz=self.tz)
+
+
+class JSONColumn(Column):
+    python_type = Any
+
+    def encode(self, value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    def decode(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class EnumColumn(Column):
+    """
+    保存枚举值的字符串形式
+    """
+
+    def __init__(self, name: bytes, enum: Type[Enum]):
+        super().__init__(name)
+        self.enum = enum
+        self.python_type = enum
+        self._value_type = type(next(iter(enum)).value)
+
+    def encode(self, value: Any) -> bytes:
+        return str(self.enum(value).value).encode("utf-8")
+
+    def decode(self, data: bytes) -> Enum:
+        return self.enum(self._value_type(data.decode()))
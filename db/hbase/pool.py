@@ -0,0 +1,174 @@
+"""
+共享 HBase 连接池: 启动预热、空闲连接复用前校验、等待连接耗时统计
+
+所有模型共用 hbase_pool(), 大小与超时见 settings.HBASE_POOL_*
+"""
+import time
+import queue
+import socket
+import logging
+import threading
+from typing import List, Optional
+from contextlib import contextmanager
+
+from happybase import Connection, ConnectionPool
+from happybase.pool import NoConnectionsAvailable
+from thriftpy2.transport import TTransportException
+
+from core.settings import settings
+from db.redis.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# 可重试的连接层异常, Thrift 服务端返回的业务异常不重试
+TRANSPORT_ERRORS = (TTransportException, socket.error)
+
+
+class HBasePoolMetrics:
+    def __init__(self):
+        self.acquire_wait = Histogram()
+        self.acquire_timeouts = 0
+        self.validations = 0
+        self.validation_failures = 0
+        self.retries = 0
+
+
+class HBaseConnectionPool(ConnectionPool):
+    """
+    在 happybase.ConnectionPool 基础上:
+    - 获取连接默认超时 timeout 秒, 超时抛出 NoConnectionsAvailable
+    - 空闲超过 validate_idle 秒的连接复用前先做一次轻量请求, 失败则重建
+    - checkout() 不绑定当前线程, 可用于在不同线程间恢复执行的生成器
+    """
+
+    def __init__(self, size: int, timeout: float = None, validate_idle: float = None, **kwargs):
+        self.timeout = timeout
+        self.validate_idle = validate_idle
+        self.metrics = HBasePoolMetrics()
+        self._last_used = {}
+        self._connections: List[Connection] = []
+        super().__init__(size, **kwargs)
+        self._connections = list(self._queue.queue)
+
+    def _acquire_connection(self, timeout: float = None) -> Connection:
+        start = time.monotonic()
+        try:
+            connection = super()._acquire_connection(self.timeout if timeout is None else timeout)
+        except NoConnectionsAvailable:
+            self.metrics.acquire_timeouts += 1
+            raise
+        finally:
+            self.metrics.acquire_wait.observe(time.monotonic() - start)
+        self._validate(connection)
+        return connection
+
+    def _return_connection(self, connection: Connection):
+        self._last_used[id(connection)] = time.monotonic()
+        super()._return_connection(connection)
+
+    def _validate(self, connection: Connection):
+        last_used = self._last_used.get(id(connection))
+        if (
+            self.validate_idle is None
+            or last_used is None
+            or not connection.transport.is_open()
+            or time.monotonic() - last_used < self.validate_idle
+        ):
+            return
+        self.metrics.validations += 1
+        try:
+            connection.client.getTableNames()
+        except TRANSPORT_ERRORS as e:
+            self.metrics.validation_failures += 1
+            logger.info(f"Replacing stale HBase connection: {e}")
+            connection._refresh_thrift_client()
+
+    @contextmanager
+    def checkout(self, timeout: float = None):
+        """
+        同 connection(), 但不与线程绑定, 也不复用当前线程已持有的连接
+        """
+        connection = self._acquire_connection(timeout)
+        try:
+            connection.open()
+            yield connection
+        except TRANSPORT_ERRORS:
+            logger.info("Replacing tainted pool connection")
+            connection._refresh_thrift_client()
+            raise
+        finally:
+            self._return_connection(connection)
+
+    def warm_up(self):
+        """
+        打开当前空闲的连接, 避免首批请求承担建连耗时; 在后台运行时不等待请求正在使用的连接,
+        任一连接失败即停止并归还已取出的连接
+        """
+        connections = []
+        try:
+            while len(connections) < len(self._connections):
+                try:
+                    connections.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for connection in connections:
+                connection.open()
+        finally:
+            for connection in connections:
+                self._return_connection(connection)
+
+    def close(self):
+        for connection in self._connections:
+            connection.close()
+
+    def stats(self) -> dict:
+        size = len(self._connections)
+        free = self._queue.qsize()
+        return {
+            "size": size,
+            "free": free,
+            "in_use": size - free,
+            "open": sum(1 for c in self._connections if c.transport.is_open()),
+            "acquire_wait": self.metrics.acquire_wait.snapshot(),
+            "acquire_timeouts": self.metrics.acquire_timeouts,
+            "validations": self.metrics.validations,
+            "validation_failures": self.metrics.validation_failures,
+            "retries": self.metrics.retries,
+        }
+
+
+_pool: Optional[HBaseConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def hbase_pool() -> HBaseConnectionPool:
+    """
+    进程内共享连接池, 首次调用时创建(线程安全)
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HBaseConnectionPool(
+                    size=settings.HBASE_POOL_SIZE,
+                    timeout=settings.HBASE_POOL_TIMEOUT,
+                    validate_idle=settings.HBASE_POOL_VALIDATE_IDLE,
+                    host=settings.THRIFT_HOST,
+                    port=settings.THRIFT_PORT,
+                )
+    return _pool
+
+
+def hbase_pool_stats() -> Optional[dict]:
+    """
+    共享连接池未创建时返回 None
+    """
+    return None if _pool is None else _pool.stats()
+
+
+def close_hbase_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -0,0 +1,142 @@
+"""
+Row key 设计: 组合键、倒序时间戳、加盐分桶
+
+class FaultRecordData(BaseModel):
+    ...
+    class Meta:
+        table_name = "fault_record"
+        row_key = RowKey("vin", ReversedTimestamp("receive_time"), buckets=16)
+
+FaultRecordData.make_row_key({"vin": "LSV123", "receive_time": now})
+    -> b"\\x05LSV123|\\x7f\\xff..."   # 盐 + vin + 分隔符 + 倒序毫秒时间戳
+
+盐由 salt_parts(默认第一个部分)计算, 同一 vin 落在同一个桶, 按 vin 前缀扫描只需查一个桶;
+不含 vin 的范围扫描使用 BaseModel.bucket_scan 分页扫描全部桶并按去盐后的 key 归并,
+同时占用的连接数不超过 HBASE_POOL_SIZE, 桶数可以大于连接池
+"""
+import zlib
+import datetime
+from typing import Any, Dict, List, Union, Optional
+
+SEPARATOR = b"|"
+
+
+class KeyPart:
+    """
+    变长字符串部分, 值中不能包含分隔符
+    """
+
+    size: Optional[int] = None
+
+    def __init__(self, field: str):
+        self.field = field
+
+    def encode(self, value: Any) -> bytes:
+        value = value if isinstance(value, bytes) else str(value).encode("utf-8")
+        if SEPARATOR in value:
+            raise ValueError(f"Row key part {self.field} must not contain {SEPARATOR!r}: {value!r}")
+        return value
+
+    def decode(self, data: bytes) -> Any:
+        return data.decode()
+
+
+class FixedInt(KeyPart):
+    """
+    定长大端无符号整数, 字节序与数值序一致
+    """
+
+    def __init__(self, field: str, size: int = 8):
+        super().__init__(field)
+        self.size = size
+
+    def encode(self, value: int) -> bytes:
+        return int(value).to_bytes(self.size, "big")
+
+    def decode(self, data: bytes) -> int:
+        return int.from_bytes(data, "big")
+
+
+class ReversedTimestamp(FixedInt):
+    """
+    (最大值 - 毫秒时间戳), 同一前缀下最新的数据排在最前
+    """
+
+    def __init__(self, field: str):
+        super().__init__(field, size=8)
+        self.max_value = 2 ** 63 - 1
+
+    def encode(self, value: Union[int, datetime.datetime]) -> bytes:
+        if isinstance(value, datetime.datetime):
+            value = int(value.timestamp() * 1000)
+        return super().encode(self.max_value - int(value))
+
+    def decode(self, data: bytes) -> int:
+        return self.max_value - super().decode(data)
+
+
+class RowKey:
+    def __init__(self, *parts: Union[str, KeyPart], buckets: int = 0, salt_parts: int = 1):
+        """
+        :param parts: 字段名(变长字符串) 或 KeyPart
+        :param buckets: 分桶数, 0 不加盐
+        :param salt_parts: 用于计算盐的前几个部分
+        """
+        if not parts:
+            raise ValueError("RowKey requires at least one part")
+        if not 0 <= buckets <= 256:
+            raise ValueError("RowKey buckets must be between 0 and 256")
+        self.parts: List[KeyPart] = [p if isinstance(p, KeyPart) else KeyPart(p) for p in parts]
+        self.fields = [p.field for p in self.parts]
+        self.buckets = buckets
+        self.salt_parts = salt_parts
+        self.salt_size = 1 if buckets else 0
+
+    def _salt(self, encoded: List[bytes]) -> bytes:
+        if not self.buckets:
+            return b""
+        return bytes((zlib.crc32(SEPARATOR.join(encoded[: self.salt_parts])) % self.buckets,))
+
+    def bucket_prefixes(self) -> List[bytes]:
+        return [bytes((i,)) for i in range(self.buckets)] if self.buckets else [b""]
+
+    def _encode_parts(self, values: Dict[str, Any], partial: bool) -> List[bytes]:
+        encoded = []
+        for part in self.parts:
+            if part.field not in values:
+                if partial:
+                    break
+                raise ValueError(f"Missing row key part: {part.field}")
+            encoded.append(part.encode(values[part.field]))
+        return encoded
+
+    def build(self, values: Dict[str, Any]) -> bytes:
+        encoded = self._encode_parts(values, partial=False)
+        return self._salt(encoded) + SEPARATOR.join(encoded)
+
+    def prefix(self, values: Dict[str, Any], salted: bool = True) -> bytes:
+        """
+        由前几个部分生成扫描前缀
+        :param values: 需从第一个部分开始连续给出
+        :param salted: 给出的部分不足 salt_parts 时无法确定桶, 必须为 False 并使用 bucket_scan
+        """
+        encoded = self._encode_parts(values, partial=True)
+        unsalted = SEPARATOR.join(encoded)
+        if encoded and len(encoded) < len(self.parts):
+            unsalted += SEPARATOR
+        if not salted:
+            return unsalted
+        if self.buckets and len(encoded) < self.salt_parts:
+            raise ValueError(f"Salted prefix requires the first {self.salt_parts} row key parts")
+        return self._salt(encoded) + unsalted
+
+    def parse(self, key: bytes) -> Dict[str, Any]:
+        data = key[self.salt_size:]
+        result = {}
+        for part in self.parts:
+            if part.size is not None:
+                value, data = data[: part.size], data[part.size + len(SEPARATOR):]
+            else:
+                value, _, data = data.partition(SEPARATOR)
+            result[part.field] = part.decode(value)
+        return result
@@ -0,0 +1,95 @@
+"""
+紧凑行对象: 按模型生成 __slots__ 类与预编译解码函数
+
+Map 每个值存两份(dict 项与 __dict__), 逐列循环解码; CompactRow 只占用 slots,
+解码函数按列展开, 大批量扫描时内存约减半、解码更快
+"""
+from typing import Dict, Type, Tuple, Callable, Sequence
+
+
+class CompactRow:
+    """
+    支持属性与下标访问, dict(row) 可转为字典
+    """
+
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self._fields, values):
+            object.__setattr__(self, name, value)
+
+    def keys(self):
+        return self._fields
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __eq__(self, other):
+        if isinstance(other, CompactRow):
+            return self._fields == other._fields and self.values() == other.values()
+        if isinstance(other, dict):
+            return self._asdict() == other
+        return NotImplemented
+
+    def values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self._fields)
+
+    def _asdict(self) -> dict:
+        return dict(zip(self._fields, self.values()))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in zip(self._fields, self.values()))})"
+
+    def __getstate__(self):
+        return self.values()
+
+    def __setstate__(self, state):
+        CompactRow.__init__(self, *state)
+
+
+def make_row_class(name: str, fields: Sequence[str]) -> Type[CompactRow]:
+    """
+    :param name: 类名
+    :param fields: 字段名, 第一个一般为 row_key
+    """
+    fields = tuple(fields)
+    namespace = {}
+    args = ", ".join(fields)
+    body = "".join(f"\n    self.{field} = {field}" for field in fields)
+    exec(f"def __init__(self, {args}):{body}", namespace)
+    return type(name, (CompactRow,), {"__slots__": fields, "_fields": fields, "__init__": namespace["__init__"]})
+
+
+def make_row_decoder(
+    row_class: Type[CompactRow], columns: Sequence[bytes], decoders: Sequence[Callable[[bytes], object]]
+) -> Callable[[bytes, Dict[bytes, bytes]], CompactRow]:
+    """
+    生成 decode(row_key, data) -> row_class 实例, 列按顺序展开, 缺失的列为 None
+    :param row_class: 字段顺序为 row_key + columns
+    :param columns: 列名, 如 b"A:a01"
+    :param decoders: 与 columns 一一对应的解码函数
+    """
+    namespace = {"Row": row_class}
+    lines = ["def decode(row_key, data):", "    get = data.get"]
+    values = []
+    for i, (column, decoder) in enumerate(zip(columns, decoders)):
+        namespace[f"c{i}"] = column
+        namespace[f"d{i}"] = decoder
+        lines.append(f"    v{i} = get(c{i})")
+        values.append(f"None if v{i} is None else d{i}(v{i})")
+    lines.append(f"    return Row(row_key, {', '.join(values)})")
+    exec("\n".join(lines), namespace)
+    return namespace["decode"]
@@ -1,8 +1,9 @@
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional
 
 from tortoise import Model, BaseDBAsyncClient, fields
 from tortoise.models import ModelMeta
 from tortoise.query_utils import Q
+from tortoise.transactions import in_transaction
 
 from core.schema import Pager
 from core.response import generate_page_info
@@ -37,7 +38,46 @@ class BaseModel(Model, metaclass=BaseModelMeta):
     ) -> None:
         if update_fields:
             update_fields.append("updated_at")
+        pending = self.__dict__.get("_outbox_events")
+        if not pending and type(self).outbox_events is BaseModel.outbox_events:
+            await super(BaseModel, self).save(using_db, update_fields, force_create, force_update)
+            return
+        if using_db is not None:
+            await self._save_with_events(using_db, update_fields, force_create, force_update)
+            return
+        async with in_transaction(self._meta.default_connection) as connection:
+            await self._save_with_events(connection, update_fields, force_create, force_update)
+
+    async def _save_with_events(
+        self, using_db: BaseDBAsyncClient, update_fields: Optional[List[str]], force_create: bool, force_update: bool,
+    ):
+        from db.mysql.models import OutboxEvent
+
+        created = not self._saved_in_db
         await super(BaseModel, self).save(using_db, update_fields, force_create, force_update)
+        events = self.__dict__.get("_outbox_events", []) + self.outbox_events(created)
+        if events:
+            await OutboxEvent.bulk_create([OutboxEvent(**event) for event in events], using_db=using_db)
+        self.__dict__.pop("_outbox_events", None)
+
+    def add_event(self, topic: str, payload: Any, key: str = None, headers: Dict[str, str] = None):
+        """
+        下一次 save 时与本次修改在同一事务中写入发件箱, 由 common.outbox 异步投递到 Kafka
+        :param topic:
+        :param payload: 可 JSON 序列化的对象
+        :param key: 相同 key 进入同一分区
+        :param headers:
+        """
+        self.__dict__.setdefault("_outbox_events", []).append(
+            {"topic": topic, "payload": payload, "key": key, "headers": headers}
+        )
+
+    def outbox_events(self, created: bool) -> List[Dict[str, Any]]:
+        """
+        子类覆盖, 每次 save 后(同一事务内)自动写入发件箱的事件, 格式同 add_event 参数
+        :param created: 本次 save 是否为新建
+        """
+        return []
 
     @classmethod
     async def page_data(
@@ -7,6 +7,12 @@ class GeneralStatus(IntEnumMore):
     not_confirm = (2, "待确认")
 
 
+class OutboxStatus(IntEnumMore):
+    pending = (0, "待投递")
+    sent = (1, "已投递")
+    failed = (2, "投递失败")
+
+
 class EmissionLevel(StrEnumMore):
     guo1 = ("guo1", "国一")
     guo2 = ("guo2", "国二")
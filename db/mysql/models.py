@@ -106,3 +106,21 @@ class Group(BaseModel):
 
     class Meta:
         table_description = "分组"
+
+
+class OutboxEvent(BaseModel):
+    topic = fields.CharField(max_length=255, description="Kafka topic")
+    key = fields.CharField(max_length=255, null=True, description="消息 key")
+    payload = fields.JSONField(description="消息内容")
+    headers = fields.JSONField(null=True, description="消息头")
+    # noinspection PyTypeChecker
+    status = fields.IntEnumField(enums.OutboxStatus, description="状态", default=enums.OutboxStatus.pending)
+    attempts = fields.SmallIntField(default=0, description="投递次数")
+    last_error = fields.CharField(max_length=1024, default="", description="最近一次投递错误")
+    sent_at = fields.DatetimeField(null=True, description="投递时间")
+
+    class Meta:
+        table = "outbox_event"
+        table_description = "事件发件箱"
+        ordering = ["id"]
+        indexes = (("status", "id"),)
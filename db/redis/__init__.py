@@ -1,7 +1,116 @@
+import os
+import math
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Dict, List, Tuple, Iterable, Optional, Sequence
+from contextlib import asynccontextmanager
+
 import redis as o_redis
 import aioredis
 
 from core.settings import settings
+from db.redis.keys import RedisCacheKey
+from db.redis.cluster import ShardedRedis, ShardedSyncRedis
+from db.redis.metrics import InstrumentedConnectionsPool, health_check_loop
+from db.redis.codecs import RawCodec, CodecType, get_codec, default_codec
+from db.redis.scripts import ALL_SCRIPTS, EXP_OF_NONE_SCRIPTS, RELEASE_LOCK_SCRIPT
+
+# 跨进程回源锁被占用时, 轮询缓存的间隔(秒)
+_GET_OR_SET_POLL_INTERVAL = 0.05
+
+
+def _should_refresh_early(ttl: int, delta, beta: float) -> bool:
+    """
+    XFetch 概率提前刷新: -delta * beta * ln(rand) >= 剩余过期时间
+    :param ttl: 剩余过期时间, 毫秒
+    :param delta: 上次回源耗时, 毫秒
+    :param beta: 越大越倾向提前刷新
+    """
+    if not beta or not delta or ttl is None or ttl < 0:
+        return False
+    return -float(delta) * beta * math.log(1 - random.random()) >= ttl
+
+
+class AsyncRedisPipeline:
+    """
+    异步redis批量操作, 收集命令后一次性发送
+
+    async with AsyncRedisUtil.pipeline() as pipe:
+        pipe.get("a")
+        pipe.hincrby("b", "c", exp_of_none=60)
+    pipe.results  # 按调用顺序返回
+    """
+
+    def __init__(self, pool, codec: RawCodec):
+        self._pool = pool
+        self._codec = codec
+        self._commands: List[Tuple[str, tuple, dict, Any, Any, Optional[RawCodec]]] = []
+        self.results: List[Any] = []
+
+    def __len__(self):
+        return len(self._commands)
+
+    def _add(self, callback, *args, exp_of_none=None, default=None, codec=None, **kwargs):
+        self._commands.append((callback, args, kwargs, exp_of_none, default, codec))
+        return self
+
+    def set(self, key, value, exp=None, codec: CodecType = None):
+        value = get_codec(codec, self._codec).encode(value)
+        return self._add("set", key, value, expire=exp or 0)
+
+    def get(self, key, default=None, codec: CodecType = None):
+        return self._add("get", key, default=default, codec=get_codec(codec, self._codec))
+
+    def hget(self, name, key, default=0):
+        return self._add("hget", name, key, default=default)
+
+    def delete(self, key):
+        return self._add("delete", key)
+
+    def sadd(self, name, values, exp_of_none=None):
+        return self._add("sadd", name, values, exp_of_none=exp_of_none)
+
+    def hset(self, name, key, value, exp_of_none=None):
+        return self._add("hset", name, key, value, exp_of_none=exp_of_none)
+
+    def hincrby(self, name, key, value=1, exp_of_none=None):
+        return self._add("hincrby", name, key, value, exp_of_none=exp_of_none)
+
+    def hincrbyfloat(self, name, key, value, exp_of_none=None):
+        return self._add("hincrbyfloat", name, key, value, exp_of_none=exp_of_none)
+
+    def incrby(self, name, value=1, exp_of_none=None):
+        return self._add("incrby", name, value, exp_of_none=exp_of_none)
+
+    async def execute(self):
+        if not self._commands:
+            return []
+        pipe = self._pool.pipeline()
+        # 脚本缓存丢失时单独重试会排到后续命令之后, 先在同一批次中加载用到的脚本, 保证按顺序执行
+        scripts = {EXP_OF_NONE_SCRIPTS[callback] for callback, *_, exp_of_none, _, _ in self._commands if exp_of_none}
+        for script in scripts:
+            pipe.script_load(script.source)
+        for callback, args, kwargs, exp_of_none, _, _ in self._commands:
+            if exp_of_none:
+                script = EXP_OF_NONE_SCRIPTS[callback]
+                pipe.evalsha(script.sha, keys=[args[0]], args=[exp_of_none, *args[1:]])
+            else:
+                getattr(pipe, callback)(*args, **kwargs)
+        replies = (await pipe.execute(return_exceptions=True))[len(scripts):]
+        results = []
+        for (callback, args, _, exp_of_none, default, codec), value in zip(self._commands, replies):
+            if exp_of_none and not isinstance(value, Exception):
+                value = EXP_OF_NONE_SCRIPTS[callback].to_python(value)
+            if isinstance(value, Exception):
+                raise value
+            if codec is not None:
+                value = codec.decode(value)
+            results.append(default if value is None else value)
+        self._commands = []
+        self.results = results
+        return results
 
 
 class AsyncRedisUtil:
@@ -10,14 +119,58 @@ class AsyncRedisUtil:
     """
 
     _pool = None
+    _health_check_tasks: List[asyncio.Future] = []
+    _flights: Dict[Any, asyncio.Future] = {}
+    # set/get/get_or_set 默认编解码, 可逐次调用通过 codec 参数覆盖
+    codec: RawCodec = default_codec()
 
     @classmethod
     async def init(
-        cls, host=settings.REDIS_HOST, port=settings.REDIS_PORT, password=settings.REDIS_PASSWORD, db=0, **kwargs,
+        cls,
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        db=0,
+        minsize=settings.REDIS_POOL_MINSIZE,
+        maxsize=settings.REDIS_POOL_MAXSIZE,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        nodes=settings.REDIS_NODES,
+        **kwargs,
     ):
-        cls._pool = await aioredis.create_redis_pool(f"redis://{host}:{port}", password=password, db=db, **kwargs)
+        """
+        :param nodes: host:port 列表, 不为空时按一致性哈希分片, 忽略 host/port
+        """
+        options = dict(password=password, db=db, minsize=minsize, maxsize=maxsize, **kwargs)
+        options.setdefault("pool_cls", InstrumentedConnectionsPool)
+        if nodes:
+            cls._pool = await ShardedRedis.create(nodes, **options)
+        else:
+            cls._pool = await aioredis.create_redis_pool(f"redis://{host}:{port}", **options)
+        for script in ALL_SCRIPTS:
+            await cls._pool.script_load(script.source)
+        if health_check_interval:
+            cls._health_check_tasks = [
+                asyncio.ensure_future(health_check_loop(node.connection, health_check_interval))
+                for node in cls._nodes()
+            ]
         return cls._pool
 
+    @classmethod
+    def _nodes(cls) -> List[aioredis.Redis]:
+        if isinstance(cls._pool, ShardedRedis):
+            return cls._pool.nodes
+        return [cls._pool]
+
+    @classmethod
+    def metrics(cls) -> dict:
+        """
+        连接池占用、获取连接等待及按命令统计的耗时(含 pipeline / multi_exec), 分片时按节点返回
+        """
+        assert cls._pool, "must call init first"
+        if isinstance(cls._pool, ShardedRedis):
+            return cls._pool.stats()
+        return cls._pool.connection.stats()
+
     @classmethod
     async def get_pool(cls):
         assert cls._pool, "must call init first"
@@ -27,31 +180,21 @@ class AsyncRedisUtil:
     async def _exp_of_none(cls, *args, exp_of_none, callback):
         if not exp_of_none:
             return await getattr(cls._pool, callback)(*args)
-        key = args[0]
-        tr = cls._pool.multi_exec()
-        fun = getattr(tr, callback)
-        exists = await cls._pool.exists(key)
-        if not exists:
-            fun(*args)
-            tr.expire(key, exp_of_none)
-            ret, _ = await tr.execute()
-        else:
-            fun(*args)
-            ret = (await tr.execute())[0]
-        return ret
+        key, *values = args
+        return await EXP_OF_NONE_SCRIPTS[callback].execute(cls._pool, [key], [exp_of_none, *values])
 
     @classmethod
-    async def set(cls, key, value, exp=None):
+    async def set(cls, key, value, exp=None, codec: CodecType = None):
         assert cls._pool, "must call init first"
-        await cls._pool.set(key, value, expire=exp)
+        await cls._pool.set(key, get_codec(codec, cls.codec).encode(value), expire=exp)
 
     @classmethod
-    async def get(cls, key, default=None):
+    async def get(cls, key, default=None, codec: CodecType = None):
         assert cls._pool, "must call init first"
         value = await cls._pool.get(key)
         if value is None:
             return default
-        return value
+        return get_codec(codec, cls.codec).decode(value)
 
     @classmethod
     async def hget(cls, name, key, default=0):
@@ -65,20 +208,134 @@ class AsyncRedisUtil:
         return v
 
     @classmethod
-    async def get_or_set(cls, key, default=None, value_fun=None):
+    @asynccontextmanager
+    async def pipeline(cls):
         """
-        获取或者设置缓存
+        批量操作上下文, 退出时一次网络往返发送全部命令
         """
         assert cls._pool, "must call init first"
-        value = await cls._pool.get(key)
-        if value is None and default:
-            return default
-        if value is not None:
+        pipe = AsyncRedisPipeline(cls._pool, cls.codec)
+        yield pipe
+        await pipe.execute()
+
+    @classmethod
+    async def mget_many(cls, keys: Sequence, default=None, codec: CodecType = None) -> List[Any]:
+        """
+        批量获取, 按keys顺序返回
+        """
+        assert cls._pool, "must call init first"
+        if not keys:
+            return []
+        codec = get_codec(codec, cls.codec)
+        values = await cls._pool.mget(*keys)
+        return [default if v is None else codec.decode(v) for v in values]
+
+    @classmethod
+    async def set_many(cls, mapping: Dict[Any, Any], exp=None, codec: CodecType = None):
+        """
+        批量设置, 过期时间相同
+        """
+        assert cls._pool, "must call init first"
+        if not mapping:
+            return
+        codec = get_codec(codec, cls.codec)
+        if not exp:
+            await cls._pool.mset(*[i for key, value in mapping.items() for i in (key, codec.encode(value))])
+            return
+        async with cls.pipeline() as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, exp=exp, codec=codec)
+
+    @classmethod
+    async def hget_many(cls, fields: Iterable[Tuple[Any, Any]], default=0) -> List[Any]:
+        """
+        批量获取 (name, key) 对应的hash值
+        """
+        assert cls._pool, "must call init first"
+        async with cls.pipeline() as pipe:
+            for name, key in fields:
+                pipe.hget(name, key, default=default)
+        return pipe.results
+
+    @classmethod
+    async def get_or_set(
+        cls,
+        key,
+        default=None,
+        value_fun=None,
+        lock_timeout: int = None,
+        beta: float = 0,
+        codec: CodecType = None,
+    ):
+        """
+        获取或者设置缓存, 同一进程内并发缺失只回源一次
+        :param key:
+        :param default: 缓存与回源结果都为空时返回
+        :param value_fun: 缓存缺失时调用, 返回 (value, exp)
+        :param lock_timeout: 跨进程回源锁时长(毫秒), 设置后同一时刻只有一个进程回源
+        :param beta: 大于0时开启提前概率刷新(XFetch), 过期前由单个请求提前回源
+        :param codec:
+        :return:
+        """
+        assert cls._pool, "must call init first"
+        codec = get_codec(codec, cls.codec)
+        if beta:
+            pipe = cls._pool.pipeline()
+            pipe.get(key)
+            pipe.pttl(key)
+            pipe.get(RedisCacheKey.get_or_set_delta.format(key))
+            value, ttl, delta = await pipe.execute()
+            refresh = value is None or _should_refresh_early(ttl, delta, beta)
+        else:
+            value = await cls._pool.get(key)
+            refresh = value is None
+        value = codec.decode(value)
+        if not refresh or not value_fun:
+            return default if value is None else value
+
+        flight = cls._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(cls._refresh(key, value_fun, lock_timeout, beta, codec, value))
+            cls._flights[key] = flight
+            flight.add_done_callback(lambda _: cls._flights.pop(key, None))
+        elif value is not None:
+            # 提前刷新已在进行, 直接返回当前值
             return value
-        if value_fun:
+        value = await asyncio.shield(flight)
+        return default if value is None else value
+
+    @classmethod
+    async def _refresh(cls, key, value_fun, lock_timeout, beta, codec, stale):
+        token = None
+        if lock_timeout:
+            lock_key = RedisCacheKey.get_or_set_lock.format(key)
+            token = os.urandom(16)
+            acquired = await cls._pool.set(lock_key, token, pexpire=lock_timeout, exist="SET_IF_NOT_EXIST")
+            if not acquired:
+                if stale is not None:
+                    return stale
+                deadline = time.monotonic() + lock_timeout / 1000
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(_GET_OR_SET_POLL_INTERVAL)
+                    value = await cls._pool.get(key)
+                    if value is not None:
+                        return codec.decode(value)
+                # 持有者超时未写入, 自行回源
+                token = None
+        try:
+            start = time.monotonic()
             value, exp = await value_fun()
-            await cls._pool.set(key, value, expire=exp)
-        return value
+            if value is not None:
+                pipe = cls._pool.pipeline()
+                pipe.set(key, codec.encode(value), expire=exp or 0)
+                if beta:
+                    delta = int((time.monotonic() - start) * 1000) or 1
+                    pipe.set(RedisCacheKey.get_or_set_delta.format(key), delta, expire=exp or 0)
+                await pipe.execute()
+            return value
+        finally:
+            if token:
+                await RELEASE_LOCK_SCRIPT.execute(cls._pool, [RedisCacheKey.get_or_set_lock.format(key)], [token])
 
     @classmethod
     async def delete(cls, key):
@@ -115,23 +372,64 @@ class AsyncRedisUtil:
 
     @classmethod
     async def close(cls):
+        for task in cls._health_check_tasks:
+            task.cancel()
+        cls._health_check_tasks = []
         cls._pool.close()
         await cls._pool.wait_closed()
 
 
+class _SyncFlight:
+    """
+    同步 get_or_set 的一次回源, 等待者共享结果或异常
+    """
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+    def result(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
 class RedisUtil:
     """
     同步Redis操作
     """
 
     r = None
+    # set/get/get_or_set 默认编解码, 可逐次调用通过 codec 参数覆盖
+    codec: RawCodec = default_codec()
+    # 进行中的回源, 同一进程内并发缺失只回源一次
+    _flights: Dict[Any, "_SyncFlight"] = {}
+    _flights_lock = threading.Lock()
 
     @classmethod
     def init(
-        cls, host=settings.REDIS_HOST, port=settings.REDIS_PORT, password=settings.REDIS_PASSWORD, db=0, **kwargs,
+        cls,
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        db=0,
+        nodes=settings.REDIS_NODES,
+        **kwargs,
     ):
-        pool = o_redis.ConnectionPool(host=host, port=port, password=password, db=db, **kwargs)
-        cls.r = o_redis.Redis(connection_pool=pool)  # type:o_redis.Redis
+        """
+        :param nodes: host:port 列表, 不为空时按一致性哈希分片, 忽略 host/port
+        """
+        if nodes:
+            cls.r = ShardedSyncRedis.create(nodes, password=password, db=db, **kwargs)
+        else:
+            pool = o_redis.ConnectionPool(host=host, port=port, password=password, db=db, **kwargs)
+            cls.r = o_redis.Redis(connection_pool=pool)  # type:o_redis.Redis
+        for script in ALL_SCRIPTS:
+            cls.r.script_load(script.source)
 
     @classmethod
     async def get_pool(cls):
@@ -142,57 +440,118 @@ class RedisUtil:
     def _exp_of_none(cls, *args, exp_of_none, callback):
         if not exp_of_none:
             return getattr(cls.r, callback)(*args)
-        with cls.r.pipeline() as pipe:
-            count = 0
-            while True:
-                try:
-                    fun = getattr(pipe, callback)
-                    key = args[0]
-                    pipe.watch(key)
-                    exp = pipe.ttl(key)
-                    pipe.multi()
-                    if exp == -2:
-                        fun(*args)
-                        pipe.expire(key, exp_of_none)
-                        ret, _ = pipe.execute()
-                    else:
-                        fun(*args)
-                        ret = pipe.execute()[0]
-                    return ret
-                except o_redis.WatchError:
-                    if count > 3:
-                        raise o_redis.WatchError
-                    count += 1
-                    continue
-
-    @classmethod
-    def get_or_set(cls, key, default=None, value_fun=None):
-        """
-        获取或者设置缓存
+        key, *values = args
+        return EXP_OF_NONE_SCRIPTS[callback].execute_sync(cls.r, [key], [exp_of_none, *values])
+
+    @classmethod
+    def get_or_set(
+        cls,
+        key,
+        default=None,
+        value_fun=None,
+        lock_timeout: int = None,
+        beta: float = 0,
+        codec: CodecType = None,
+    ):
         """
-        value = cls.r.get(key)
-        if value is None and default:
-            return default
-        if value is not None:
-            return value
-        if value_fun:
+        获取或者设置缓存, 同一进程内并发缺失只回源一次
+        :param key:
+        :param default: 缓存与回源结果都为空时返回
+        :param value_fun: 缓存缺失时调用, 返回 (value, exp)
+        :param lock_timeout: 跨进程回源锁时长(毫秒), 设置后同一时刻只有一个进程回源
+        :param beta: 大于0时开启提前概率刷新(XFetch), 过期前由单个请求提前回源
+        :param codec:
+        :return:
+        """
+        codec = get_codec(codec, cls.codec)
+        value, refresh = cls._get_for_refresh(key, beta)
+        value = codec.decode(value)
+        if not refresh or not value_fun:
+            return default if value is None else value
+
+        with cls._flights_lock:
+            flight = cls._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = cls._flights[key] = _SyncFlight()
+        if not leader:
+            if value is not None:
+                # 提前刷新已在进行, 直接返回当前值
+                return value
+            value = flight.result()
+            return default if value is None else value
+        try:
+            if value is None:
+                # 其他线程可能刚回源完成, 复查一次
+                value = codec.decode(cls.r.get(key))
+                refresh = value is None
+            if refresh:
+                value = cls._refresh(key, value_fun, lock_timeout, beta, codec, value)
+            flight.value = value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            # 只在回源期间持有短锁, value_fun 中可以调用其他 key 的 get_or_set
+            with cls._flights_lock:
+                cls._flights.pop(key, None)
+            flight.done.set()
+        return default if value is None else value
+
+    @classmethod
+    def _get_for_refresh(cls, key, beta):
+        if not beta:
+            value = cls.r.get(key)
+            return value, value is None
+        with cls.r.pipeline(transaction=False) as pipe:
+            value, ttl, delta = pipe.get(key).pttl(key).get(RedisCacheKey.get_or_set_delta.format(key)).execute()
+        return value, value is None or _should_refresh_early(ttl, delta, beta)
+
+    @classmethod
+    def _refresh(cls, key, value_fun, lock_timeout, beta, codec, stale):
+        token = None
+        if lock_timeout:
+            lock_key = RedisCacheKey.get_or_set_lock.format(key)
+            token = os.urandom(16)
+            if not cls.r.set(lock_key, token, px=lock_timeout, nx=True):
+                if stale is not None:
+                    return stale
+                deadline = time.monotonic() + lock_timeout / 1000
+                while time.monotonic() < deadline:
+                    time.sleep(_GET_OR_SET_POLL_INTERVAL)
+                    value = cls.r.get(key)
+                    if value is not None:
+                        return codec.decode(value)
+                # 持有者超时未写入, 自行回源
+                token = None
+        try:
+            start = time.monotonic()
             value, exp = value_fun()
-            cls.r.set(key, value, exp)
-        return value
+            if value is not None:
+                with cls.r.pipeline(transaction=False) as pipe:
+                    pipe.set(key, codec.encode(value), exp)
+                    if beta:
+                        delta = int((time.monotonic() - start) * 1000) or 1
+                        pipe.set(RedisCacheKey.get_or_set_delta.format(key), delta, exp)
+                    pipe.execute()
+            return value
+        finally:
+            if token:
+                RELEASE_LOCK_SCRIPT.execute_sync(cls.r, [RedisCacheKey.get_or_set_lock.format(key)], [token])
 
     @classmethod
-    def get(cls, key, default=None):
+    def get(cls, key, default=None, codec: CodecType = None):
         value = cls.r.get(key)
         if value is None:
             return default
-        return value
+        return get_codec(codec, cls.codec).decode(value)
 
     @classmethod
-    def set(cls, key, value, exp=None):
+    def set(cls, key, value, exp=None, codec: CodecType = None):
         """
         设置缓存
         """
-        return cls.r.set(key, value, exp)
+        return cls.r.set(key, get_codec(codec, cls.codec).encode(value), exp)
 
     @classmethod
     def delete(cls, key):
@@ -233,7 +592,7 @@ class RedisUtil:
 
 
 async def get_async_redis():
-    return AsyncRedisUtil.get_pool()
+    return await AsyncRedisUtil.get_pool()
 
 
 def get_sync_redis():
@@ -0,0 +1,228 @@
+"""
+两级缓存: 进程内 L1(LRU + TTL) + Redis L2
+
+写入与删除通过 Redis 频道广播失效消息, 所有 worker 收到后清除本地 L1
+
+local_cache = TwoTierCache("config")
+await local_cache.get_or_set("key", value_fun=load_config)
+"""
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, Dict, List, Tuple, Optional
+from collections import OrderedDict
+
+import orjson
+
+from db.redis import AsyncRedisUtil
+from db.redis.codecs import CodecType
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "l1_cache_invalidation"
+
+
+def normalize_key(key):
+    """
+    L1 与失效消息统一使用 str 作为 key, b"k" 与 "k" 视为同一个 key
+    """
+    return key.decode() if isinstance(key, bytes) else key
+
+
+class LRUCache:
+    """
+    带过期时间的LRU, 非线程安全, 仅在事件循环内使用
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key, value, ttl: int = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+
+class TwoTierCache:
+    """
+    L1 未命中时读 Redis, Redis 未命中时回源(AsyncRedisUtil.get_or_set)
+    """
+
+    _instances: Dict[str, "TwoTierCache"] = {}
+
+    def __init__(self, name: str = "default", maxsize: int = None, ttl: int = None, codec: CodecType = None):
+        """
+        :param name: 失效广播按名称区分
+        :param maxsize:
+        :param ttl: L1 最长存活秒数
+        :param codec: L2 编解码, L1 保存解码后的对象
+        """
+        assert name not in self._instances, f"TwoTierCache {name} already exists"
+        self.name = name
+        self.codec = codec
+        self.l1 = LRUCache(
+            maxsize=maxsize or settings.REDIS_L1_CACHE_SIZE, ttl=ttl or settings.REDIS_L1_CACHE_TTL,
+        )
+        self.invalidations = 0
+        self._instances[name] = self
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self.l1),
+            "hits": self.l1.hits,
+            "misses": self.l1.misses,
+            "evictions": self.l1.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    @classmethod
+    def all_stats(cls) -> Dict[str, Dict[str, int]]:
+        return {name: cache.stats for name, cache in cls._instances.items()}
+
+    async def get(self, key, default=None):
+        value = self.l1.get(normalize_key(key))
+        if value is not None:
+            return value
+        value = await AsyncRedisUtil.get(key, codec=self.codec)
+        if value is None:
+            return default
+        self.l1.set(normalize_key(key), value)
+        return value
+
+    async def get_or_set(self, key, default=None, value_fun=None, **kwargs):
+        """
+        kwargs 透传给 AsyncRedisUtil.get_or_set
+        """
+        value = self.l1.get(normalize_key(key))
+        if value is not None:
+            return value
+        value = await AsyncRedisUtil.get_or_set(key, value_fun=value_fun, codec=self.codec, **kwargs)
+        if value is None:
+            return default
+        self.l1.set(normalize_key(key), value)
+        return value
+
+    async def set(self, key, value, exp=None):
+        """
+        不直接写入本地 L1: 读回的值需与其他 worker 从 Redis 解码得到的一致(如 RAW 下 str 读回为 bytes),
+        由下一次 get 从 Redis 填充
+        """
+        await AsyncRedisUtil.set(key, value, exp=exp, codec=self.codec)
+        await self.invalidate(key)
+
+    async def delete(self, key):
+        await AsyncRedisUtil.delete(key)
+        await self.invalidate(key)
+
+    async def invalidate(self, *keys, local: bool = True):
+        """
+        广播失效, 其他 worker 清除 L1
+        :param keys:
+        :param local: 是否同时清除本进程 L1
+        """
+        if local:
+            for key in keys:
+                self.l1.delete(normalize_key(key))
+        await invalidation_listener.publish(self.name, keys)
+
+    def _on_invalidate(self, keys: List):
+        for key in keys:
+            self.l1.delete(normalize_key(key))
+        self.invalidations += len(keys)
+
+
+class InvalidationListener:
+    """
+    订阅失效频道, 每个 worker 一个; 订阅中断期间无法保证 L1 一致, 中断时清空全部 L1
+    """
+
+    reconnect_interval = 1
+
+    def __init__(self, channel: str = INVALIDATION_CHANNEL):
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, name: str, keys):
+        if not keys:
+            return
+        keys = [normalize_key(k) for k in keys]
+        message = {"origin": self.origin, "name": name, "keys": keys}
+        pool = await AsyncRedisUtil.get_pool()
+        await pool.publish(self.channel, orjson.dumps(message))
+
+    def dispatch(self, raw: bytes):
+        message = orjson.loads(raw)
+        if message.get("origin") == self.origin:
+            return
+        cache = TwoTierCache._instances.get(message.get("name"))
+        if cache is not None:
+            cache._on_invalidate(message.get("keys") or [])
+
+    async def _listen(self):
+        while True:
+            try:
+                pool = await AsyncRedisUtil.get_pool()
+                channel, = await pool.subscribe(self.channel)
+                while await channel.wait_message():
+                    self.dispatch(await channel.get())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"L1 cache invalidation listener interrupted: {e}")
+            for cache in TwoTierCache._instances.values():
+                cache.l1.clear()
+            await asyncio.sleep(self.reconnect_interval)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._listen())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        pool = await AsyncRedisUtil.get_pool()
+        if not pool.closed:
+            await pool.unsubscribe(self.channel)
+
+
+invalidation_listener = InvalidationListener()
+
+local_cache = TwoTierCache()
@@ -0,0 +1,381 @@
+"""
+多节点 Redis 分片: 按一致性哈希把 key 路由到节点, 每个节点独立连接池
+
+支持 Redis Cluster 风格的 hash tag, "{user:1}:profile" 与 "{user:1}:token" 只按 "user:1" 计算节点,
+多 key 命令(Lua 脚本、mget 等)需保证 key 落在同一节点, mget/mset/delete/exists 与 pipeline 会按节点拆分
+"""
+import bisect
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Tuple, Union, Sequence
+from functools import partial
+from collections import defaultdict
+
+import redis as o_redis
+import aioredis
+
+KeyType = Union[str, bytes]
+
+
+class CrossShardError(Exception):
+    """
+    多 key 命令的 key 分布在不同节点
+    """
+
+
+def hash_tag(key: KeyType) -> bytes:
+    """
+    取 {} 中的内容作为分片依据, 没有或为空时使用整个 key
+    """
+    if not isinstance(key, bytes):
+        key = str(key).encode("utf-8")
+    start = key.find(b"{")
+    if start != -1:
+        end = key.find(b"}", start + 1)
+        if end > start + 1:
+            return key[start + 1 : end]
+    return key
+
+
+def same_shard_key(key: KeyType, suffix: str) -> str:
+    """
+    派生与 key 位于同一节点的 key, 用于多 key 的 Lua 脚本
+    """
+    if isinstance(key, bytes):
+        key = key.decode("utf-8")
+    if hash_tag(key) != key.encode("utf-8"):
+        return f"{key}{suffix}"
+    return f"{{{key}}}{suffix}"
+
+
+class HashRing:
+    def __init__(self, nodes: Sequence[str], replicas: int = 160):
+        """
+        :param nodes: 节点名称, 通常为 host:port
+        :param replicas: 每个节点的虚拟节点数
+        """
+        assert nodes, "HashRing requires one node at least"
+        self.nodes = list(nodes)
+        ring = sorted(
+            (self._hash(f"{node}#{i}".encode("utf-8")), index)
+            for index, node in enumerate(self.nodes)
+            for i in range(replicas)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [owner for _, owner in ring]
+
+    @staticmethod
+    def _hash(data: bytes) -> int:
+        return int.from_bytes(hashlib.md5(data).digest()[:8], "big")
+
+    def node_index(self, key: KeyType) -> int:
+        i = bisect.bisect(self._points, self._hash(hash_tag(key)))
+        return self._owners[i % len(self._owners)]
+
+    def group(self, keys: Sequence[KeyType]) -> Dict[int, List[int]]:
+        """
+        按节点分组, 返回 节点下标 -> keys 中的下标
+        """
+        groups = defaultdict(list)
+        for i, key in enumerate(keys):
+            groups[self.node_index(key)].append(i)
+        return groups
+
+    def single_node(self, keys: Sequence[KeyType]) -> int:
+        if not keys:
+            return 0
+        indexes = {self.node_index(key) for key in keys}
+        if len(indexes) > 1:
+            raise CrossShardError(f"Keys {list(keys)} belong to different redis nodes, use hash tag")
+        return indexes.pop()
+
+
+# 需要在所有节点执行的命令
+_BROADCAST_COMMANDS = {"script_load", "script_flush", "flushdb", "flushall"}
+# 无法按 key 拆分的命令
+_UNSUPPORTED_COMMANDS = {"multi_exec", "keys", "scan", "rename", "renamenx", "smove", "sunionstore", "sinterstore"}
+
+
+def _script_keys(args: tuple, kwargs: dict) -> List:
+    if "keys" in kwargs:
+        return kwargs["keys"]
+    return args[1] if len(args) > 1 else []
+
+
+class ShardedRedis:
+    """
+    异步分片客户端, 接口与 aioredis.Redis 一致(覆盖本项目使用的命令)
+    """
+
+    def __init__(self, nodes: Dict[str, aioredis.Redis], replicas: int = 160):
+        self.names = list(nodes)
+        self.nodes = list(nodes.values())
+        self.ring = HashRing(self.names, replicas=replicas)
+
+    @classmethod
+    async def create(cls, addresses: Sequence[str], **kwargs) -> "ShardedRedis":
+        """
+        :param addresses: host:port 列表
+        :param kwargs: 透传 aioredis.create_redis_pool
+        """
+        nodes = {}
+        try:
+            for address in addresses:
+                nodes[address] = await aioredis.create_redis_pool(f"redis://{address}", **kwargs)
+        except Exception:
+            for node in nodes.values():
+                node.close()
+            raise
+        return cls(nodes)
+
+    def node_for(self, key: KeyType) -> aioredis.Redis:
+        return self.nodes[self.ring.node_index(key)]
+
+    def route(self, command: str, args: tuple, kwargs: dict) -> int:
+        if command in ("evalsha", "eval"):
+            return self.ring.single_node(_script_keys(args, kwargs))
+        if command in ("mget", "delete", "exists", "blpop", "brpop"):
+            return self.ring.single_node([a for a in args if not isinstance(a, int)])
+        return self.ring.node_index(args[0])
+
+    def __getattr__(self, name: str):
+        if name in _UNSUPPORTED_COMMANDS:
+            raise NotImplementedError(f"{name} is not supported in sharded redis")
+        if name in _BROADCAST_COMMANDS:
+            return partial(self._broadcast, name)
+        if not callable(getattr(aioredis.Redis, name, None)):
+            raise AttributeError(name)
+
+        def routed(*args, **kwargs):
+            return getattr(self.nodes[self.route(name, args, kwargs)], name)(*args, **kwargs)
+
+        return routed
+
+    async def _broadcast(self, command: str, *args, **kwargs):
+        results = await asyncio.gather(*[getattr(node, command)(*args, **kwargs) for node in self.nodes])
+        return results[0]
+
+    def evalsha(self, digest, keys=[], args=[]):
+        return self.nodes[self.ring.single_node(keys)].evalsha(digest, keys=keys, args=args)
+
+    def eval(self, script, keys=[], args=[]):
+        return self.nodes[self.ring.single_node(keys)].eval(script, keys=keys, args=args)
+
+    async def mget(self, key, *keys, **kwargs) -> List[Any]:
+        keys = (key, *keys)
+        groups = self.ring.group(keys)
+        replies = await asyncio.gather(
+            *[self.nodes[node].mget(*[keys[i] for i in indexes], **kwargs) for node, indexes in groups.items()]
+        )
+        result = [None] * len(keys)
+        for indexes, values in zip(groups.values(), replies):
+            for i, value in zip(indexes, values):
+                result[i] = value
+        return result
+
+    async def mset(self, *pairs):
+        keys = pairs[::2]
+        groups = self.ring.group(keys)
+        await asyncio.gather(
+            *[
+                self.nodes[node].mset(*[item for i in indexes for item in (keys[i], pairs[i * 2 + 1])])
+                for node, indexes in groups.items()
+            ]
+        )
+        return True
+
+    async def _sum_by_node(self, command: str, keys: tuple) -> int:
+        groups = self.ring.group(keys)
+        replies = await asyncio.gather(
+            *[getattr(self.nodes[node], command)(*[keys[i] for i in indexes]) for node, indexes in groups.items()]
+        )
+        return sum(replies)
+
+    def delete(self, key, *keys):
+        return self._sum_by_node("delete", (key, *keys))
+
+    def exists(self, key, *keys):
+        return self._sum_by_node("exists", (key, *keys))
+
+    def pipeline(self) -> "ShardedPipeline":
+        return ShardedPipeline(self)
+
+    @property
+    def closed(self) -> bool:
+        return all(node.closed for node in self.nodes)
+
+    def close(self):
+        for node in self.nodes:
+            node.close()
+
+    async def wait_closed(self):
+        await asyncio.gather(*[node.wait_closed() for node in self.nodes])
+
+    def stats(self) -> Dict[str, dict]:
+        return {name: node.connection.stats() for name, node in zip(self.names, self.nodes)}
+
+
+class ShardedPipeline:
+    """
+    按节点拆分为多个 pipeline 并发执行, 结果按调用顺序返回; 只能通过 execute() 的返回值获取结果
+    """
+
+    def __init__(self, redis: ShardedRedis):
+        self._redis = redis
+        self._commands: List[Tuple[int, str, tuple, dict]] = []
+
+    # 在每个涉及的节点上执行的命令
+    _ALL_NODES = -1
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self._commands.append((self._redis.route(name, args, kwargs), name, args, kwargs))
+
+        return queue
+
+    def script_load(self, script):
+        self._commands.append((self._ALL_NODES, "script_load", (script,), {}))
+
+    async def _execute_node(self, node: int, indexes: List[int]):
+        pipe = self._redis.nodes[node].pipeline()
+        for i in indexes:
+            _, name, args, kwargs = self._commands[i]
+            getattr(pipe, name)(*args, **kwargs)
+        return indexes, await pipe.execute(return_exceptions=True)
+
+    async def execute(self, *, return_exceptions=False):
+        groups = defaultdict(list)
+        broadcast = []
+        for i, (node, *_) in enumerate(self._commands):
+            if node == self._ALL_NODES:
+                broadcast.append(i)
+            else:
+                groups[node].append(i)
+        for node in groups or [0]:
+            # 按下标排序, 保持与其他命令的先后顺序
+            groups[node] = sorted(groups[node] + broadcast)
+        results = [None] * len(self._commands)
+        for indexes, replies in await asyncio.gather(*[self._execute_node(n, ix) for n, ix in groups.items()]):
+            for i, reply in zip(indexes, replies):
+                results[i] = reply
+        self._commands = []
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors and not return_exceptions:
+            raise aioredis.PipelineError(errors)
+        return results
+
+
+class ShardedSyncRedis:
+    """
+    同步分片客户端, 接口与 redis.Redis 一致(覆盖本项目使用的命令)
+    """
+
+    def __init__(self, nodes: Dict[str, o_redis.Redis], replicas: int = 160):
+        self.names = list(nodes)
+        self.nodes = list(nodes.values())
+        self.ring = HashRing(self.names, replicas=replicas)
+
+    @classmethod
+    def create(cls, addresses: Sequence[str], **kwargs) -> "ShardedSyncRedis":
+        nodes = {}
+        for address in addresses:
+            host, port = address.rsplit(":", 1)
+            pool = o_redis.ConnectionPool(host=host, port=int(port), **kwargs)
+            nodes[address] = o_redis.Redis(connection_pool=pool)
+        return cls(nodes)
+
+    def node_for(self, key: KeyType) -> o_redis.Redis:
+        return self.nodes[self.ring.node_index(key)]
+
+    def route(self, command: str, args: tuple) -> int:
+        if command in ("evalsha", "eval"):
+            return self.ring.single_node(args[2 : 2 + int(args[1])])
+        if command in ("mget", "delete", "exists"):
+            return self.ring.single_node(args)
+        return self.ring.node_index(args[0])
+
+    def __getattr__(self, name: str):
+        if name in _UNSUPPORTED_COMMANDS:
+            raise NotImplementedError(f"{name} is not supported in sharded redis")
+        if name in _BROADCAST_COMMANDS:
+            return lambda *args, **kwargs: [getattr(node, name)(*args, **kwargs) for node in self.nodes][0]
+        if not callable(getattr(o_redis.Redis, name, None)):
+            raise AttributeError(name)
+
+        def routed(*args, **kwargs):
+            return getattr(self.nodes[self.route(name, args)], name)(*args, **kwargs)
+
+        return routed
+
+    def evalsha(self, sha, numkeys, *keys_and_args):
+        return self.nodes[self.ring.single_node(keys_and_args[:numkeys])].evalsha(sha, numkeys, *keys_and_args)
+
+    def eval(self, script, numkeys, *keys_and_args):
+        return self.nodes[self.ring.single_node(keys_and_args[:numkeys])].eval(script, numkeys, *keys_and_args)
+
+    def mget(self, keys, *args) -> List[Any]:
+        keys = [*keys, *args] if isinstance(keys, (list, tuple)) else [keys, *args]
+        result = [None] * len(keys)
+        for node, indexes in self.ring.group(keys).items():
+            for i, value in zip(indexes, self.nodes[node].mget([keys[i] for i in indexes])):
+                result[i] = value
+        return result
+
+    def delete(self, *names) -> int:
+        return sum(self.nodes[node].delete(*[names[i] for i in ix]) for node, ix in self.ring.group(names).items())
+
+    def exists(self, *names) -> int:
+        return sum(self.nodes[node].exists(*[names[i] for i in ix]) for node, ix in self.ring.group(names).items())
+
+    def pipeline(self, transaction=True) -> "ShardedSyncPipeline":
+        return ShardedSyncPipeline(self, transaction=transaction)
+
+
+class ShardedSyncPipeline:
+    """
+    同 redis-py pipeline, 命令可链式调用, execute() 按调用顺序返回结果; transaction 仅在单个节点内生效
+    """
+
+    def __init__(self, redis: ShardedSyncRedis, transaction=True):
+        self._redis = redis
+        self._transaction = transaction
+        self._commands: List[Tuple[int, str, tuple, dict]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._commands = []
+
+    # 在每个涉及的节点上执行的命令
+    _ALL_NODES = -1
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            node = self._ALL_NODES if name in _BROADCAST_COMMANDS else self._redis.route(name, args)
+            self._commands.append((node, name, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self, raise_on_error=True):
+        groups = defaultdict(list)
+        broadcast = []
+        for i, (node, *_) in enumerate(self._commands):
+            if node == self._ALL_NODES:
+                broadcast.append(i)
+            else:
+                groups[node].append(i)
+        for node in groups or [0]:
+            # 按下标排序, 保持与其他命令的先后顺序
+            groups[node] = sorted(groups[node] + broadcast)
+        results = [None] * len(self._commands)
+        for node, indexes in groups.items():
+            with self._redis.nodes[node].pipeline(transaction=self._transaction) as pipe:
+                for i in indexes:
+                    _, name, args, kwargs = self._commands[i]
+                    getattr(pipe, name)(*args, **kwargs)
+                for i, reply in zip(indexes, pipe.execute(raise_on_error=raise_on_error)):
+                    results[i] = reply
+        self._commands = []
+        return results
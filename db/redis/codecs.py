@@ -0,0 +1,120 @@
+"""
+Redis 值编解码, 支持 orjson / msgpack 序列化以及超过阈值时压缩
+
+codec = Codec("msgpack", compression="lz4", min_compress_size=1024)
+await AsyncRedisUtil.set("key", {"a": 1}, codec=codec)
+await AsyncRedisUtil.get("key", codec=codec)  # {"a": 1}
+"""
+import zlib
+from typing import Any, Dict, Tuple, Union, Callable, Optional
+from functools import partial, lru_cache
+
+import orjson
+
+from core.settings import settings
+
+_SERIALIZERS: Dict[str, Tuple[Callable, Callable]] = {
+    "orjson": (orjson.dumps, orjson.loads),
+}
+
+_COMPRESSORS: Dict[str, Tuple[Callable, Callable]] = {
+    "zlib": (zlib.compress, zlib.decompress),
+}
+
+try:
+    import msgpack
+
+    _SERIALIZERS["msgpack"] = (partial(msgpack.packb, use_bin_type=True), partial(msgpack.unpackb, raw=False))
+except ImportError:  # pragma: no cover
+    pass
+
+try:
+    import lz4.frame
+
+    _COMPRESSORS["lz4"] = (lz4.frame.compress, lz4.frame.decompress)
+except ImportError:  # pragma: no cover
+    pass
+
+# 开启压缩时值的首字节标记
+_PLAIN = b"\x00"
+_COMPRESSED = b"\x01"
+
+
+class RawCodec:
+    """
+    不做任何处理, 与未配置 codec 时行为一致
+    """
+
+    name = "raw"
+
+    def encode(self, value):
+        return value
+
+    def decode(self, data):
+        return data
+
+
+class Codec(RawCodec):
+    def __init__(self, serializer: str = "orjson", compression: str = None, min_compress_size: int = 1024):
+        """
+        :param serializer: orjson / msgpack
+        :param compression: zlib / lz4, 为空不压缩
+        :param min_compress_size: 序列化后超过该字节数才压缩
+        """
+        if serializer not in _SERIALIZERS:
+            raise ValueError(f"Unsupported redis serializer: {serializer}, installed: {list(_SERIALIZERS)}")
+        if compression and compression not in _COMPRESSORS:
+            raise ValueError(f"Unsupported redis compression: {compression}, installed: {list(_COMPRESSORS)}")
+        self.name = f"{serializer}+{compression}" if compression else serializer
+        self._dumps, self._loads = _SERIALIZERS[serializer]
+        self._compress, self._decompress = _COMPRESSORS[compression] if compression else (None, None)
+        self.min_compress_size = min_compress_size
+
+    def encode(self, value: Any) -> bytes:
+        data = self._dumps(value)
+        if self._compress is None:
+            return data
+        if len(data) >= self.min_compress_size:
+            return _COMPRESSED + self._compress(data)
+        return _PLAIN + data
+
+    def decode(self, data: Optional[bytes]) -> Any:
+        if data is None:
+            return None
+        if self._decompress is not None:
+            flag, data = data[:1], data[1:]
+            if flag == _COMPRESSED:
+                data = self._decompress(data)
+        return self._loads(data)
+
+
+RAW = RawCodec()
+
+CodecType = Union[RawCodec, str, None]
+
+
+def get_codec(codec: CodecType, default: RawCodec = RAW) -> RawCodec:
+    """
+    :param codec: Codec 实例或序列化名称, 为空时返回 default
+    :param default:
+    """
+    if codec is None:
+        return default
+    if isinstance(codec, str):
+        return _named_codec(codec)
+    return codec
+
+
+@lru_cache()
+def _named_codec(name: str) -> RawCodec:
+    return RAW if name == RAW.name else Codec(name)
+
+
+def default_codec() -> RawCodec:
+    if not settings.REDIS_CODEC:
+        return RAW
+    return Codec(
+        settings.REDIS_CODEC,
+        compression=settings.REDIS_COMPRESSION,
+        min_compress_size=settings.REDIS_COMPRESS_MIN_SIZE,
+    )
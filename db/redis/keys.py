@@ -5,3 +5,11 @@ from enum import Enum, unique
 class RedisCacheKey(str, Enum):
     # Redis锁 Key
     redis_lock = "redis_lock_{}"
+    # get_or_set 跨进程回源锁 Key
+    get_or_set_lock = "get_or_set_lock_{}"
+    # get_or_set 回源耗时(毫秒) Key, 用于提前刷新
+    get_or_set_delta = "get_or_set_delta_{}"
+    # 限流 Key, 参数依次为 算法, 范围, 标识
+    rate_limit = "rate_limit_{}_{}_{}"
+    # HBase 行缓存 Key, 参数依次为 表名, row key(hex)
+    hbase_row = "hbase_row_{}_{}"
@@ -0,0 +1,170 @@
+"""
+Redis 连接池监控: 连接占用、获取连接等待、按命令统计耗时与失败, 以及后台健康检查
+"""
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from typing import Dict, Tuple, Optional
+from collections import defaultdict
+
+import aioredis
+
+logger = logging.getLogger(__name__)
+
+# 秒
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """
+    固定分桶直方图, 最后一个桶为 +Inf
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        按桶上界估算分位值
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "avg": self.sum / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": {str(b): n for b, n in zip(self.buckets + ("+Inf",), self.counts)},
+        }
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.acquire_wait = Histogram()
+        self.commands: Dict[str, Histogram] = defaultdict(Histogram)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.health_checks = 0
+        self.health_failures = 0
+        self.last_health_check: Optional[float] = None
+
+    def observe_command(self, command, start: float, fut: asyncio.Future):
+        name = command.decode() if isinstance(command, bytes) else str(command)
+        name = name.upper()
+        self.commands[name].observe(time.monotonic() - start)
+        if not fut.cancelled() and fut.exception() is not None:
+            self.errors[name] += 1
+
+
+class InstrumentedConnectionsPool(aioredis.ConnectionsPool):
+    """
+    aioredis.create_redis_pool(..., pool_cls=InstrumentedConnectionsPool)
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.metrics = PoolMetrics()
+        super().__init__(*args, **kwargs)
+
+    async def _create_new_connection(self, address):
+        conn = await super()._create_new_connection(address)
+        self._instrument(conn)
+        return conn
+
+    def _instrument(self, conn: aioredis.RedisConnection):
+        """
+        在连接上统计命令耗时, 覆盖单条命令、pipeline 与 multi_exec(后两者不经过连接池的 execute)
+        """
+        execute = conn.execute
+
+        def instrumented(command, *args, **kw):
+            start = time.monotonic()
+            fut = execute(command, *args, **kw)
+            if asyncio.isfuture(fut):
+                fut.add_done_callback(lambda f: self.metrics.observe_command(command, start, f))
+            return fut
+
+        conn.execute = instrumented
+
+    def get_connection(self, command, args=()):
+        start = time.monotonic()
+        conn, address = super().get_connection(command, args)
+        if conn is not None:
+            # 有空闲连接的快速路径, 没有空闲连接时由 acquire 统计等待
+            self.metrics.acquire_wait.observe(time.monotonic() - start)
+        return conn, address
+
+    async def acquire(self, command=None, args=()):
+        start = time.monotonic()
+        conn = await super().acquire(command, args)
+        self.metrics.acquire_wait.observe(time.monotonic() - start)
+        return conn
+
+    async def health_check(self, timeout: float = 1):
+        """
+        PING 所有空闲连接, 失败的关闭并补足到最小连接数
+        """
+        self.metrics.health_checks += 1
+        self.metrics.last_health_check = time.time()
+        for conn in list(self._pool):
+            try:
+                await asyncio.wait_for(conn.execute(b"PING"), timeout)
+            except Exception as e:
+                self.metrics.health_failures += 1
+                logger.warning(f"Redis connection {conn} health check failed: {e}")
+                conn.close()
+        async with self._cond:
+            await self._fill_free(override_min=False)
+
+    def stats(self) -> dict:
+        """
+        acquire_wait 包含直接取得空闲连接与等待连接两种情况;
+        commands 从写入连接到收到回复计时, 不含等待连接, 包括 pipeline / multi_exec 中的命令与健康检查的 PING
+        """
+        return {
+            "size": self.size,
+            "free": self.freesize,
+            "in_use": self.size - self.freesize,
+            "minsize": self.minsize,
+            "maxsize": self.maxsize,
+            "acquire_wait": self.metrics.acquire_wait.snapshot(),
+            "commands": {name: h.snapshot() for name, h in self.metrics.commands.items()},
+            "errors": dict(self.metrics.errors),
+            "health_checks": self.metrics.health_checks,
+            "health_failures": self.metrics.health_failures,
+            "last_health_check": self.metrics.last_health_check,
+        }
+
+
+async def health_check_loop(pool: InstrumentedConnectionsPool, interval: float, timeout: float = 1):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await pool.health_check(timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Redis pool health check failed: {e}")
@@ -0,0 +1,183 @@
+"""
+Redis 服务端 Lua 脚本, 通过 EVALSHA 执行, 单次往返且原子
+"""
+import hashlib
+from typing import Dict, Callable
+
+import redis as o_redis
+import aioredis
+
+
+class RedisScript:
+    """
+    预加载的Lua脚本, 服务端脚本缓存丢失(NOSCRIPT)时退回EVAL并重新缓存
+    """
+
+    def __init__(self, source: str, convert: Callable = None):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode("utf-8")).hexdigest()
+        self.convert = convert
+
+    def to_python(self, value):
+        if self.convert is None or value is None:
+            return value
+        return self.convert(value)
+
+    @staticmethod
+    def is_noscript(error: Exception) -> bool:
+        return isinstance(error, o_redis.exceptions.NoScriptError) or str(error).startswith("NOSCRIPT")
+
+    async def execute(self, pool, keys=(), args=()):
+        try:
+            ret = await pool.evalsha(self.sha, keys=list(keys), args=list(args))
+        except aioredis.ReplyError as e:
+            if not self.is_noscript(e):
+                raise
+            ret = await pool.eval(self.source, keys=list(keys), args=list(args))
+        return self.to_python(ret)
+
+    def execute_sync(self, r: o_redis.Redis, keys=(), args=()):
+        try:
+            ret = r.evalsha(self.sha, len(keys), *keys, *args)
+        except o_redis.exceptions.NoScriptError:
+            ret = r.eval(self.source, len(keys), *keys, *args)
+        return self.to_python(ret)
+
+
+# KEYS[1]: key, ARGV[1]: 过期时间, ARGV[2:]: 命令参数
+# 仅在本次命令创建了key时设置过期时间
+_EXP_OF_NONE_TEMPLATE = """
+local unpack = unpack or table.unpack
+local created = redis.call("EXISTS", KEYS[1]) == 0
+local ret = redis.call("{command}", KEYS[1], unpack(ARGV, 2))
+if created then
+    redis.call("EXPIRE", KEYS[1], ARGV[1])
+end
+return ret
+"""
+
+EXP_OF_NONE_SCRIPTS: Dict[str, RedisScript] = {
+    command: RedisScript(_EXP_OF_NONE_TEMPLATE.format(command=command.upper()), convert=convert)
+    for command, convert in (
+        ("sadd", None),
+        ("hset", None),
+        ("hincrby", None),
+        ("hincrbyfloat", float),
+        ("incrby", None),
+    )
+}
+
+# KEYS[1]: 锁key, ARGV[1]: 持有者token, 仅持有者可释放
+RELEASE_LOCK_SCRIPT = RedisScript(
+    """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+else
+    return 0
+end
+"""
+)
+
+# KEYS[1]: 锁key, KEYS[2]: 栅栏计数key, ARGV[1]: token, ARGV[2]: 租期(毫秒)
+# 成功返回 {1, 栅栏令牌}, 失败返回 {0, 锁剩余毫秒}
+ACQUIRE_LOCK_SCRIPT = RedisScript(
+    """
+if redis.call("SET", KEYS[1], ARGV[1], "NX", "PX", ARGV[2]) then
+    return {1, redis.call("INCR", KEYS[2])}
+end
+return {0, redis.call("PTTL", KEYS[1])}
+"""
+)
+
+# KEYS[1]: 锁key, KEYS[2]: 通知队列key, ARGV[1]: token, ARGV[2]: 通知保留时长(毫秒)
+# 释放后向通知队列推送一条消息, 唤醒一个 BLPOP 等待者
+RELEASE_NOTIFY_LOCK_SCRIPT = RedisScript(
+    """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    redis.call("DEL", KEYS[1], KEYS[2])
+    redis.call("RPUSH", KEYS[2], 1)
+    redis.call("PEXPIRE", KEYS[2], ARGV[2])
+    return 1
+end
+return 0
+"""
+)
+
+# KEYS[1]: 锁key, ARGV[1]: token, ARGV[2]: 新租期(毫秒)
+EXTEND_LOCK_SCRIPT = RedisScript(
+    """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+)
+
+# 滑动窗口计数(前后两个固定窗口加权)
+# KEYS[1]: 当前窗口key, KEYS[2]: 上一窗口key
+# ARGV[1]: 上限, ARGV[2]: 窗口(毫秒), ARGV[3]: 当前窗口已过去(毫秒), ARGV[4]: 本次消耗
+# 返回 {是否通过, 剩余次数, 加权计数降到可通过所需等待(毫秒)}
+SLIDING_WINDOW_SCRIPT = RedisScript(
+    """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local current = tonumber(redis.call("GET", KEYS[1]) or "0")
+local previous = tonumber(redis.call("GET", KEYS[2]) or "0")
+local count = previous * (window - elapsed) / window + current
+if count + cost > limit then
+    local retry
+    if current + cost <= limit then
+        -- 本窗口内等上一窗口的权重衰减
+        retry = window - elapsed - (limit - cost - current) * window / previous
+    elseif current > 0 then
+        -- 进入下一窗口后等本窗口的权重衰减
+        retry = 2 * window - elapsed - math.max(0, limit - cost) * window / current
+    else
+        retry = 2 * window - elapsed
+    end
+    return {0, 0, math.max(1, math.ceil(retry))}
+end
+redis.call("INCRBY", KEYS[1], cost)
+redis.call("PEXPIRE", KEYS[1], window * 2)
+return {1, math.floor(limit - count - cost), 0}
+"""
+)
+
+# 令牌桶
+# KEYS[1]: 桶key
+# ARGV[1]: 容量, ARGV[2]: 每毫秒补充令牌数, ARGV[3]: 当前时间(毫秒), ARGV[4]: 本次消耗
+# 返回 {是否通过, 剩余令牌, 建议重试等待(毫秒)}
+TOKEN_BUCKET_SCRIPT = RedisScript(
+    """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed, retry = 0, 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry = math.ceil((cost - tokens) / rate)
+end
+redis.call("HMSET", KEYS[1], "tokens", tostring(tokens), "ts", now)
+redis.call("PEXPIRE", KEYS[1], math.ceil(capacity / rate))
+return {allowed, math.floor(tokens), retry}
+"""
+)
+
+ALL_SCRIPTS = [
+    *EXP_OF_NONE_SCRIPTS.values(),
+    RELEASE_LOCK_SCRIPT,
+    ACQUIRE_LOCK_SCRIPT,
+    RELEASE_NOTIFY_LOCK_SCRIPT,
+    EXTEND_LOCK_SCRIPT,
+    SLIDING_WINDOW_SCRIPT,
+    TOKEN_BUCKET_SCRIPT,
+]
@@ -0,0 +1,17 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS `outbox_event` (
+    `id` BIGINT NOT NULL PRIMARY KEY AUTO_INCREMENT COMMENT '主键',
+    `created_at` DATETIME(6) NOT NULL  COMMENT '创建时间' DEFAULT CURRENT_TIMESTAMP(6),
+    `updated_at` DATETIME(6) NOT NULL  COMMENT '更新时间' DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    `topic` VARCHAR(255) NOT NULL  COMMENT 'Kafka topic',
+    `key` VARCHAR(255)   COMMENT '消息 key',
+    `payload` JSON NOT NULL  COMMENT '消息内容',
+    `headers` JSON   COMMENT '消息头',
+    `status` SMALLINT NOT NULL  COMMENT '状态' DEFAULT 0,
+    `attempts` SMALLINT NOT NULL  COMMENT '投递次数' DEFAULT 0,
+    `last_error` VARCHAR(1024) NOT NULL  COMMENT '最近一次投递错误' DEFAULT '',
+    `sent_at` DATETIME(6)   COMMENT '投递时间',
+    KEY `idx_outbox_even_status_36c4b9` (`status`, `id`)
+) CHARACTER SET utf8mb4 COMMENT='事件发件箱';
+-- downgrade --
+DROP TABLE IF EXISTS `outbox_event`;
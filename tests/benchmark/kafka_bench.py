@@ -0,0 +1,148 @@
+"""
+Kafka 发送/消费基准, 默认使用进程内 MemoryBroker, 指定 --bootstrap 时连接本地 broker
+
+python -m tests.benchmark.kafka_bench --messages 50000 --partitions 6
+python -m tests.benchmark.kafka_bench --bootstrap localhost:9092 --compression lz4
+
+- send_many: MyKafka.send_many 整批发送, 延迟为每批耗时
+- send: 逐条 send(wait=False) 后 flush, 延迟为单条从调用到确认
+- send_wait: 逐条 send(wait=True), 每条等待确认
+- consume: ConsumerWorker 空处理函数消费预先写入的消息, 延迟为写入到处理的端到端耗时
+"""
+import time
+import uuid
+import asyncio
+import statistics
+from typing import List, Callable, Optional
+
+import typer
+
+from common import kafka_consumer
+from common.kafka import MyKafka, create_producer
+from core.settings import settings
+from common.kafka_memory import MemoryBroker
+from common.kafka_consumer import ConsumerWorker, kafka_handler
+
+
+def report(name: str, count: int, elapsed: float, latencies: List[float]):
+    """
+    :param latencies: 秒
+    """
+    line = f"{name:<10} {count:>8} msgs {elapsed:>8.3f}s {count / elapsed:>12,.0f} msgs/s"
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = (cuts[i - 1] * 1000 for i in (50, 95, 99))
+        line += f"   p50 {p50:.3f}ms  p95 {p95:.3f}ms  p99 {p99:.3f}ms  max {max(latencies) * 1000:.3f}ms"
+    typer.echo(line)
+
+
+def payload(n: int, size: int) -> dict:
+    return {"n": n, "ts": time.time(), "body": "x" * size}
+
+
+async def bench_send_many(client: MyKafka, topic: str, messages: int, size: int, batch: int):
+    latencies = []
+    start = time.perf_counter()
+    for offset in range(0, messages, batch):
+        begin = time.perf_counter()
+        chunk = [payload(n, size) for n in range(offset, min(offset + batch, messages))]
+        await client.send_many(chunk, topic, key=lambda m: str(m["n"] % 64))
+        latencies.append(time.perf_counter() - begin)
+    report("send_many", messages, time.perf_counter() - start, latencies)
+
+
+async def bench_send(client: MyKafka, topic: str, messages: int, size: int):
+    latencies = []
+
+    def observe(begin: float) -> Callable[[asyncio.Future], None]:
+        return lambda _: latencies.append(time.perf_counter() - begin)
+
+    start = time.perf_counter()
+    for n in range(messages):
+        fut = await client.send(payload(n, size), topic, key=str(n % 64))
+        fut.add_done_callback(observe(time.perf_counter()))
+    await client.flush()
+    while len(latencies) < messages:
+        await asyncio.sleep(0.001)
+    report("send", messages, time.perf_counter() - start, latencies)
+
+
+async def bench_send_wait(client: MyKafka, topic: str, messages: int, size: int):
+    latencies = []
+    start = time.perf_counter()
+    for n in range(messages):
+        begin = time.perf_counter()
+        await client.send(payload(n, size), topic, key=str(n % 64), wait=True)
+        latencies.append(time.perf_counter() - begin)
+    report("send_wait", messages, time.perf_counter() - start, latencies)
+
+
+async def bench_consume(
+    client: MyKafka, topic: str, messages: int, size: int, concurrency: int, factories: dict,
+):
+    latencies = []
+    done = asyncio.Event()
+
+    @kafka_handler(topic, retry_delays=[])
+    async def handle(record):
+        latencies.append(time.time() - record.value["ts"])
+        if len(latencies) >= messages:
+            done.set()
+
+    await client.send_many((payload(n, size) for n in range(messages)), topic, key=lambda m: str(m["n"] % 64))
+    worker = ConsumerWorker(f"bench-{uuid.uuid4().hex[:8]}", [topic], concurrency=concurrency, **factories)
+    start = time.perf_counter()
+    task = asyncio.ensure_future(worker.run())
+    await done.wait()
+    elapsed = time.perf_counter() - start
+    worker.stop()
+    await task
+    kafka_consumer.handlers.pop(topic, None)
+    # 消息预先写入, 端到端延迟包含排队时间
+    report("consume", messages, elapsed, latencies)
+
+
+async def run(
+    messages: int, size: int, batch: int, partitions: int, concurrency: int, bootstrap: Optional[str]
+):
+    if bootstrap:
+        settings.KAFKA_BOOTSTRAP_SERVERS = bootstrap
+        factories = dict(producer_factory=create_producer, consumer_factory=None)
+    else:
+        broker = MemoryBroker(partitions=partitions)
+        factories = dict(producer_factory=broker.create_producer, consumer_factory=broker.create_consumer)
+    settings.KAFKA_AUTO_OFFSET_RESET = "earliest"
+    typer.echo(
+        f"broker: {bootstrap or 'memory'}, partitions: {partitions}, size: {size}B, "
+        f"linger: {settings.KAFKA_LINGER_MS}ms, compression: {settings.KAFKA_COMPRESSION}"
+    )
+    client = MyKafka(**factories)
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    try:
+        await bench_send_many(client, f"{prefix}-send-many", messages, size, batch)
+        await bench_send(client, f"{prefix}-send", messages, size)
+        await bench_send_wait(client, f"{prefix}-send-wait", min(messages, 2000), size)
+        await bench_consume(client, f"{prefix}-consume", messages, size, concurrency, factories)
+    finally:
+        await client.close()
+
+
+def main(
+    messages: int = typer.Option(20000, help="每项消息数, send_wait 最多 2000"),
+    size: int = typer.Option(200, help="消息体字节数"),
+    batch: int = typer.Option(1000, help="send_many 每批条数"),
+    partitions: int = typer.Option(6, help="MemoryBroker 分区数, 连接 broker 时由 topic 配置决定"),
+    concurrency: int = typer.Option(None, help="消费并发, 默认 KAFKA_CONSUMER_CONCURRENCY"),
+    bootstrap: str = typer.Option(None, help="本地 broker 地址, 为空使用 MemoryBroker"),
+    compression: str = typer.Option(None, help="gzip / snappy / lz4 / zstd"),
+    linger_ms: int = typer.Option(None, help="默认 KAFKA_LINGER_MS"),
+):
+    if compression:
+        settings.KAFKA_COMPRESSION = compression
+    if linger_ms is not None:
+        settings.KAFKA_LINGER_MS = linger_ms
+    asyncio.run(run(messages, size, batch, partitions, concurrency, bootstrap))
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,80 @@
+import socket
+import shutil
+import subprocess
+
+import pytest
+
+from db.redis import RedisUtil, AsyncRedisUtil
+
+requires_redis = pytest.mark.skipif(shutil.which("redis-server") is None, reason="redis-server not installed")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_redis(count: int):
+    """
+    启动 count 个无持久化的 redis-server, 返回 (进程列表, host:port 列表)
+    """
+    ports = [_free_port() for _ in range(count)]
+    processes = [
+        subprocess.Popen(
+            ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"], stdout=subprocess.DEVNULL
+        )
+        for port in ports
+    ]
+    for port in ports:
+        for _ in range(50):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                subprocess.run(["sleep", "0.1"])
+    return processes, [f"127.0.0.1:{port}" for port in ports]
+
+
+def stop_redis(processes):
+    for process in processes:
+        process.terminate()
+        process.wait()
+
+
+@pytest.fixture(scope="module")
+def redis_nodes():
+    processes, nodes = start_redis(3)
+    yield nodes
+    stop_redis(processes)
+
+
+@pytest.fixture(scope="module")
+def redis_node():
+    processes, nodes = start_redis(1)
+    yield nodes[0]
+    stop_redis(processes)
+
+
+@pytest.fixture
+async def async_redis(redis_node):
+    """
+    单节点 AsyncRedisUtil, 结束时清空并关闭
+    """
+    host, port = redis_node.split(":")
+    await AsyncRedisUtil.init(host=host, port=int(port), password=None, health_check_interval=0)
+    yield AsyncRedisUtil
+    await AsyncRedisUtil._pool.flushdb()
+    await AsyncRedisUtil.close()
+
+
+@pytest.fixture
+def redis_util(redis_node):
+    """
+    单节点 RedisUtil, 结束时清空
+    """
+    host, port = redis_node.split(":")
+    RedisUtil.init(host=host, port=int(port), password=None, nodes=None)
+    yield RedisUtil
+    RedisUtil.r.flushdb()
+    RedisUtil.r = None
@@ -0,0 +1,57 @@
+import functools
+
+import pytest
+
+from db.redis import RedisUtil
+from db.hbase.cache import RowCache
+from tests.functional.conftest import requires_redis
+
+pytestmark = requires_redis
+
+
+@pytest.fixture
+def sync_redis(redis_node, monkeypatch):
+    """
+    RedisUtil 未初始化, 由 RowCache 首次使用时按 redis_node 初始化
+    """
+    host, port = redis_node.split(":")
+    monkeypatch.setattr(RedisUtil, "r", None)
+    monkeypatch.setattr(
+        RedisUtil, "init", functools.partial(RedisUtil.init, host=host, port=int(port), password=None, nodes=None)
+    )
+    yield RedisUtil
+    if RedisUtil.r is not None:
+        RedisUtil.r.flushdb()
+
+
+def make_cache(name: str) -> RowCache:
+    cache = RowCache(maxsize=100, ttl=60, redis=True)
+    cache.table_name = name
+    return cache
+
+
+def test_redis_tier_shared_between_processes(sync_redis):
+    writer = make_cache("fault_record")
+    writer.set_many({b"r1": {b"f:speed": b"1"}, b"r2": {}}, "*")
+    assert sync_redis.r is not None
+
+    # 另一进程的空 LRU 从 Redis 读到, 不存在的行同样命中
+    reader = make_cache("fault_record")
+    assert reader.get_many([b"r1", b"r2", b"r3"], "*") == {b"r1": {b"f:speed": b"1"}, b"r2": {}}
+    assert (reader.hits, reader.redis_hits, reader.misses) == (0, 2, 1)
+    assert sync_redis.r.ttl(reader._redis_key(b"r1")) > 0
+
+    writer.invalidate(b"r1")
+    assert not sync_redis.r.exists(writer._redis_key(b"r1"))
+    assert make_cache("fault_record").get_many([b"r1", b"r2"], "*") == {b"r2": {}}
+
+
+def test_redis_unavailable_falls_back_to_local(sync_redis, monkeypatch):
+    closed = functools.partial(RedisUtil.init, host="127.0.0.1", port=1, password=None, nodes=None)
+    monkeypatch.setattr(RedisUtil, "init", lambda: closed(socket_connect_timeout=0.1))
+    cache = make_cache("fault_record")
+    cache.set_many({b"r1": {b"f:speed": b"1"}}, "*")
+    assert cache.get_many([b"r1", b"r2"], "*") == {b"r1": {b"f:speed": b"1"}}
+    cache.invalidate(b"r1")
+    assert cache.get_many([b"r1"], "*") == {}
+    monkeypatch.setattr(RedisUtil, "r", None)
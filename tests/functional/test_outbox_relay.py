@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from tortoise import Tortoise
+
+from common import outbox
+from common.utils import make_redis_lock
+from db.redis import get_async_redis
+from db.mysql.models import OutboxEvent
+from tests.unit.test_outbox import RecordingProducer
+from tests.functional.conftest import requires_redis
+
+pytestmark = requires_redis
+
+
+@pytest.fixture
+async def db():
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["db.mysql.models"]})
+    await Tortoise.generate_schemas()
+    yield
+    await Tortoise.close_connections()
+
+
+async def wait_for(predicate, timeout=5):
+    for _ in range(int(timeout / 0.02)):
+        if await predicate():
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("condition not met")
+
+
+@pytest.mark.asyncio
+async def test_single_leader_relays(async_redis, db, monkeypatch):
+    producer = RecordingProducer()
+
+    async def get_producer():
+        return producer
+
+    monkeypatch.setattr(outbox.kafka, "get_producer", get_producer)
+    # 每个用例的 redis-server 不同, 不复用模块级锁缓存的连接池
+    monkeypatch.setattr(outbox, "redis_lock", make_redis_lock(get_async_redis))
+    relays = [outbox.OutboxRelay(batch_size=5, interval=0.02) for _ in range(2)]
+    for relay in relays:
+        await relay.start()
+
+    async def all_sent():
+        return not await OutboxEvent.filter(status=outbox.OutboxStatus.pending).exists()
+
+    try:
+        await OutboxEvent.bulk_create([OutboxEvent(topic="t", key=str(i % 3), payload={"n": i}) for i in range(20)])
+        await wait_for(all_sent)
+        assert sorted(value["n"] for _, value, _, _ in producer.sent) == list(range(20))
+        leader, follower = sorted(relays, key=lambda r: r.relayed, reverse=True)
+        assert (leader.relayed, follower.relayed) == (20, 0)
+
+        # 主 relay 退出后释放锁, 另一个接替
+        await leader.stop()
+        await OutboxEvent.create(topic="t", key="0", payload={"n": 20})
+        await wait_for(all_sent)
+        assert follower.relayed == 1 and len(producer.sent) == 21
+    finally:
+        for relay in relays:
+            await relay.stop()
+
+
+class SlowProducer(RecordingProducer):
+    """
+    确认耗时超过锁租期的生产者
+    """
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    async def send(self, topic, value, key=None, headers=None):
+        fut = await super().send(topic, value, key=key, headers=headers)
+
+        async def ack():
+            await asyncio.sleep(self.delay)
+            return fut.result()
+
+        return asyncio.ensure_future(ack())
+
+
+@pytest.mark.asyncio
+async def test_lease_outlives_slow_batch(async_redis, db, monkeypatch):
+    producer = SlowProducer(delay=0.5)
+
+    async def get_producer():
+        return producer
+
+    monkeypatch.setattr(outbox.kafka, "get_producer", get_producer)
+    monkeypatch.setattr(outbox, "redis_lock", make_redis_lock(get_async_redis))
+    monkeypatch.setattr(outbox.OutboxRelay, "lock_timeout", 0.2)
+    relays = [outbox.OutboxRelay(batch_size=5, interval=0.02) for _ in range(2)]
+    for relay in relays:
+        await relay.start()
+
+    async def all_sent():
+        return not await OutboxEvent.filter(status=outbox.OutboxStatus.pending).exists()
+
+    try:
+        await OutboxEvent.bulk_create([OutboxEvent(topic="t", key=str(i), payload={"n": i}) for i in range(10)])
+        await wait_for(all_sent)
+        # 等待确认期间租期自动续期, 另一个 relay 不会接替重发
+        assert sorted(value["n"] for _, value, _, _ in producer.sent) == list(range(10))
+        assert sorted(relay.relayed for relay in relays) == [0, 10]
+    finally:
+        for relay in relays:
+            await relay.stop()
@@ -0,0 +1,61 @@
+import pytest
+
+from apps.dependencies import RateLimiter
+from core.exceptions import TooManyRequestsException
+from db.redis.scripts import TOKEN_BUCKET_SCRIPT, SLIDING_WINDOW_SCRIPT
+from tests.functional.conftest import requires_redis
+
+pytestmark = requires_redis
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_retry_after(async_redis):
+    pool = await async_redis.get_pool()
+    keys = ["sw:1", "sw:0"]
+
+    # 上一窗口已满, 等其权重衰减到 limit - 1 即可, 而不是等到本窗口结束
+    await pool.set("sw:0", 10)
+    assert await SLIDING_WINDOW_SCRIPT.execute(pool, keys, [10, 1000, 0, 1]) == [0, 0, 100]
+    assert await SLIDING_WINDOW_SCRIPT.execute(pool, keys, [10, 1000, 99, 1]) == [0, 0, 1]
+    assert (await SLIDING_WINDOW_SCRIPT.execute(pool, keys, [10, 1000, 100, 1]))[0] == 1
+
+    # 本窗口已满, 进入下一窗口后等本窗口权重衰减
+    await pool.delete("sw:0")
+    await pool.set("sw:1", 10)
+    assert await SLIDING_WINDOW_SCRIPT.execute(pool, keys, [10, 1000, 200, 1]) == [0, 0, 900]
+    assert (await SLIDING_WINDOW_SCRIPT.execute(pool, ["sw:2", "sw:1"], [10, 1000, 100, 1]))[0] == 1
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_retry_after(async_redis):
+    pool = await async_redis.get_pool()
+    args = [2, 2 / 1000]
+    assert await TOKEN_BUCKET_SCRIPT.execute(pool, ["tb"], [*args, 0, 1]) == [1, 1, 0]
+    assert await TOKEN_BUCKET_SCRIPT.execute(pool, ["tb"], [*args, 0, 1]) == [1, 0, 0]
+    assert await TOKEN_BUCKET_SCRIPT.execute(pool, ["tb"], [*args, 0, 1]) == [0, 0, 500]
+    assert await TOKEN_BUCKET_SCRIPT.execute(pool, ["tb"], [*args, 500, 1]) == [1, 0, 0]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", [RateLimiter.SLIDING_WINDOW, RateLimiter.TOKEN_BUCKET])
+async def test_rejected_client_blocked_locally(async_redis, monkeypatch, algorithm):
+    limiter = RateLimiter(2, 60, algorithm=algorithm, key_func=lambda request: "ip:1", scope="test")
+    calls = []
+    evaluate = limiter._evaluate
+
+    async def counting_evaluate(*args):
+        calls.append(args)
+        return await evaluate(*args)
+
+    monkeypatch.setattr(limiter, "_evaluate", counting_evaluate)
+    await limiter(None)
+    await limiter(None)
+    with pytest.raises(TooManyRequestsException):
+        await limiter(None)
+    # 解封前不再访问 Redis
+    with pytest.raises(TooManyRequestsException):
+        await limiter(None)
+    assert len(calls) == 3
+    # 其他对象不受影响
+    limiter.key_func = lambda request: "ip:2"
+    await limiter(None)
@@ -0,0 +1,35 @@
+import orjson
+import pytest
+
+from db.redis.cache import TwoTierCache, invalidation_listener
+from tests.functional.conftest import requires_redis
+
+pytestmark = requires_redis
+
+
+@pytest.fixture
+def cache():
+    cache = TwoTierCache("test_two_tier")
+    yield cache
+    TwoTierCache._instances.pop(cache.name)
+
+
+@pytest.mark.asyncio
+async def test_set_reads_back_like_peers(async_redis, cache):
+    await cache.set("k", "v1")
+    # 与其他 worker 从 Redis 读到的类型一致
+    assert await cache.get("k") == await async_redis.get("k") == b"v1"
+    assert cache.l1.get("k") == b"v1"
+
+
+@pytest.mark.asyncio
+async def test_peer_invalidation_normalizes_keys(async_redis, cache):
+    await async_redis.set("k", "v1")
+    assert await cache.get(b"k") == b"v1" and len(cache.l1) == 1
+    message = {"origin": "peer", "name": cache.name, "keys": ["k"]}
+    invalidation_listener.dispatch(orjson.dumps(message))
+    assert len(cache.l1) == 0 and cache.invalidations == 1
+
+    await cache.get("k")
+    await cache.invalidate(b"k")
+    assert len(cache.l1) == 0
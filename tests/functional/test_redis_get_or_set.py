@@ -0,0 +1,119 @@
+import time
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from db.redis.keys import RedisCacheKey
+from db.redis.codecs import RAW
+from tests.functional.conftest import requires_redis
+
+pytestmark = requires_redis
+
+
+def async_loader(value, delay=0.05):
+    calls = []
+
+    async def load():
+        calls.append(time.monotonic())
+        await asyncio.sleep(delay)
+        return value, 60
+
+    return load, calls
+
+
+def sync_loader(value, delay=0.05):
+    calls = []
+
+    def load():
+        calls.append(time.monotonic())
+        time.sleep(delay)
+        return value, 60
+
+    return load, calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_miss_loads_once(async_redis):
+    load, calls = async_loader(b"v")
+    results = await asyncio.gather(*[async_redis.get_or_set("k", value_fun=load) for _ in range(20)])
+    assert results == [b"v"] * 20 and len(calls) == 1
+    assert await async_redis.get_or_set("k", value_fun=load) == b"v" and len(calls) == 1
+    assert 0 < await async_redis._pool.ttl("k") <= 60
+
+
+@pytest.mark.asyncio
+async def test_lock_timeout_across_processes(async_redis):
+    # 进程内合并之外, 不同进程由回源锁保证只有一个回源, 其余轮询缓存
+    load, calls = async_loader(b"v", delay=0.1)
+    results = await asyncio.gather(*[async_redis._refresh("k", load, 1000, 0, RAW, None) for _ in range(3)])
+    assert results == [b"v"] * 3 and len(calls) == 1
+    assert not await async_redis._pool.exists(RedisCacheKey.get_or_set_lock.format("k"))
+
+
+@pytest.mark.asyncio
+async def test_early_refresh_single_flight(async_redis, monkeypatch):
+    await async_redis._pool.set("k", b"old", expire=10)
+    load, calls = async_loader(b"new")
+    assert await async_redis.get_or_set("k", value_fun=load, beta=1) == b"old" and not calls
+
+    # 上次回源耗时远大于剩余过期时间, 必定提前刷新
+    await async_redis._pool.set(RedisCacheKey.get_or_set_delta.format("k"), 100000)
+    monkeypatch.setattr(random, "random", lambda: 0.5)
+    results = await asyncio.gather(*[async_redis.get_or_set("k", value_fun=load, beta=1) for _ in range(5)])
+    # 刷新期间其他请求直接返回旧值, 不等待也不重复回源
+    assert sorted(results) == [b"new"] + [b"old"] * 4 and len(calls) == 1
+    assert await async_redis._pool.get("k") == b"new"
+    assert 0 < int(await async_redis._pool.get(RedisCacheKey.get_or_set_delta.format("k"))) < 1000
+    assert await async_redis.get_or_set("k", value_fun=load) == b"new" and len(calls) == 1
+
+
+def test_sync_concurrent_miss_loads_once(redis_util):
+    load, calls = sync_loader(b"v")
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda _: redis_util.get_or_set("k", value_fun=load), range(8)))
+    assert results == [b"v"] * 8 and len(calls) == 1
+
+    load, calls = sync_loader(b"w", delay=0.1)
+    with ThreadPoolExecutor(3) as executor:
+        results = list(executor.map(lambda _: redis_util._refresh("l", load, 1000, 0, RAW, None), range(3)))
+    assert results == [b"w"] * 3 and len(calls) == 1
+
+
+def test_sync_early_refresh(redis_util, monkeypatch):
+    redis_util.r.set("k", b"old", ex=10)
+    redis_util.r.set(RedisCacheKey.get_or_set_delta.format("k"), 100000)
+    monkeypatch.setattr(random, "random", lambda: 0.5)
+    load, calls = sync_loader(b"new")
+    assert redis_util.get_or_set("k", value_fun=load, beta=1) == b"new" and len(calls) == 1
+    assert redis_util.get_or_set("k", value_fun=load) == b"new" and len(calls) == 1
+
+
+def test_sync_nested_get_or_set(redis_util):
+    # 回源中读取其他缓存, 不同 key 不会互相阻塞
+    def load_config():
+        return redis_util.get_or_set("k115", value_fun=lambda: (b"inner", 60)) + b"+outer", 60
+
+    with ThreadPoolExecutor(1) as executor:
+        future = executor.submit(redis_util.get_or_set, "config", value_fun=load_config)
+        assert future.result(timeout=3) == b"inner+outer"
+
+
+def test_sync_loader_error_shared(redis_util):
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.05)
+        raise RuntimeError("db down")
+
+    def call(_):
+        try:
+            return redis_util.get_or_set("k", value_fun=load)
+        except RuntimeError as e:
+            return str(e)
+
+    with ThreadPoolExecutor(4) as executor:
+        assert list(executor.map(call, range(4))) == ["db down"] * 4
+    assert len(calls) == 1 and not redis_util._flights
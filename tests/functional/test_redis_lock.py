@@ -0,0 +1,68 @@
+import time
+import asyncio
+
+import pytest
+
+from common.utils import LockAcquireTimeout, make_redis_lock
+from db.redis import get_async_redis
+from tests.functional.conftest import requires_redis
+
+pytestmark = requires_redis
+
+
+@pytest.fixture
+def redis_lock(async_redis):
+    # 模块级 redis_lock 会缓存首次获取的连接池, 每个用例单独创建
+    return make_redis_lock(get_async_redis)
+
+
+@pytest.mark.asyncio
+async def test_release_wakes_waiter(redis_lock):
+    released_at = None
+
+    async def holder():
+        nonlocal released_at
+        async with redis_lock.lock("l", timeout=10) as handle:
+            await asyncio.sleep(1.2)
+            released_at = time.monotonic()
+        return handle
+
+    async def waiter():
+        await asyncio.sleep(0.05)
+        async with redis_lock.lock("l", timeout=10) as handle:
+            return handle, time.monotonic()
+
+    first, (second, acquired_at) = await asyncio.gather(holder(), waiter())
+    # 锁还有约 9 秒才过期, 等待者由释放通知唤醒
+    assert 0 <= acquired_at - released_at < 0.5
+    assert second.fence == first.fence + 1
+
+
+@pytest.mark.asyncio
+async def test_expired_holder_is_fenced(redis_lock, async_redis):
+    # 持有者崩溃未释放
+    crashed = redis_lock.lock("l", timeout=0.3)
+    stale = await crashed.__aenter__()
+    with pytest.raises(LockAcquireTimeout):
+        async with redis_lock.lock("l", blocking_timeout=0.1):
+            pass
+
+    start = time.monotonic()
+    async with redis_lock.lock("l", timeout=10, blocking_timeout=2) as handle:
+        assert 0.1 < time.monotonic() - start < 1
+        assert handle.fence > stale.fence
+        # 过期持有者无法续期, 退出也不会释放新持有者的锁
+        assert not await stale.extend()
+        await crashed.__aexit__(None, None, None)
+        assert await async_redis._pool.get("l") == handle.token
+    assert not await async_redis._pool.exists("l")
+
+
+@pytest.mark.asyncio
+async def test_auto_extend(redis_lock):
+    async with redis_lock.lock("l", timeout=0.3, auto_extend=True) as handle:
+        await asyncio.sleep(0.8)
+        with pytest.raises(LockAcquireTimeout):
+            async with redis_lock.lock("l", blocking_timeout=0.2):
+                pass
+        assert await handle.extend()
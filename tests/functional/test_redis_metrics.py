@@ -0,0 +1,34 @@
+import pytest
+
+from tests.functional.conftest import requires_redis
+
+pytestmark = requires_redis
+
+
+@pytest.mark.asyncio
+async def test_metrics_cover_all_paths(async_redis):
+    before = async_redis.metrics()
+    waits = before["acquire_wait"]["count"]
+    assert "GET" not in before["commands"]
+
+    await async_redis.set("a", 1)
+    assert await async_redis.get("a") == b"1"
+    async with async_redis.pipeline() as pipe:
+        pipe.get("a")
+        pipe.get("b")
+        pipe.incrby("c", 1)
+    tr = async_redis._pool.multi_exec()
+    tr.get("a")
+    tr.incrby("c", 1)
+    assert await tr.execute() == [b"1", 2]
+    with pytest.raises(Exception):
+        await async_redis._pool.lpush("a", 1)
+
+    stats = async_redis.metrics()
+    commands = stats["commands"]
+    # 单条命令走快速路径, pipeline / multi_exec 通过 acquire 独占连接, 都计入等待
+    assert stats["acquire_wait"]["count"] - waits == 5
+    assert commands["GET"]["count"] == 4
+    assert commands["INCRBY"]["count"] == 2
+    assert commands["MULTI"]["count"] == commands["EXEC"]["count"] == 1
+    assert stats["errors"] == {"LPUSH": 1}
@@ -0,0 +1,69 @@
+import pytest
+
+from db.redis.codecs import Codec
+from tests.functional.conftest import requires_redis
+
+pytestmark = requires_redis
+
+
+@pytest.fixture
+def pipelines(async_redis, monkeypatch):
+    """
+    记录底层 pipeline 的发送次数与每次的命令数
+    """
+    pool = async_redis._pool
+    create = pool.pipeline
+    executed = []
+
+    def pipeline():
+        pipe = create()
+        execute = pipe.execute
+
+        async def counting_execute(*args, **kwargs):
+            executed.append(len(pipe._pipeline))
+            return await execute(*args, **kwargs)
+
+        pipe.execute = counting_execute
+        return pipe
+
+    monkeypatch.setattr(pool, "pipeline", pipeline)
+    return executed
+
+
+@pytest.mark.asyncio
+async def test_pipeline_sends_once(async_redis, pipelines):
+    await async_redis.set("counter", 5)
+    async with async_redis.pipeline() as pipe:
+        pipe.set("a", "1", exp=100)
+        pipe.get("a")
+        pipe.get("missing", default="d")
+        pipe.incrby("counter", 2)
+        pipe.hincrby("h", "f", 3, exp_of_none=60)
+        pipe.hget("h", "f")
+        pipe.hget("h", "missing", default=0)
+        pipe.delete("a")
+        assert len(pipe) == 8
+    assert pipe.results == [True, b"1", "d", 7, 3, b"3", 0, 1]
+    # 用到的脚本在同一批次中先加载
+    assert pipelines == [9]
+    assert 0 < await async_redis._pool.ttl("h") <= 60
+    assert not await async_redis._pool.exists("a")
+
+
+@pytest.mark.asyncio
+async def test_batch_helpers(async_redis, pipelines):
+    await async_redis.set_many({"k1": "v1", "k2": {"n": 2}}, codec=Codec("orjson"))
+    assert await async_redis._pool.ttl("k1") == -1
+    assert await async_redis.mget_many(["k1", "k2", "k3"], default="d", codec="orjson") == ["v1", {"n": 2}, "d"]
+    assert pipelines == []
+
+    await async_redis.set_many({f"e{i}": i for i in range(50)}, exp=30)
+    assert pipelines == [50]
+    assert await async_redis.mget_many([f"e{i}" for i in range(50)]) == [str(i).encode() for i in range(50)]
+    assert 0 < await async_redis._pool.ttl("e49") <= 30
+    assert await async_redis.mget_many([]) == []
+
+    await async_redis._pool.hset("h1", "a", 1)
+    await async_redis._pool.hset("h2", "b", 2)
+    assert await async_redis.hget_many([("h1", "a"), ("h2", "b"), ("h1", "x")], default=None) == [b"1", b"2", None]
+    assert pipelines == [50, 3]
@@ -0,0 +1,83 @@
+import pytest
+
+from db.redis import AsyncRedisUtil
+from db.redis.scripts import EXP_OF_NONE_SCRIPTS, RedisScript
+from tests.functional.conftest import requires_redis
+
+pytestmark = requires_redis
+
+COUNT_SCRIPT = RedisScript('return redis.call("INCRBY", KEYS[1], ARGV[1])')
+
+
+@pytest.mark.asyncio
+async def test_noscript_reloads(async_redis):
+    pool = async_redis._pool
+    assert await COUNT_SCRIPT.execute(pool, ["n"], [2]) == 2
+    assert await pool.script_exists(COUNT_SCRIPT.sha) == [1]
+
+    await pool.script_flush()
+    assert await async_redis.hincrby("h", "f", 1, exp_of_none=60) == 1
+    assert await COUNT_SCRIPT.execute(pool, ["n"], [3]) == 5
+    # EVAL 后脚本重新进入缓存, 后续直接 EVALSHA
+    assert await pool.script_exists(COUNT_SCRIPT.sha, EXP_OF_NONE_SCRIPTS["hincrby"].sha) == [1, 1]
+
+    await pool.script_flush()
+    async with async_redis.pipeline() as pipe:
+        pipe.incrby("c", 1, exp_of_none=60)
+        pipe.get("c")
+    assert pipe.results == [1, b"1"]
+    assert 0 < await pool.ttl("c") <= 60
+
+
+def test_noscript_reloads_sync(redis_util):
+    redis_util.r.script_flush()
+    assert COUNT_SCRIPT.execute_sync(redis_util.r, ["n"], [2]) == 2
+    assert redis_util.r.script_exists(COUNT_SCRIPT.sha) == [True]
+    redis_util.r.script_flush()
+    assert redis_util.hincrbyfloat("h", "f", 1.5, exp_of_none=60) == 1.5
+
+
+@pytest.mark.asyncio
+async def test_exp_of_none_only_on_create(async_redis):
+    pool = async_redis._pool
+    assert await async_redis.sadd("s", "a", exp_of_none=100) == 1
+    assert await async_redis.hset("hs", "f", "v", exp_of_none=100) == 1
+    assert await async_redis.hincrbyfloat("hf", "f", 0.5, exp_of_none=100) == 0.5
+    assert await async_redis.incrby("i", 2, exp_of_none=100) == 2
+    for key in ("s", "hs", "hf", "i"):
+        assert 90 < await pool.ttl(key) <= 100
+
+    # key 已存在时不重置过期时间
+    await pool.expire("i", 10)
+    assert await async_redis.incrby("i", 2, exp_of_none=100) == 4
+    assert await pool.ttl("i") <= 10
+    # 未设置过期时间的已有 key 保持永久
+    await pool.set("p", 1)
+    assert await async_redis.incrby("p", 1, exp_of_none=100) == 2
+    assert await pool.ttl("p") == -1
+
+
+def test_exp_of_none_sync(redis_util):
+    assert redis_util.hincrby("h", "f", 2, exp_of_none=100) == 2
+    redis_util.r.expire("h", 10)
+    assert redis_util.hincrby("h", "f", 2, exp_of_none=100) == 4
+    assert redis_util.r.ttl("h") <= 10
+    assert redis_util.incrby("i", 1, exp_of_none=100) == 1
+    assert 90 < redis_util.r.ttl("i") <= 100
+
+
+@pytest.mark.asyncio
+async def test_noscript_sharded_pipeline(redis_nodes):
+    await AsyncRedisUtil.init(nodes=redis_nodes, health_check_interval=0)
+    try:
+        await AsyncRedisUtil._pool.script_flush()
+        async with AsyncRedisUtil.pipeline() as pipe:
+            for i in range(20):
+                pipe.incrby(f"key{i}", 1, exp_of_none=60)
+                pipe.get(f"key{i}")
+        assert pipe.results == [1, b"1"] * 20
+        sha = EXP_OF_NONE_SCRIPTS["incrby"].sha
+        assert [await node.script_exists(sha) for node in AsyncRedisUtil._pool.nodes] == [[1]] * 3
+    finally:
+        await AsyncRedisUtil._pool.flushdb()
+        await AsyncRedisUtil.close()
@@ -0,0 +1,70 @@
+import hashlib
+
+import pytest
+
+from db.redis import RedisUtil, AsyncRedisUtil
+from db.redis.cluster import HashRing, CrossShardError, hash_tag, same_shard_key
+from tests.functional.conftest import requires_redis
+
+pytestmark = requires_redis
+
+
+def test_hash_tag():
+    assert hash_tag("{user:1}:profile") == b"user:1"
+    assert hash_tag("{}:profile") == b"{}:profile"
+    assert hash_tag(same_shard_key("lock", ":fence")) == b"lock"
+    assert same_shard_key("{a}b", ":c") == "{a}b:c"
+
+
+def test_hash_ring_distribution():
+    ring = HashRing(["a", "b", "c"])
+    counts = [0, 0, 0]
+    for i in range(3000):
+        counts[ring.node_index(f"key{i}")] += 1
+    assert min(counts) > 700
+    with pytest.raises(CrossShardError):
+        ring.single_node([f"key{i}" for i in range(10)])
+
+
+@pytest.mark.asyncio
+async def test_async_sharded(redis_nodes):
+    await AsyncRedisUtil.init(nodes=redis_nodes, health_check_interval=0)
+    try:
+        mapping = {f"key{i}": i for i in range(30)}
+        await AsyncRedisUtil.set_many(mapping, exp=60)
+        assert await AsyncRedisUtil.mget_many(list(mapping)) == [str(i).encode() for i in range(30)]
+        assert await AsyncRedisUtil.incrby("counter", 2, exp_of_none=60) == 2
+        async with AsyncRedisUtil.pipeline() as pipe:
+            for key in mapping:
+                pipe.get(key)
+        assert pipe.results == [str(i).encode() for i in range(30)]
+        sizes = [await node.dbsize() for node in AsyncRedisUtil._pool.nodes]
+        assert all(sizes) and sum(sizes) == 31
+        assert set(AsyncRedisUtil.metrics()) == set(redis_nodes)
+    finally:
+        await AsyncRedisUtil._pool.flushdb()
+        await AsyncRedisUtil.close()
+
+
+def test_sync_sharded(redis_nodes):
+    RedisUtil.init(nodes=redis_nodes)
+    RedisUtil.set("a", 1)
+    assert RedisUtil.get("a") == b"1"
+    assert RedisUtil.hincrby("h", "f", exp_of_none=60) == 1
+    assert RedisUtil.get_or_set("b", value_fun=lambda: (b"2", 60), lock_timeout=100, beta=1) == b"2"
+    assert RedisUtil.r.delete("a", "b", "h") == 3
+
+
+def test_sync_sharded_pipeline_loads_scripts(redis_nodes):
+    RedisUtil.init(nodes=redis_nodes)
+    script = "return redis.call('get', KEYS[1])"
+    sha = hashlib.sha1(script.encode()).hexdigest()
+    keys = [f"key{i}" for i in range(10)]
+    with RedisUtil.r.pipeline() as pipe:
+        pipe.script_load(script)
+        for key in keys:
+            pipe.set(key, key).evalsha(sha, 1, key)
+        results = pipe.execute()
+    # 脚本先于 evalsha 加载到每个涉及的节点
+    assert results[0] == sha and results[1::2] == [True] * 10 and results[2::2] == [key.encode() for key in keys]
+    assert RedisUtil.r.delete(*keys) == 10
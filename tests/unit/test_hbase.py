@@ -0,0 +1,413 @@
+import time
+import asyncio
+import datetime
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future, Executor
+
+import pytest
+from happybase import Connection
+
+from db.hbase import (
+    RowKey,
+    BaseModel,
+    IntColumn,
+    EnumColumn,
+    JSONColumn,
+    FloatColumn,
+    DateTimeColumn,
+    ReversedTimestamp,
+)
+from common.types import IntEnumMore
+from db.hbase.cache import RowCache
+from db.hbase.pool import HBaseConnectionPool
+from thriftpy2.transport import TTransportException
+from core.settings import settings
+from db.hbase.models import FaultRecordData
+
+
+class FakeTable:
+    def __init__(self, data: dict):
+        self.data = data
+        self.closed_scanners = 0
+        self.sends = 0
+        self.fetched = []
+        self.fail_at = None
+        self.projections = []
+        # 每次扫描的模拟延迟(秒)
+        self.scan_delay = 0
+
+    def rows(self, rows, columns=None, **kwargs):
+        self.fetched.extend(rows)
+        self.projections.append(columns)
+        return [(row, self._project(self.data[row], columns)) for row in rows if row in self.data]
+
+    @staticmethod
+    def _project(data, columns):
+        return {k: v for k, v in data.items() if columns is None or k in columns}
+
+    def batch(self, **kwargs):
+        return FakeBatch(self, **kwargs)
+
+    def scan(self, row_start=None, row_stop=None, columns=None, limit=None, reverse=False, **kwargs):
+        time.sleep(self.scan_delay)
+        keys = sorted(self.data, reverse=reverse)
+        n = 0
+        try:
+            for key in keys:
+                if self.fail_at is not None and key == self.fail_at:
+                    self.fail_at = None
+                    raise TTransportException(message="connection reset")
+                if row_start is not None and (key > row_start if reverse else key < row_start):
+                    continue
+                if row_stop is not None and (key <= row_stop if reverse else key >= row_stop):
+                    break
+                yield key, self._project(self.data[key], columns)
+                n += 1
+                if limit is not None and n >= limit:
+                    return
+        finally:
+            self.closed_scanners += 1
+
+
+class FakeBatch:
+    def __init__(self, table, timestamp=None, wal=True):
+        self.table = table
+        self.mutations = {}
+
+    def put(self, row, data, wal=None):
+        self.mutations.setdefault(row.encode(), {}).update(data)
+
+    def send(self):
+        self.table.data.update(self.mutations)
+        self.table.sends += 1
+        self.mutations = {}
+
+
+class FakePool:
+    def __init__(self, table: FakeTable):
+        self._table = table
+        self.in_use = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        with self._lock:
+            self.in_use += 1
+            self.peak = max(self.peak, self.in_use)
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self.in_use -= 1
+
+    connection = checkout
+
+    def table(self, name):
+        return self._table
+
+
+@pytest.fixture
+def fake_table(monkeypatch):
+    keys = [b"a1", b"a2", b"a3", b"b1", b"b2", b"c1"]
+    table = FakeTable({key: {b"A:a01": key + b"-vin"} for key in keys})
+    monkeypatch.setattr(FaultRecordData, "_pool", FakePool(table))
+    return table
+
+
+def test_iter_scan_prefix(fake_table):
+    assert [r.row_key for r in FaultRecordData.iter_scan(row_prefix="a")] == [b"a1", b"a2", b"a3"]
+    assert [r.row_key for r in FaultRecordData.iter_scan(row_prefix="b", reverse=True)] == [b"b2", b"b1"]
+    assert [r.vin for r in FaultRecordData.scan(row_prefix="c")] == ["c1-vin"]
+
+
+def test_iter_scan_chunks_and_release(fake_table):
+    chunks = list(FaultRecordData.iter_scan(chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 2]
+    rows = FaultRecordData.iter_scan()
+    next(rows)
+    assert FaultRecordData._pool.in_use == 1
+    rows.close()
+    assert FaultRecordData._pool.in_use == 0
+    assert fake_table.closed_scanners == 2
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_scan_page_cursor(fake_table, reverse):
+    keys, cursor = [], None
+    while True:
+        page, cursor = FaultRecordData.scan_page(page_size=4, cursor=cursor, reverse=reverse)
+        keys.extend(r.row_key for r in page)
+        if cursor is None:
+            break
+    assert keys == sorted(fake_table.data, reverse=reverse)
+
+
+@pytest.mark.asyncio
+async def test_async_scan(fake_table):
+    rows = await FaultRecordData.async_scan(row_prefix="a")
+    assert [r.row_key for r in rows] == [b"a1", b"a2", b"a3"]
+    chunks = [chunk async for chunk in FaultRecordData.async_iter_scan(chunk_size=4)]
+    assert [len(chunk) for chunk in chunks] == [4, 2]
+
+    async for _ in FaultRecordData.async_iter_scan(chunk_size=1):
+        break
+    await asyncio.sleep(0.1)
+    assert FaultRecordData._pool.in_use == 0
+
+
+class ThreadPerCall(Executor):
+    """
+    每次调用都在新线程中执行
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run).start()
+        return future
+
+
+@pytest.mark.asyncio
+async def test_async_iter_scan_across_threads(fake_table, monkeypatch):
+    # 每批在不同线程中拉取, 连接不能与线程绑定
+    monkeypatch.setattr(Connection, "open", lambda self: None)
+    monkeypatch.setattr(Connection, "table", lambda self, name, use_prefix=True: fake_table)
+    monkeypatch.setattr("db.hbase._executor", ThreadPerCall())
+    pool = HBaseConnectionPool(size=1, timeout=0.5, host="127.0.0.1", autoconnect=False)
+    monkeypatch.setattr(FaultRecordData, "_pool", pool)
+
+    chunks = [chunk async for chunk in FaultRecordData.async_iter_scan(chunk_size=2)]
+    assert [len(chunk) for chunk in chunks] == [2, 2, 2]
+    async for _ in FaultRecordData.async_iter_scan(chunk_size=1):
+        break
+    await asyncio.sleep(0.1)
+    assert pool.stats()["free"] == 1
+    assert [r.vin for r in FaultRecordData.scan(row_prefix="c")] == ["c1-vin"]
+
+
+def test_put_many(fake_table):
+    rows = {f"d{i}": {"vin": f"v{i}", "obd_time": i, "receive_time": None} for i in range(25)}
+    assert FaultRecordData.put_many(rows, batch_size=10) == 25
+    assert fake_table.sends == 3
+    assert fake_table.data[b"d3"] == {b"A:a01": b"v3", b"A:a04": b"3"}
+
+
+def test_parallel_scan(fake_table):
+    assert FaultRecordData.split_ranges(row_prefix="a", split_points=["a2", "b", ""]) == [(b"a", b"a2"), (b"a2", b"b")]
+    keys = sorted(fake_table.data)
+    rows = FaultRecordData.parallel_scan(split_points=["a2", "b1", "b2"], chunk_size=1)
+    assert [r.row_key for r in rows] == keys
+    rows = FaultRecordData.parallel_scan(split_points=["b"], ordered=False, limit=3)
+    assert len(list(rows)) == 3
+    rows = FaultRecordData.parallel_scan(split_points=["b"], ordered=False)
+    assert sorted(r.row_key for r in rows) == keys
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_parallel_scan_slow_consumer_holds_no_connection(monkeypatch, ordered):
+    keys = [f"{prefix}{i:02d}".encode() for prefix in "abcd" for i in range(10)]
+    pool = FakePool(FakeTable({key: {b"A:a01": key + b"-vin"} for key in keys}))
+    monkeypatch.setattr(FaultRecordData, "_pool", pool)
+    rows = FaultRecordData.parallel_scan(split_points=["b", "c", "d"], ordered=ordered, chunk_size=2)
+    first = [next(rows)]
+    # 调用方处理慢时, 各子区间预取完一页即归还连接
+    time.sleep(0.2)
+    assert pool.in_use == 0
+    assert sorted(r.row_key for r in first + list(rows)) == keys
+    assert pool.in_use == 0
+
+
+def test_compact_rows(fake_table):
+    rows = FaultRecordData.scan(row_prefix="a", compact=True)
+    assert isinstance(rows[0], FaultRecordData.row_class)
+    assert rows[0].vin == rows[0]["vin"] == "a1-vin" and rows[0].obd_time is None
+    assert dict(rows[0]) == dict(FaultRecordData.scan(row_prefix="a")[0])
+    assert not hasattr(rows[0], "__dict__")
+    with pytest.raises(ValueError):
+        FaultRecordData.scan(compact=True, include_timestamp=True)
+
+
+class Status(IntEnumMore):
+    ok = (1, "正常")
+    fault = (2, "故障")
+
+
+class Telemetry(BaseModel):
+    vin = b"A:a01"
+    mileage = IntColumn(b"A:a02")
+    speed = FloatColumn(b"A:a03")
+    alert_time = DateTimeColumn(b"A:a04", tz=datetime.timezone.utc)
+    extra = JSONColumn(b"A:a05")
+    status = EnumColumn(b"A:a06", Status)
+
+    class Meta:
+        table_name = "telemetry"
+
+
+def test_typed_columns():
+    now = datetime.datetime(2026, 1, 1, 8, tzinfo=datetime.timezone.utc)
+    record = {"vin": "v1", "mileage": 12, "speed": 1.5, "alert_time": now, "extra": {"a": [1]}, "status": Status.fault}
+    data = Telemetry.parse_data(record)
+    assert Telemetry.mileage == b"A:a02" and data[b"A:a02"] == b"\x00" * 7 + b"\x0c"
+    assert data[b"A:a06"] == b"2"
+    expected = {"row_key": b"r", **record}
+    assert dict(Telemetry.row_decoder(b"r", data)) == dict(Telemetry.serialize_row(b"r", data)) == expected
+    fields = Telemetry.response_model.__fields__
+    assert fields["mileage"].type_ is int and fields["status"].type_ is Status
+
+
+def test_scan_columnar(monkeypatch):
+    np = pytest.importorskip("numpy")
+    rows = {f"r{i}": {"vin": f"v{i}", "mileage": i, "speed": i / 2, "status": Status.ok} for i in range(5)}
+    data = {key.encode(): Telemetry.parse_data(record) for key, record in rows.items()}
+    del data[b"r3"][Telemetry.mileage]
+    monkeypatch.setattr(Telemetry, "_pool", FakePool(FakeTable(data)))
+
+    result = Telemetry.scan_columnar(["mileage", "speed", "status"], chunk_size=2)
+    assert list(result) == ["row_key", "mileage", "speed", "status"]
+    assert result["mileage"].dtype == np.int64 and result["mileage"].sum() == 7
+    assert result["mileage"].mask.tolist() == [False, False, False, True, False]
+    assert result["speed"].tolist() == [0, 0.5, 1, 1.5, 2] and result["status"][0] is Status.ok
+    assert len(Telemetry.scan_columnar(row_prefix="x")["vin"]) == 0
+
+    pytest.importorskip("pyarrow")
+    table = Telemetry.scan_columnar(["mileage", "speed"], output="arrow", chunk_size=2)
+    assert table.num_rows == 5 and table.column("mileage").null_count == 1
+    assert table.column("speed").to_pylist() == [0, 0.5, 1, 1.5, 2]
+
+
+def test_row_cache(fake_table, monkeypatch):
+    cache = RowCache(maxsize=100, ttl=60)
+    monkeypatch.setattr(FaultRecordData, "_row_cache", cache)
+    assert [r.vin for r in FaultRecordData.rows(["a1", "zz"])] == ["a1-vin"]
+    assert [r.vin for r in FaultRecordData.rows(["a1", "a2", "zz"])] == ["a1-vin", "a2-vin"]
+    assert fake_table.fetched == [b"a1", b"zz", b"a2"]
+    assert (cache.hits, cache.misses) == (2, 3)
+
+    FaultRecordData.put_many({"a1": {"vin": "new"}})
+    assert FaultRecordData.row("a1", compact=True).vin == "new"
+    assert fake_table.fetched[-1] == b"a1" and cache.invalidations == 1
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_scan_resumes_after_transport_error(fake_table, monkeypatch, reverse):
+    monkeypatch.setattr(time, "sleep", lambda _: None)
+    fake_table.fail_at = b"b1"
+    rows = FaultRecordData.scan(reverse=reverse, limit=5)
+    assert [r.row_key for r in rows] == sorted(fake_table.data, reverse=reverse)[:5]
+    assert fake_table.closed_scanners == 2
+
+
+def test_column_projection(fake_table):
+    assert FaultRecordData.resolve_columns(["vin", b"A:a02", "B"]) == [b"A:a01", b"A:a02", b"B"]
+    fake_table.data[b"a1"][b"B:extra"] = b"x"
+    FaultRecordData.rows(["a1"])
+    FaultRecordData.rows(["a1"], columns=["vin", "obd_time"])
+    assert fake_table.projections == [list(FaultRecordData._bytes_to_str_map), [b"A:a01", b"A:a04"]]
+
+
+class SaltedRecord(BaseModel):
+    vin = b"A:a01"
+
+    class Meta:
+        table_name = "salted_record"
+        row_key = RowKey("vin", ReversedTimestamp("ts"), buckets=4)
+
+
+def test_salted_row_key(monkeypatch):
+    records = [{"vin": f"v{i % 5}", "ts": 1000 + i} for i in range(40)]
+    data = {SaltedRecord.make_row_key(r): SaltedRecord.parse_data({"vin": r["vin"]}) for r in records}
+    assert len({key[:1] for key in data}) > 1
+    key = SaltedRecord.make_row_key(records[7])
+    assert SaltedRecord._row_key.parse(key) == records[7]
+    monkeypatch.setattr(SaltedRecord, "_pool", FakePool(FakeTable(data)))
+
+    rows = list(SaltedRecord.bucket_scan(chunk_size=3))
+    unsalted = [r.row_key[1:] for r in rows]
+    assert len(rows) == 40 and unsalted == sorted(unsalted)
+    assert len(list(SaltedRecord.bucket_scan(ordered=False, limit=7))) == 7
+
+    latest = SaltedRecord.scan(row_prefix=SaltedRecord.row_key_prefix({"vin": "v3"}), limit=2)
+    assert [SaltedRecord._row_key.parse(r.row_key)["ts"] for r in latest] == [1038, 1033]
+    prefix = SaltedRecord.row_key_prefix({"vin": "v3"}, salted=False)
+    expected = SaltedRecord.scan(row_prefix=SaltedRecord.row_key_prefix({"vin": "v3"}))
+    assert [r.row_key for r in SaltedRecord.bucket_scan(row_prefix=prefix)] == [r.row_key for r in expected]
+
+
+class WideSaltedRecord(BaseModel):
+    vin = b"A:a01"
+
+    class Meta:
+        table_name = "wide_salted_record"
+        row_key = RowKey("vin", ReversedTimestamp("ts"), buckets=16)
+
+
+def test_bucket_scan_more_buckets_than_pool(monkeypatch):
+    monkeypatch.setattr(settings, "HBASE_POOL_SIZE", 3)
+    records = [{"vin": f"v{i % 40}", "ts": 1000 + i} for i in range(200)]
+    data = {WideSaltedRecord.make_row_key(r): WideSaltedRecord.parse_data({"vin": r["vin"]}) for r in records}
+    assert len({key[:1] for key in data}) == 16
+    pool = FakePool(FakeTable(data))
+    monkeypatch.setattr(WideSaltedRecord, "_pool", pool)
+
+    rows = list(WideSaltedRecord.bucket_scan(chunk_size=4))
+    unsalted = [r.row_key[1:] for r in rows]
+    assert len(rows) == 200 and unsalted == sorted(unsalted)
+    assert [r.row_key[1:] for r in WideSaltedRecord.bucket_scan(chunk_size=4, limit=9)] == unsalted[:9]
+    assert len(list(WideSaltedRecord.bucket_scan(ordered=False))) == 200
+    # 每页取还连接, 同时占用不超过连接池大小
+    assert 0 < pool.peak <= 3 and pool.in_use == 0
+
+    with pytest.raises(Exception, match="must be a RowKey"):
+
+        class BadRecord(BaseModel):
+            vin = b"A:a01"
+
+            class Meta:
+                table_name = "bad_record"
+                row_key = ("vin", "ts")
+
+
+def test_bucket_scan_fetches_buckets_concurrently(monkeypatch):
+    monkeypatch.setattr(settings, "HBASE_POOL_SIZE", 4)
+    records = [{"vin": f"v{i}", "ts": 1000 + i} for i in range(64)]
+    data = {WideSaltedRecord.make_row_key(r): WideSaltedRecord.parse_data({"vin": r["vin"]}) for r in records}
+    table = FakeTable(data)
+    table.scan_delay = 0.1
+    pool = FakePool(table)
+    monkeypatch.setattr(WideSaltedRecord, "_pool", pool)
+
+    start = time.monotonic()
+    rows = list(WideSaltedRecord.bucket_scan())
+    elapsed = time.monotonic() - start
+    unsalted = [r.row_key[1:] for r in rows]
+    assert len(rows) == 64 and unsalted == sorted(unsalted)
+    # 16 个桶各一页, 4 个连接并发约 0.4 秒, 逐桶串行需 1.6 秒
+    assert pool.peak == 4 and elapsed < 1
+
+
+def test_pool_warm_up_skips_busy_connections(monkeypatch):
+    opened = []
+    monkeypatch.setattr(Connection, "open", lambda self: opened.append(self))
+    pool = HBaseConnectionPool(size=3, timeout=0.1, host="127.0.0.1", autoconnect=False)
+    opened.clear()
+    with pool.checkout():
+        pool.warm_up()
+        assert len(opened) == 3 and pool.stats()["free"] == 2
+    assert pool.stats()["free"] == 3
+
+    def fail(self):
+        raise TTransportException(message="connection refused")
+
+    monkeypatch.setattr(Connection, "open", fail)
+    with pytest.raises(TTransportException):
+        pool.warm_up()
+    assert pool.stats()["free"] == 3
@@ -0,0 +1,64 @@
+import asyncio
+
+import orjson
+import pytest
+
+from common.kafka import MyKafka, serialize
+from common.kafka_memory import MemoryBroker
+
+
+class RecordingProducer:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, topic, value, key=None, partition=None, headers=None):
+        self.sent.append((topic, serialize(value), key))
+        fut = asyncio.get_running_loop().create_future()
+        fut.set_result(len(self.sent) - 1)
+        return fut
+
+
+def test_serialize():
+    assert serialize(b"\x00") == b"\x00"
+    assert serialize("中") == "中".encode()
+    assert serialize({"a": [1, None]}) == b'{"a":[1,null]}'
+
+
+@pytest.mark.asyncio
+async def test_send_many_keyed():
+    client = MyKafka()
+    client._producer = RecordingProducer()
+    offsets = await client.send_many([{"vin": "a"}, {"vin": "b"}], "events", key=lambda m: m["vin"])
+    assert offsets == [0, 1]
+    assert client._producer.sent[1] == ("events", b'{"vin":"b"}', "b")
+    assert await client.send("x", "events", wait=True) == 2
+
+
+@pytest.mark.asyncio
+async def test_memory_broker_keys_and_groups():
+    broker = MemoryBroker(partitions=4)
+    client = MyKafka(producer_factory=broker.create_producer, consumer_factory=broker.create_consumer)
+    assert await client.get_consumer("events", "a") is await client.get_consumer("events", "a")
+    assert await client.get_consumer("events", "a") is not await client.get_consumer("events", "b")
+
+    messages = [{"vin": f"v{i % 3}", "n": i} for i in range(30)]
+    metadata = await client.send_many(messages, "events", key=lambda m: m["vin"])
+    partitions = {(m["vin"], meta.partition) for m, meta in zip(messages, metadata)}
+    assert len(partitions) == 3
+
+    members = [broker.create_consumer("events", group_id="g", auto_offset_reset="earliest") for _ in range(2)]
+    for member in members:
+        await member.start()
+    values = []
+    while len(values) < 30:
+        for member in members:
+            for records in (await member.getmany(timeout_ms=10, max_records=7)).values():
+                values.extend(orjson.loads(r.value)["n"] for r in records)
+    assert sorted(values) == list(range(30))
+    assert not members[0].assignment() & members[1].assignment()
+
+    await members[1].stop()
+    await members[0].commit()
+    await members[0].getmany()
+    assert len(members[0].assignment()) == 4
+    await client.close()
@@ -0,0 +1,175 @@
+import asyncio
+
+import pytest
+from aiokafka import TopicPartition
+from aiokafka.structs import ConsumerRecord
+
+from common import kafka_consumer
+from common.kafka_memory import MemoryBroker
+from common.kafka_consumer import HEADER_TOPIC, HEADER_ATTEMPT, HEADER_OFFSET, ConsumerWorker, KafkaHandler, get_header
+
+
+def make_record(topic, partition, offset, value, key=None, headers=()):
+    return ConsumerRecord(topic, partition, offset, 0, 0, key, value, None, 0, len(value), list(headers))
+
+
+class FakeConsumer:
+    def __init__(self, batches, done):
+        self.batches = list(batches)
+        self.done = done
+        self.commits = []
+        self.paused = set()
+
+    def subscribe(self, topics, listener=None):
+        self.topics = topics
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def getmany(self, timeout_ms=0, max_records=None):
+        await asyncio.sleep(0.01)
+        if not self.batches:
+            self.done()
+            return {}
+        return self.batches.pop(0)
+
+    def pause(self, *partitions):
+        self.paused.update(partitions)
+
+    def resume(self, *partitions):
+        self.paused.difference_update(partitions)
+
+    async def commit(self, offsets):
+        self.commits.append(dict(offsets))
+
+
+class LoopbackProducer:
+    """
+    发送到重试 topic 的消息重新交给消费者
+    """
+
+    def __init__(self, consumer):
+        self.consumer = consumer
+        self.sent = []
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def send_and_wait(self, topic, value, key=None, headers=None):
+        self.sent.append((topic, value, key, headers))
+        if topic.endswith(".dlq"):
+            return
+        tp = TopicPartition(topic, 0)
+        self.consumer.batches.append({tp: [make_record(topic, 0, len(self.sent), value, key, headers)]})
+
+
+def setup_worker(monkeypatch, handle, batches, done, **kwargs):
+    monkeypatch.setattr(kafka_consumer, "handlers", {"events": KafkaHandler("events", handle, **kwargs)})
+    consumer = FakeConsumer(batches, lambda: done() and worker.stop())
+    producer = LoopbackProducer(consumer)
+    worker = ConsumerWorker(
+        "group",
+        concurrency=2,
+        batch_size=4,
+        commit_interval=60,
+        producer_factory=lambda: producer,
+        consumer_factory=lambda **_: consumer,
+    )
+    return worker, consumer, producer
+
+
+@pytest.mark.asyncio
+async def test_worker_keeps_partition_order(monkeypatch):
+    handled, in_flight, peak = [], set(), []
+
+    async def handle(record):
+        in_flight.add(record.partition)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.001 * (3 - record.partition))
+        in_flight.discard(record.partition)
+        handled.append((record.partition, record.value["n"]))
+
+    tps = [TopicPartition("events", p) for p in range(3)]
+    batches = [
+        {tp: [make_record("events", tp.partition, o, b'{"n": %d}' % o) for o in range(i * 4, i * 4 + 4)] for tp in tps}
+        for i in range(2)
+    ]
+    worker, consumer, _ = setup_worker(monkeypatch, handle, batches, lambda: len(handled) == 24)
+
+    await asyncio.wait_for(worker.run(), 5)
+    for p in range(3):
+        assert [n for partition, n in handled if partition == p] == list(range(8))
+    assert max(peak) <= 2 and worker.processed == 24
+    assert consumer.commits[-1] == {tp: 8 for tp in tps}
+
+
+@pytest.mark.asyncio
+async def test_worker_retry_and_dead_letter(monkeypatch):
+    handled, attempts = [], []
+
+    async def handle(record):
+        if record.value == b"poison":
+            attempts.append(record.topic)
+            raise ValueError("bad record")
+        handled.append(record.value)
+
+    tp = TopicPartition("events", 0)
+    batches = [{tp: [make_record("events", 0, o, v, b"k") for o, v in enumerate([b"a", b"poison", b"b"])]}]
+    worker, consumer, producer = setup_worker(
+        monkeypatch, handle, batches, lambda: len(producer.sent) == 3, deserializer=None, retry_delays=[0, 0.01]
+    )
+
+    await asyncio.wait_for(worker.run(), 5)
+    assert handled == [b"a", b"b"]
+    assert attempts == ["events", "events.retry.1", "events.retry.2"]
+    assert [sent[0] for sent in producer.sent] == ["events.retry.1", "events.retry.2", "events.dlq"]
+    dead = make_record("events.dlq", 0, 0, b"poison", headers=producer.sent[-1][3])
+    assert get_header(dead, HEADER_TOPIC) == b"events" and get_header(dead, HEADER_OFFSET) == b"1"
+    assert get_header(dead, HEADER_ATTEMPT) == b"3" and producer.sent[-1][2] == b"k"
+    assert consumer.commits[-1][tp] == 3
+    assert (worker.failed, worker.retried, worker.dead_lettered) == (3, 2, 1)
+
+
+@pytest.mark.asyncio
+async def test_workers_share_group_on_memory_broker(monkeypatch):
+    broker = MemoryBroker(partitions=4)
+    handled, poisoned = [], []
+
+    async def handle(record):
+        if record.value["n"] == 7 and len(poisoned) < 2:
+            poisoned.append(record.topic)
+            raise ValueError("bad record")
+        handled.append(record.value["n"])
+
+    monkeypatch.setattr(kafka_consumer, "handlers", {"events": KafkaHandler("events", handle, retry_delays=[0])})
+    factories = dict(producer_factory=broker.create_producer, consumer_factory=broker.create_consumer)
+    workers = [ConsumerWorker("group", commit_interval=0.01, **factories) for _ in range(2)]
+    for topic in ("events", "events.retry.1"):
+        broker.create_topic(topic)
+    tasks = [asyncio.ensure_future(worker.run()) for worker in workers]
+    await asyncio.sleep(0.05)
+
+    producer = broker.create_producer()
+    for n in range(20):
+        await producer.send_and_wait("events", {"n": n}, key=str(n % 5))
+    while len(handled) < 19 or not broker.logs.get("events.dlq"):
+        await asyncio.sleep(0.01)
+    assert sorted(handled) == [n for n in range(20) if n != 7]
+    assert poisoned == ["events", "events.retry.1"]
+    assert sum(w.processed for w in workers) == 19 and all(w.processed for w in workers)
+
+    assert await kafka_consumer.replay_dead_letters("events", **factories) == 1
+    while len(handled) < 20:
+        await asyncio.sleep(0.01)
+    assert await kafka_consumer.replay_dead_letters("events", **factories) == 0
+    for worker in workers:
+        worker.stop()
+    await asyncio.wait_for(asyncio.gather(*tasks), 5)
+    for tp in broker.partitions_for("events"):
+        assert broker.committed.get(("group", tp), 0) == broker.end_offset(tp)
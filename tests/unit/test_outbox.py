@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+from tortoise import Tortoise
+
+from common import outbox
+from db.mysql.enums import OutboxStatus
+from db.mysql.models import User, Config, OutboxEvent
+
+
+class RecordingProducer:
+    def __init__(self, fail_topic=None):
+        self.sent = []
+        self.fail_topic = fail_topic
+
+    async def send(self, topic, value, key=None, headers=None):
+        fut = asyncio.get_running_loop().create_future()
+        if topic == self.fail_topic:
+            fut.set_exception(RuntimeError("broker down"))
+        else:
+            self.sent.append((topic, value, key, headers))
+            fut.set_result(len(self.sent))
+        return fut
+
+
+@pytest.fixture
+async def db():
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["db.mysql.models"]})
+    await Tortoise.generate_schemas()
+    yield
+    await Tortoise.close_connections()
+
+
+@pytest.mark.asyncio
+async def test_events_saved_with_model(db):
+    user = User(username="u", phone="1", password="p")
+    user.add_event("user_created", {"username": "u"}, key="u", headers={"source": "test"})
+    await user.save()
+    await user.save()
+    events = await OutboxEvent.all()
+    assert [(e.topic, e.payload, e.key, e.headers) for e in events] == [
+        ("user_created", {"username": "u"}, "u", {"source": "test"})
+    ]
+
+    duplicate = User(username="u", phone="1", password="p")
+    duplicate.add_event("user_created", {"username": "u"})
+    with pytest.raises(Exception):
+        await duplicate.save()
+    assert await OutboxEvent.all().count() == 1
+
+
+@pytest.mark.asyncio
+async def test_model_outbox_events(db, monkeypatch):
+    def outbox_events(self, created):
+        return [{"topic": "config_changed", "payload": {"key": self.key, "created": created}}]
+
+    monkeypatch.setattr(Config, "outbox_events", outbox_events)
+    config = await Config.create(label="l", key="k", value={})
+    config.value = {"a": 1}
+    await config.save(update_fields=["value"])
+    payloads = [e.payload for e in await OutboxEvent.all()]
+    assert payloads == [{"key": "k", "created": True}, {"key": "k", "created": False}]
+
+
+@pytest.mark.asyncio
+async def test_relay_marks_results(db, monkeypatch):
+    producer = RecordingProducer(fail_topic="bad")
+
+    async def get_producer():
+        return producer
+
+    monkeypatch.setattr(outbox.kafka, "get_producer", get_producer)
+    await OutboxEvent.bulk_create([OutboxEvent(topic=t, payload={"n": i}) for i, t in enumerate(["a", "bad", "b"])])
+
+    relay = outbox.OutboxRelay(batch_size=10, max_attempts=2)
+    assert await relay.relay_once() == 3
+    assert [s[0] for s in producer.sent] == ["a", "b"] and relay.relayed == 2
+    assert await relay.relay_once() == 1
+    assert await relay.relay_once() == 0
+    failed = await OutboxEvent.get(topic="bad")
+    assert failed.status == OutboxStatus.failed and failed.attempts == 2 and "broker down" in failed.last_error
+    assert await OutboxEvent.filter(status=OutboxStatus.sent, sent_at__not_isnull=True).count() == 2
+
+
+class FlakyProducer(RecordingProducer):
+    """
+    payload 中 fail 为 True 的事件首次投递失败
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.failed = set()
+
+    async def send(self, topic, value, key=None, headers=None):
+        if value.get("fail") and value["n"] not in self.failed:
+            self.failed.add(value["n"])
+            fut = asyncio.get_running_loop().create_future()
+            fut.set_exception(RuntimeError("timeout"))
+            return fut
+        return await super().send(topic, value, key, headers)
+
+
+@pytest.mark.asyncio
+async def test_relay_keeps_key_order_after_failure(db, monkeypatch):
+    producer = FlakyProducer()
+
+    async def get_producer():
+        return producer
+
+    monkeypatch.setattr(outbox.kafka, "get_producer", get_producer)
+    events = [("k1", False), ("k1", True), ("k2", False), ("k1", False), ("k2", False)]
+    await OutboxEvent.bulk_create(
+        [OutboxEvent(topic="t", key=key, payload={"n": i, "fail": fail}) for i, (key, fail) in enumerate(events)]
+    )
+
+    relay = outbox.OutboxRelay(batch_size=10, max_attempts=3)
+    assert await relay.relay_once() == 5
+    # k1 的第 1 条失败, 其后的第 3 条虽已发出也保持待投递
+    pending = await OutboxEvent.filter(status=OutboxStatus.pending).values_list("id", flat=True)
+    assert len(pending) == 2 and relay.relayed == 3
+    assert await relay.relay_once() == 2
+    assert await OutboxEvent.filter(status=OutboxStatus.pending).count() == 0
+
+    last_sent = {}
+    for position, (_, value, key, _) in enumerate(producer.sent):
+        last_sent[value["n"]] = position
+    k1 = [n for n, (key, _) in enumerate(events) if key == "k1"]
+    assert sorted(k1, key=last_sent.get) == k1
+    assert (await OutboxEvent.get(id=pending[0])).attempts == 1
+
+
+class LostLock:
+    async def extend(self):
+        return False
+
+
+@pytest.mark.asyncio
+async def test_relay_leaves_batch_pending_after_lock_lost(db, monkeypatch):
+    producer = RecordingProducer()
+
+    async def get_producer():
+        return producer
+
+    monkeypatch.setattr(outbox.kafka, "get_producer", get_producer)
+    await OutboxEvent.bulk_create([OutboxEvent(topic="t", payload={"n": i}) for i in range(3)])
+
+    # 等待确认期间锁已被接替, 结果交给新的主 relay 标记
+    relay = outbox.OutboxRelay(batch_size=10)
+    assert await relay.relay_once(LostLock()) == 0
+    assert len(producer.sent) == 3 and relay.relayed == 0
+    assert await OutboxEvent.filter(status=OutboxStatus.pending).count() == 3
@@ -0,0 +1,23 @@
+import time
+
+from db.redis.cache import LRUCache
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+
+
+def test_lru_cache_ttl(monkeypatch):
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1, ttl=1)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 2)
+    assert cache.get("a", default=0) == 0
+    assert len(cache) == 0
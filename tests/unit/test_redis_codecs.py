@@ -0,0 +1,36 @@
+import pytest
+
+from db.redis.codecs import RAW, Codec, get_codec
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_codec_roundtrip(compression):
+    codec = Codec("orjson", compression=compression, min_compress_size=16)
+    for value in [{"a": 1}, list(range(100)), "text", None]:
+        assert codec.decode(codec.encode(value)) == value
+
+
+@pytest.mark.parametrize("serializer, compression", [("msgpack", None), ("msgpack", "lz4"), ("orjson", "lz4")])
+def test_optional_codecs(serializer, compression):
+    pytest.importorskip(serializer)
+    if compression:
+        pytest.importorskip(f"{compression}.frame")
+    codec = Codec(serializer, compression=compression, min_compress_size=16)
+    for value in [{"a": [1, 2]}, list(range(100)), "text", None]:
+        assert codec.decode(codec.encode(value)) == value
+    if compression:
+        assert codec.encode(list(range(100))).startswith(b"\x01")
+
+
+def test_codec_compress_above_threshold():
+    codec = Codec("orjson", compression="zlib", min_compress_size=16)
+    assert codec.encode([1]).startswith(b"\x00")
+    assert codec.encode(list(range(100))).startswith(b"\x01")
+
+
+def test_get_codec():
+    assert get_codec(None) is RAW
+    assert get_codec("raw") is RAW
+    assert get_codec("orjson") is get_codec("orjson")
+    with pytest.raises(ValueError):
+        Codec("pickle")